@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import image_probe
+
+# Header probe vs. Image.open(...).size, the path get_image_resolution and
+# is_low_quality used before. Run from the repo root:
+#   python benchmarks/bench_image_probe.py [copies_per_format] [folder_of_real_photos]
+
+formats = [
+    ("JPEG", ".jpg", (4032, 3024)),
+    ("PNG", ".png", (1920, 1080)),
+    ("GIF", ".gif", (800, 600)),
+    ("BMP", ".bmp", (1024, 768)),
+    ("TIFF", ".tif", (3000, 2000)),
+]
+
+def make_samples(folder, copies):
+    paths = []
+    for fmt, ext, size in formats:
+        sample = os.path.join(folder, f"sample{ext}")
+        Image.new("RGB", size, (120, 80, 40)).save(sample, fmt)
+        for i in range(copies):
+            path = os.path.join(folder, f"{fmt.lower()}_{i:05d}{ext}")
+            shutil.copyfile(sample, path)
+            paths.append(path)
+        os.remove(sample)
+    return paths
+
+def legacy_size(path):
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return (0, 0)
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<26} {elapsed:8.3f}s")
+    return result, elapsed
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    temp_dir = None
+    if len(sys.argv) > 2:
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(sys.argv[2])
+            for name in names
+        ]
+    else:
+        temp_dir = tempfile.mkdtemp(prefix="probe_bench_")
+        paths = make_samples(temp_dir, copies)
+
+    try:
+        print(f"=== Image size probe benchmark ({len(paths):,} files) ===")
+        legacy, old = timed("PIL Image.open().size", lambda: [legacy_size(p) for p in paths])
+        probed, new = timed("header probe", lambda: [image_probe.get_size(p, log=lambda m: None) for p in paths])
+        batched, pooled = timed("header probe, thread pool", lambda: [s for _, s in image_probe.iter_sizes(paths)])
+
+        header_hits = sum(1 for p in paths if image_probe.probe(p))
+        mismatches = sum(1 for a, b in zip(legacy, probed) if a != b and a != (0, 0))
+        recovered = sum(1 for a, b in zip(legacy, probed) if a == (0, 0) and b != (0, 0))
+        print(f"  speedup: {old / new:.2f}x serial | {old / pooled:.2f}x pooled")
+        print(f"  parsed from header: {header_hits}/{len(paths)} | differs from PIL: {mismatches} | read where PIL failed: {recovered}")
+        assert batched == probed
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
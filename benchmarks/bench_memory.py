@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+from array import array
+from collections import defaultdict
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+import cross_pic_organizer
+import media_records
+
+# Memory held by the organizer's planner per million files. Each layout is built
+# in a fresh interpreter from the same synthetic paths and the growth in RSS is
+# measured:
+#   legacy   - what plan_organize held before media_records: (path, (w, h), dhash)
+#              tuples, a resolution map, a duplicates list, size dicts, hex content
+#              keys and one dict per plan op
+#   compact  - the same information in media_records tables and arrays, as
+#              plan_organize holds it now
+# Paths look like a photo library (a few hundred files per folder, deep folder
+# names); duplicate_ratio of them get an identical twin, near_ratio a near-duplicate.
+# Run from the repo root:
+#   python benchmarks/bench_memory.py [--files N]
+
+layouts = ("legacy", "compact")
+default_files = 200_000
+duplicate_ratio = 0.1
+near_ratio = 0.05
+files_per_folder = 250
+folder_parts = ["Photos", "Family", "Summer Trip", "DCIM", "Camera Uploads", "2016", "2019", "Phone Backup"]
+
+def synthetic_files(count, seed=1234):
+    # Yields (path, size, width, height, dhash, twin) with twin = True for files that
+    # share their content with the one before
+    rng = random.Random(seed)
+    folder = None
+    for i in range(count):
+        if i % files_per_folder == 0:
+            parts = rng.sample(folder_parts, 3)
+            folder = f"/media/usb{rng.randrange(4)}/{parts[0]}/{parts[1]} {i // files_per_folder:05d}/{parts[2]}"
+        twin = i and rng.random() < duplicate_ratio
+        size = size if twin else rng.randrange(200_000, 8_000_000)
+        dhash = dhash if twin or (i and rng.random() < near_ratio) else rng.getrandbits(64)
+        yield f"{folder}/IMG_{i:07d}.jpg", size, 4032, 3024, dhash, twin
+
+def month_folder(i):
+    return f"/srv/albums/Family_Album/{2010 + i % 15}/{i % 12 + 1:02d}"
+
+def build_legacy(count):
+    probed = []
+    sizes = {}
+    by_size = defaultdict(list)
+    for path, size, width, height, dhash, _ in synthetic_files(count):
+        probed.append((path, (width, height), dhash))
+        sizes[path] = size
+        by_size[size].append(path)
+    best = {}
+    for i, (path, resolution, dhash) in enumerate(probed):
+        best.setdefault(dhash, i)
+    resolution_map = {cluster: (probed[i][1], probed[i][0]) for cluster, i in best.items()}
+    winner_indexes = set(best.values())
+    duplicates_list = [path for i, (path, _, _) in enumerate(probed) if i not in winner_indexes]
+    keys = {}
+    copied_hashes = set()
+    for size, group in by_size.items():
+        if len(group) > 1:
+            key = f"{size}:{random.getrandbits(128):032x}"
+            for path in group:
+                keys[path] = key
+            copied_hashes.add(key)
+    ops = []
+    for i, (path, _, _) in enumerate(probed):
+        kind = "copied" if i in winner_indexes else "duplicate"
+        dst = f"{month_folder(i)}/{os.path.basename(path)}"
+        ops.append({"kind": kind, "src": path, "dst": dst, "size": sizes[path], "note": ""})
+    return probed, resolution_map, duplicates_list, sizes, by_size, keys, copied_hashes, ops
+
+def build_compact(count):
+    probed = media_records.MediaRecords()
+    all_sizes = array("q")
+    for path, size, width, height, dhash, _ in synthetic_files(count):
+        probed.add(path, size=size, width=width, height=height, phash=dhash)
+        all_sizes.append(size)
+    best = {}
+    for i in range(len(probed)):
+        best.setdefault(probed.dhash(i), i)
+    winner_rows = array("I", best.values())
+    del best
+    is_winner = bytearray(len(probed))
+    for i in winner_rows:
+        is_winner[i] = 1
+    duplicate_rows = array("I", (i for i in range(len(probed)) if not is_winner[i]))
+    candidates = media_records.PathTable(probed.paths(winner_rows))
+    colliding = set()
+    previous = None
+    for size in sorted(all_sizes):
+        if size == previous:
+            colliding.add(size)
+        previous = size
+    keys = {}
+    copied_hashes = set()
+    for i, size in enumerate(all_sizes):
+        if size in colliding:
+            key = media_records.pack_digest(f"{size}:{random.getrandbits(128):032x}")
+            keys[probed[i]] = key
+            copied_hashes.add(key)
+    ops = media_records.OpTable(cross_pic_organizer.plan_kinds)
+    for i in range(len(probed)):
+        kind = "copied" if is_winner[i] else "duplicate"
+        ops.add(kind, probed[i], f"{month_folder(i)}/{probed.name(i)}", probed.size[i])
+    return probed, all_sizes, winner_rows, duplicate_rows, candidates, keys, copied_hashes, ops
+
+def rss_mb():
+    # Current resident set size; falls back to peak RSS off Linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_layout(layout, count):
+    before = rss_mb()
+    start = time.perf_counter()
+    held = build_legacy(count) if layout == "legacy" else build_compact(count)
+    seconds = time.perf_counter() - start
+    grown = rss_mb() - before
+    del held
+    return {"layout": layout, "files": count, "rss_mb": round(grown, 1), "seconds": round(seconds, 2)}
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Planner memory per million files, legacy vs compact records.")
+    parser.add_argument("--files", type=int, default=default_files)
+    parser.add_argument("--run-layout", choices=layouts, help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+def main():
+    options = parse_args(sys.argv[1:])
+    if options.run_layout:
+        print(json.dumps(run_layout(options.run_layout, options.files)))
+        return 0
+    print(f"=== Planner memory benchmark ({options.files:,} files) ===")
+    results = {}
+    for layout in layouts:
+        command = [sys.executable, os.path.abspath(__file__), "--run-layout", layout, "--files", str(options.files)]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"  {layout} failed:\n{result.stderr}")
+            return 1
+        results[layout] = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"  {'layout':<8} {'RSS MB':>10} {'MB / 1M files':>14} {'bytes / file':>13} {'build s':>8}")
+    for layout, r in results.items():
+        per_million = r["rss_mb"] * 1_000_000 / options.files
+        per_file = r["rss_mb"] * 1024 * 1024 / options.files
+        print(f"  {layout:<8} {r['rss_mb']:>10,.1f} {per_million:>14,.0f} {per_file:>13,.0f} {r['seconds']:>8.2f}")
+    if results["compact"]["rss_mb"] > 0:
+        print(f"  compact records use {results['legacy']['rss_mb'] / results['compact']['rss_mb']:.1f}x less memory")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import photo_scan
+import cross_pic_organizer
+
+# Micro-benchmark: compiled path_rules vs. the original per-keyword loops.
+# Run from the repo root: python benchmarks/bench_path_rules.py [num_paths]
+
+def legacy_should_skip_dir(dir_path):
+    for skip in photo_scan.skip_folders:
+        if skip.lower() in dir_path.lower():
+            return True
+    return False
+
+def legacy_is_junk_file(file_name):
+    return file_name.lower().endswith(photo_scan.junk_extensions_lower)
+
+def legacy_is_junk(filepath):
+    lower_path = filepath.lower()
+    return any(keyword in lower_path for keyword in cross_pic_organizer.junk_keywords)
+
+def make_paths(count, seed=1234):
+    rng = random.Random(seed)
+    folders = ["Photos", "Family", "2019", "Summer Trip", "DCIM", "100CANON", "Backup", "Phone", "Pictures"]
+    rare = ["node_modules", "AppData", ".cache", "Temp", "Library"]
+    names = ["IMG_{:05d}.JPG", "DSC{:05d}.jpg", "VID_{:05d}.mp4", "thumb_{:05d}.png", "scan{:05d}.tif", "file{:05d}.tmp"]
+    paths = []
+    for i in range(count):
+        parts = [rng.choice(folders) for _ in range(rng.randint(2, 6))]
+        if rng.random() < 0.02:
+            parts.insert(rng.randrange(len(parts)), rng.choice(rare))
+        paths.append(os.path.join("/mnt/nas", *parts, rng.choice(names).format(i)))
+    return paths
+
+def bench(label, func, items):
+    start = time.perf_counter()
+    hits = sum(1 for item in items if func(item))
+    elapsed = time.perf_counter() - start
+    rate = len(items) / elapsed if elapsed else float("inf")
+    print(f"  {label:<28} {elapsed:8.3f}s  {rate:12,.0f} paths/s  ({hits} hits)")
+    return elapsed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    paths = make_paths(count)
+    dirs = [os.path.dirname(p) for p in paths]
+    names = [os.path.basename(p) for p in paths]
+
+    cases = [
+        ("should_skip_dir", legacy_should_skip_dir, photo_scan.should_skip_dir, dirs),
+        ("is_junk_file", legacy_is_junk_file, photo_scan.is_junk_file, names),
+        ("organizer is_junk", legacy_is_junk, cross_pic_organizer.is_junk, names),
+    ]
+    print(f"=== Path rule benchmark ({count:,} paths) ===")
+    for label, legacy, compiled, items in cases:
+        mismatches = sum(1 for item in items if legacy(item) != compiled(item))
+        print(f"{label}:")
+        old = bench("legacy loop", legacy, items)
+        new = bench("compiled rules", compiled, items)
+        print(f"  speedup: {old / new:.2f}x | mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
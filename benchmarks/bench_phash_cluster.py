@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+import perceptual_hash
+
+# Near-duplicate clustering speed and shape. Synthetic dHashes are built as a
+# photo library would produce them: unique images, re-encoded copies a few bits
+# off an original, and bursts where each shot is a few bits off the one before
+# (so the two ends of a burst are far apart). Checks, exiting 1 on a failure:
+#   chain     - 0, 0b111, 0b111111, ... (3 bits apart each) must not end up in
+#               one cluster at max_distance 3
+#   radius    - every member is within max_distance of its cluster's first hash
+#   copies    - every exact copy shares its original's cluster (the share of
+#               copies a few bits off that do is printed)
+# Run from the repo root:
+#   python benchmarks/bench_phash_cluster.py [--images N]
+
+default_images = 200_000
+copy_ratio = 0.1
+burst_ratio = 0.05
+burst_length = 8
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(perceptual_hash.hash_bits), count):
+        value ^= 1 << bit
+    return value
+
+def synthetic_hashes(count, distance, seed=1234):
+    # (hashes, [(original index, copy index)])
+    rng = random.Random(seed)
+    hashes = []
+    copies = []
+    while len(hashes) < count:
+        roll = rng.random()
+        if hashes and roll < copy_ratio:
+            original = rng.randrange(len(hashes))
+            if hashes[original] is not None:
+                copies.append((original, len(hashes)))
+                hashes.append(flip_bits(hashes[original], rng.randint(0, distance), rng))
+                continue
+        if roll < copy_ratio + burst_ratio:
+            value = rng.getrandbits(64)
+            for _ in range(burst_length):
+                hashes.append(value)
+                value = flip_bits(value, distance, rng)
+            continue
+        hashes.append(rng.getrandbits(64) if rng.random() > 0.01 else None)
+    return hashes[:count], [(a, b) for a, b in copies if b < count]
+
+def check_chain(distance):
+    chain = [(1 << (distance * i)) - 1 for i in range(perceptual_hash.hash_bits // distance)]
+    ids = perceptual_hash.cluster(chain, max_distance=distance)
+    return len(set(ids)) > 1
+
+def check_radius(hashes, ids, distance):
+    first = {}
+    for value, cluster_id in zip(hashes, ids):
+        if value is None:
+            continue
+        leader = first.setdefault(cluster_id, value)
+        if perceptual_hash.hamming(value, leader) > distance:
+            return False
+    return True
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Near-duplicate clustering speed and correctness.")
+    parser.add_argument("--images", type=int, default=default_images)
+    parser.add_argument("--distance", type=int, default=perceptual_hash.default_distance)
+    return parser.parse_args(args)
+
+def main():
+    options = parse_args(sys.argv[1:])
+    hashes, copies = synthetic_hashes(options.images, options.distance)
+    print(f"=== Near-duplicate clustering benchmark ({len(hashes):,} hashes, distance {options.distance}) ===")
+    start = time.perf_counter()
+    ids = perceptual_hash.cluster(hashes, max_distance=options.distance)
+    seconds = time.perf_counter() - start
+    clusters = len(set(ids))
+    print(f"  {seconds:.2f}s | {len(hashes) / seconds:,.0f} hashes/s | {clusters:,} clusters | {len(hashes) - clusters:,} near-duplicates")
+
+    together = sum(1 for a, b in copies if ids[a] == ids[b])
+    print(f"  copies clustered with their original: {together:,} of {len(copies):,}")
+    checks = {
+        "chain": check_chain(options.distance),
+        "radius": check_radius(hashes, ids, options.distance),
+        "copies": all(ids[a] == ids[b] for a, b in copies if perceptual_hash.hamming(hashes[a], hashes[b]) == 0),
+    }
+    for name, ok in checks.items():
+        print(f"  {name:<7} {'ok' if ok else 'FAIL'}")
+    return 0 if all(checks.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, repo_root)
+sys.path.insert(0, benchmarks_dir)
+
+import media_tree
+
+# End-to-end benchmark of the pipeline stages on a generated media tree:
+#   scan      photo_scan.scan_media over the tree
+#   organize  cross_pic_organizer.organize_media into a fresh album
+#   scanned   scanned_album.scan_scanned_photos over an images-only tree
+#   upload    clean_upload.copy_files from the organized album
+# Each stage runs in its own interpreter with its own hash cache and journal,
+# and reports files/s, MB/s, wall and CPU time, peak RSS and syscall counts
+# (read/write syscalls from /proc/self/io, opens and directory listings from
+# audit hooks; --strace adds a full strace -c count). Compare with a stored run
+# to catch regressions. Run from the repo root:
+#   python benchmarks/bench_pipeline.py [--files N] [--save-baseline FILE] [--baseline FILE]
+# Exits 1 if a stage regressed by more than --threshold against the baseline.
+
+stages = ("scan", "organize", "scanned", "upload")
+default_threshold = 0.15
+# metric -> True if higher is better; compared against the baseline
+compared_metrics = {"files_per_s": True, "peak_rss_mb": False, "syscalls": False}
+audited_events = {"open": "open", "os.listdir": "listdir", "os.scandir": "scandir", "os.rename": "rename", "os.remove": "remove"}
+
+def quiet(*parts):
+    pass
+
+def proc_io():
+    # {"syscr": n, "syscw": n, ...} for this process, or {} off Linux
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def tree_bytes(root):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(root) for name in names)
+
+def run_stage(stage, work, phash):
+    # Runs in the child interpreter; returns the stage's metrics
+    calls = dict.fromkeys(audited_events.values(), 0)
+
+    def audit(event, args):
+        name = audited_events.get(event)
+        if name:
+            calls[name] += 1
+
+    state = os.path.join(work, "state", stage)
+    os.makedirs(state, exist_ok=True)
+    os.chdir(state) # hash_cache.db, operations.jsonl, ... of this stage only
+    with open(os.path.join(work, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    # Imports happen before the clock starts
+    import photo_scan
+    import cross_pic_organizer
+    import scanned_album
+    import clean_upload
+
+    sys.addaudithook(audit)
+    io_before = proc_io()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    if stage == "scan":
+        images, videos = photo_scan.scan_media(os.path.join(work, "media"), log=quiet)
+        files, size = len(images) + len(videos), None
+    elif stage == "organize":
+        paths = manifest["media"]["paths"]
+        media_dict = {
+            "images": [p for p in paths if not p.endswith(".mp4")],
+            "videos": [p for p in paths if p.endswith(".mp4")],
+        }
+        cross_pic_organizer.organize_media(
+            media_dict, os.path.join(work, "out"), "Album", log=quiet,
+            near_duplicate_distance=cross_pic_organizer.perceptual_hash.default_distance if phash else None,
+        )
+        files, size = manifest["media"]["files"], manifest["media"]["bytes"]
+    elif stage == "scanned":
+        scanned_album.scan_scanned_photos(
+            os.path.join(work, "scans"), batch_mode=True, default_album="Bench",
+            date_start="1900-01-01", date_end="2100-12-31", log=quiet,
+        )
+        files, size = manifest["scans"]["files"], manifest["scans"]["bytes"]
+    else:
+        album = os.path.join(work, "out", "Album")
+        clean_upload.copy_files(album, os.path.join(work, "upload"), log=quiet, confirm=lambda folder_name: False)
+        upload = os.path.join(work, "upload")
+        files = sum(len(names) for _, _, names in os.walk(upload))
+        size = tree_bytes(upload)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    io_after = proc_io()
+    rss = peak_rss_mb()
+
+    syscalls = dict(calls)
+    for key, name in (("syscr", "read"), ("syscw", "write")):
+        if key in io_after:
+            syscalls[name] = io_after[key] - io_before[key]
+    return {
+        "stage": stage,
+        "files": files,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "files_per_s": round(files / seconds, 1) if seconds else None,
+        "mb_per_s": round(size / (1024 * 1024) / seconds, 1) if size is not None and seconds else None,
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "syscalls": sum(syscalls.values()),
+        "syscall_counts": syscalls,
+    }
+
+def strace_total(path):
+    # Total call count from the last line of strace -c output
+    with open(path) as f:
+        for line in reversed(f.read().splitlines()):
+            fields = line.split()
+            if fields and fields[-1] == "total":
+                return int(fields[3])
+    return None
+
+def spawn_stage(stage, work, phash, use_strace):
+    command = [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--work", work]
+    if phash:
+        command.append("--phash")
+    strace_out = os.path.join(work, f"strace_{stage}.txt")
+    if use_strace:
+        command = ["strace", "-f", "-c", "-o", strace_out] + command
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{stage} failed:\n{result.stderr}")
+    metrics = json.loads(result.stdout.strip().splitlines()[-1])
+    if use_strace:
+        metrics["strace_syscalls"] = strace_total(strace_out)
+    return metrics
+
+def compare(results, baseline, threshold):
+    # Returns a list of "stage: metric old -> new" regressions
+    if baseline.get("tree") != results["tree"]:
+        print("  [WARNING] baseline was recorded on a different tree; comparing anyway")
+    regressions = []
+    for stage, metrics in results["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        for metric, higher_is_better in compared_metrics.items():
+            before, after = old.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{stage}: {metric} {before} -> {after} ({change:+.0%})")
+    return regressions
+
+def print_table(results, baseline=None):
+    print(f"  {'stage':<10} {'files/s':>10} {'MB/s':>8} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'syscalls':>10}")
+    for stage, m in results["stages"].items():
+        mb_per_s = f"{m['mb_per_s']:.1f}" if m["mb_per_s"] is not None else "-"
+        print(
+            f"  {stage:<10} {m['files_per_s']:>10,.1f} {mb_per_s:>8} {m['seconds']:>8.2f} "
+            f"{m['cpu_seconds']:>8.2f} {m['peak_rss_mb'] or 0:>8.1f} {m['syscalls']:>10,}"
+        )
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old and old.get("files_per_s"):
+            print(f"  {'':<10} {m['files_per_s'] / old['files_per_s']:>9.2f}x vs baseline")
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a generated media tree.")
+    parser.add_argument("--files", type=int, default=media_tree.default_settings["files"])
+    parser.add_argument("--seed", type=int, default=media_tree.default_settings["seed"])
+    parser.add_argument("--duplicate-ratio", type=float, default=media_tree.default_settings["duplicate_ratio"])
+    parser.add_argument("--collision-ratio", type=float, default=media_tree.default_settings["collision_ratio"])
+    parser.add_argument("--depth", type=int, default=media_tree.default_settings["depth"])
+    parser.add_argument("--stages", default=",".join(stages))
+    parser.add_argument("--phash", action="store_true", help="include near-duplicate hashing in organize (needs Pillow)")
+    parser.add_argument("--strace", action="store_true", help="also count every syscall with strace -c")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", help="write these results as JSON")
+    parser.add_argument("--threshold", type=float, default=default_threshold)
+    parser.add_argument("--work", help="working folder (default: a temp folder, removed afterwards)")
+    parser.add_argument("--run-stage", choices=stages, help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+def main():
+    options = parse_args(sys.argv[1:])
+    if options.run_stage:
+        print(json.dumps(run_stage(options.run_stage, options.work, options.phash)))
+        return 0
+    if options.strace and not shutil.which("strace"):
+        print("  [WARNING] strace not found; counting syscalls from /proc and audit hooks only")
+        options.strace = False
+
+    work = options.work or tempfile.mkdtemp(prefix="media_bench_")
+    try:
+        tree = {
+            "files": options.files, "seed": options.seed, "depth": options.depth,
+            "duplicate_ratio": options.duplicate_ratio, "collision_ratio": options.collision_ratio,
+        }
+        start = time.perf_counter()
+        media = media_tree.make_tree(os.path.join(work, "media"), **tree)
+        scans = media_tree.make_tree(
+            os.path.join(work, "scans"), **dict(tree, files=max(1, options.files // 4), video_ratio=0.0, junk_ratio=0.0)
+        )
+        with open(os.path.join(work, "manifest.json"), "w") as f:
+            json.dump({"media": media, "scans": scans}, f)
+        print(f"=== Pipeline benchmark ({media['files']:,} files, {media['bytes'] / (1024 * 1024):.0f} MB, "
+              f"generated in {time.perf_counter() - start:.1f}s) ===")
+
+        selected = [stage for stage in stages if stage in options.stages.split(",")]
+        if "upload" in selected and "organize" not in selected:
+            selected.insert(selected.index("upload"), "organize") # upload copies the organized album
+        results = {"tree": tree, "stages": {}}
+        for stage in selected:
+            results["stages"][stage] = spawn_stage(stage, work, options.phash, options.strace)
+
+        baseline = None
+        if options.baseline:
+            with open(options.baseline) as f:
+                baseline = json.load(f)
+        print_table(results, baseline)
+        if options.save_baseline:
+            with open(options.save_baseline, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"  saved to {options.save_baseline}")
+        if baseline:
+            regressions = compare(results, baseline, options.threshold)
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            if regressions:
+                return 1
+            print(f"  no regressions beyond {options.threshold:.0%}")
+        return 0
+    finally:
+        if not options.work:
+            shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
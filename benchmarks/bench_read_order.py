@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+import hashing
+import physical_order
+
+# Seek cost of reading a fragmented tree in path order vs physical_order. Builds
+# a loopback ext4 image (needs root, mkfs.ext4 and loop devices) and ages it:
+# filler files are written and half of them deleted again, then the media files
+# are written in shuffled order into the holes, so the disk layout has nothing
+# to do with the path order and larger files are split into several extents.
+# Then, for each order:
+#   seek MB       - head travel summed from the FIEMAP extents, in the order the
+#                   files would be read (gap between one extent's end and the next
+#                   extent's start)
+#   seeks         - reads that don't continue where the previous one ended
+#   cold read     - wall time to hash every file sequentially after dropping the
+#                   page cache (one reader, as the scheduler allows on an HDD)
+# The image sits on whatever disk holds the temp folder, so cold read times only
+# mean something if that is a spinning disk; the seek columns don't depend on it.
+# With --root DIR the files are written there instead (no root needed, any
+# filesystem; the FIEMAP columns are skipped if it has no extent map).
+# Run from the repo root:
+#   sudo python benchmarks/bench_read_order.py [--files N] [--image-mb MB]
+
+orders = ("none", "inode", "extent")
+default_files = 400
+default_image_mb = 512
+chunk_size = 64 * 1024
+max_extents = 4096
+folder_count = 20
+
+def write_file(path, size, rng):
+    with open(path, "wb") as f:
+        f.write(rng.randbytes(size))
+        f.flush()
+        os.fsync(f.fileno()) # allocate now, in this order
+
+def make_aged(root, files, seed, budget):
+    # Media files of 256 KB - 2 MB (scaled down to fit the budget) written in shuffled
+    # order over an equal amount of filler, half of which was deleted first
+    rng = random.Random(seed)
+    sizes = [rng.randint(4, 32) * chunk_size for _ in range(files)]
+    scale = min(1.0, budget / (1.5 * sum(sizes)))
+    sizes = [max(chunk_size, int(size * scale) // chunk_size * chunk_size) for size in sizes]
+    filler_folder = os.path.join(root, "filler")
+    os.makedirs(filler_folder)
+    fillers = []
+    for i, size in enumerate(sizes):
+        filler = os.path.join(filler_folder, f"{i:05d}.bin")
+        write_file(filler, size, rng)
+        fillers.append(filler)
+    for filler in rng.sample(fillers, len(fillers) // 2):
+        os.remove(filler)
+    paths = []
+    for i, size in enumerate(sizes):
+        folder = os.path.join(root, f"folder_{i % folder_count:02d}")
+        os.makedirs(folder, exist_ok=True)
+        paths.append((os.path.join(folder, f"IMG_{i:05d}.jpg"), size))
+    writing = list(paths)
+    rng.shuffle(writing)
+    for path, size in writing:
+        write_file(path, size, rng)
+    return sorted(path for path, _ in paths)
+
+def seek_stats(paths):
+    # (seek bytes, seeks) reading paths in order, or (None, None) without FIEMAP
+    travel = seeks = 0
+    position = None
+    try:
+        for path in paths:
+            for _, physical, length in physical_order.extents(path, max_extents):
+                if position is not None and physical != position:
+                    travel += abs(physical - position)
+                    seeks += 1
+                position = physical + length
+    except physical_order.NoExtentMap:
+        return None, None
+    return travel, seeks
+
+def drop_caches():
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+def cold_read(paths):
+    start = time.perf_counter()
+    for path in paths:
+        hashing.hash_file(path)
+    return time.perf_counter() - start
+
+def mount_image(work, size_mb):
+    image = os.path.join(work, "bench.img")
+    mount = os.path.join(work, "mnt")
+    os.makedirs(mount)
+    with open(image, "wb") as f:
+        f.truncate(size_mb * 1024 * 1024)
+    subprocess.run(["mkfs.ext4", "-q", "-F", image], check=True, capture_output=True)
+    subprocess.run(["mount", "-o", "loop", image, mount], check=True, capture_output=True)
+    return mount
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Compare seek cost of path order and physical read order.")
+    parser.add_argument("--files", type=int, default=default_files)
+    parser.add_argument("--image-mb", type=int, default=default_image_mb)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--root", help="write the files here instead of a loopback ext4 image")
+    return parser.parse_args(args)
+
+def main():
+    options = parse_args(sys.argv[1:])
+    work = tempfile.mkdtemp(prefix="read_order_bench_")
+    mount = root = None
+    try:
+        if options.root:
+            root = os.path.join(options.root, "read_order_bench")
+            budget = 2 * 1024 ** 3
+        else:
+            if os.geteuid() != 0 or not shutil.which("mkfs.ext4"):
+                print("  needs root and mkfs.ext4 for the loopback image; use --root DIR to test a folder")
+                return 2
+            try:
+                mount = mount_image(work, options.image_mb)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"  could not mount a loopback ext4 image: {e}")
+                return 2
+            root = os.path.join(mount, "media")
+            budget = options.image_mb * 1024 * 1024 * 0.7 # leave ext4 room for metadata
+        shutil.rmtree(root, ignore_errors=True)
+        paths = make_aged(root, options.files, options.seed, budget)
+        total_mb = sum(os.path.getsize(path) for path in paths) / (1024 * 1024)
+        where = "loopback ext4" if mount else root
+        print(f"=== Read order benchmark ({len(paths)} files, {total_mb:.0f} MB, {where}) ===")
+        cold = drop_caches()
+        if not cold:
+            print("  [WARNING] could not drop the page cache; read times are warm")
+
+        results = {}
+        for mode in orders:
+            ordered = physical_order.order_paths(paths, mode, log=lambda *parts: None)
+            travel, seeks = seek_stats(ordered)
+            if cold:
+                drop_caches()
+            results[mode] = (travel, seeks, cold_read(ordered))
+
+        base_travel, base_seeks, base_time = results["none"]
+        print(f"  {'order':<8} {'seek MB':>12} {'seeks':>8} {'read s':>8} {'MB/s':>8}")
+        for mode, (travel, seeks, seconds) in results.items():
+            label = "path" if mode == "none" else mode
+            travel_text = f"{travel / (1024 * 1024):12,.1f}" if travel is not None else f"{'-':>12}"
+            seeks_text = f"{seeks:8,}" if seeks is not None else f"{'-':>8}"
+            print(f"  {label:<8} {travel_text} {seeks_text} {seconds:8.2f} {total_mb / seconds:8.1f}")
+        extent_travel = results["extent"][0]
+        if base_travel and extent_travel is not None:
+            print(f"  extent order: {1 - extent_travel / base_travel:.1%} less head travel, "
+                  f"{base_seeks - results['extent'][1]:,} fewer seeks than path order")
+        return 0
+    finally:
+        if options.root and root:
+            shutil.rmtree(root, ignore_errors=True)
+        if mount:
+            subprocess.run(["umount", mount], capture_output=True)
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+
+# GUI cold-start time: a fresh interpreter imports main, builds PhotoToolsApp and
+# draws the first frame. The first run starts without the resized-logo cache;
+# the rest are warm. Exits 1 if the warm median is over the limit or a tool
+# module / Pillow / dateutil got imported at startup. Needs a display. Run from
+# the repo root:
+#   python benchmarks/bench_startup.py [runs] [limit_seconds]
+
+startup_limit = 1.5 # seconds, warm median, interpreter start included
+lazy_modules = ["PIL", "dateutil", "photo_scan", "cross_pic_organizer", "scanned_album", "clean_upload"]
+
+child_code = """
+import sys, time, json
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.PhotoToolsApp()
+app.update()
+shown = time.perf_counter()
+app.destroy()
+print(json.dumps({
+    "import": imported - start,
+    "window": shown - imported,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+def run_once():
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", child_code % (lazy_modules,)],
+        cwd=repo_root, capture_output=True, text=True,
+    )
+    total = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "startup failed")
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["total"] = total
+    return stats
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    limit = float(sys.argv[2]) if len(sys.argv) > 2 else startup_limit
+
+    import main as app_module
+    cache_path = os.path.join(repo_root, app_module.logo_cache_path)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+    print(f"=== GUI startup benchmark ({runs} runs, limit {limit:.2f}s) ===")
+    results = []
+    for i in range(runs):
+        try:
+            stats = run_once()
+        except RuntimeError as e:
+            print(f"  could not start the GUI: {e}")
+            return 2
+        label = "first (no logo cache)" if i == 0 else f"warm {i}"
+        loaded = ", ".join(stats["loaded"]) or "-"
+        print(f"  {label:<22} total {stats['total']:6.3f}s | import {stats['import']:6.3f}s | window {stats['window']:6.3f}s | eager: {loaded}")
+        results.append(stats)
+
+    warm = results[1:] or results
+    median = statistics.median(s["total"] for s in warm)
+    eager = sorted({name for s in warm for name in s["loaded"]})
+    print(f"  warm median: {median:.3f}s (limit {limit:.2f}s)")
+    failed = False
+    if median > limit:
+        print("  FAIL: startup is over the limit")
+        failed = True
+    if eager:
+        print(f"  FAIL: imported at startup: {', '.join(eager)}")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
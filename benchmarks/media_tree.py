@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import shutil
+
+# Deterministic synthetic media trees for the benchmarks. The same settings and
+# seed always give the same folders, names, contents and mtimes. Files start
+# with real JPEG / PNG / MP4 headers (enough for image_probe, not for a full
+# decode) followed by seeded random data. Knobs:
+#   files            number of media files
+#   depth, fanout    folder tree shape (fanout ** depth leaf folders)
+#   duplicate_ratio  share of files that are byte copies of an earlier file
+#   collision_ratio  share of files drawn from a small pool of names (IMG_0001.jpg, ...)
+#   video_ratio      share of MP4s
+#   junk_ratio       share of thumbnails the organizer sends to junk
+#   low_res_ratio    share of images under 400x400 (flagged by the scanned-album tool)
+# Run from the repo root:
+#   python benchmarks/media_tree.py ROOT [files] [seed]
+
+default_settings = {
+    "files": 2000,
+    "depth": 3,
+    "fanout": 4,
+    "duplicate_ratio": 0.1,
+    "collision_ratio": 0.2,
+    "video_ratio": 0.15,
+    "junk_ratio": 0.03,
+    "low_res_ratio": 0.05,
+    "min_size": 20 * 1024,
+    "max_size": 400 * 1024,
+    "seed": 1234,
+}
+
+folder_names = ["2016", "2017", "2018", "2019", "2020", "Family", "Summer Trip", "Phone", "Camera", "DCIM", "Holidays", "Misc"]
+image_dims = [(4032, 3024), (3000, 2000), (1920, 1080), (1280, 960), (800, 600)]
+low_res_dims = [(320, 240), (160, 120)]
+name_pool = 50 # names shared by colliding files
+mtime_start = 1420070400 # 2015-01-01
+mtime_span = 10 * 365 * 24 * 3600
+
+def jpeg_header(width, height):
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    sos = b"\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00"
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0
+        + b"\xff\xc0" + struct.pack(">H", len(sof0) + 2) + sof0
+        + b"\xff\xda" + struct.pack(">H", len(sos) + 2) + sos
+    )
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+def png_header(width, height):
+    return b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+def mp4_header(file_size):
+    # ftyp box, then an mdat box running to the end of the file
+    ftyp = b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41"
+    return struct.pack(">I", len(ftyp) + 8) + b"ftyp" + ftyp + struct.pack(">I", file_size - len(ftyp) - 8) + b"mdat"
+
+def file_bytes(recipe):
+    # Contents are rebuilt from the recipe, so duplicates never have to be held in memory
+    kind, size, dims, content_seed = recipe["kind"], recipe["size"], recipe["dims"], recipe["content_seed"]
+    rng = random.Random(content_seed)
+    if kind == "jpg":
+        header, trailer = jpeg_header(*dims), b"\xff\xd9"
+    elif kind == "png":
+        header, trailer = png_header(*dims), png_chunk(b"IEND", b"")
+    else:
+        header, trailer = mp4_header(size), b""
+    body = size - len(header) - len(trailer)
+    if kind == "png":
+        body -= 12 # IDAT chunk framing
+        return header + png_chunk(b"IDAT", rng.randbytes(body)) + trailer
+    return header + rng.randbytes(body) + trailer
+
+def folder_paths(root, depth, fanout, rng):
+    folders = [root]
+    for _ in range(depth):
+        folders = [
+            os.path.join(parent, f"{name} {i:02d}")
+            for parent in folders
+            for i, name in enumerate(rng.sample(folder_names, fanout))
+        ]
+    return folders
+
+def make_tree(root, **overrides):
+    # Builds the tree under root (replacing it) and returns a manifest:
+    # {"settings", "files", "bytes", "duplicates", "collisions", "paths"}
+    settings = dict(default_settings, **overrides)
+    rng = random.Random(settings["seed"])
+    shutil.rmtree(root, ignore_errors=True)
+    folders = folder_paths(root, settings["depth"], settings["fanout"], rng)
+    recipes = []
+    paths = []
+    total_bytes = duplicates = collisions = 0
+    used = set()
+    for i in range(settings["files"]):
+        if recipes and rng.random() < settings["duplicate_ratio"]:
+            recipe = rng.choice(recipes)
+            duplicates += 1
+        else:
+            kind = "mp4" if rng.random() < settings["video_ratio"] else rng.choice(["jpg", "jpg", "jpg", "png"])
+            dims = rng.choice(low_res_dims if rng.random() < settings["low_res_ratio"] else image_dims)
+            recipe = {
+                "kind": kind,
+                "size": rng.randint(settings["min_size"], settings["max_size"]),
+                "dims": dims,
+                "content_seed": rng.getrandbits(64),
+            }
+            recipes.append(recipe)
+        if rng.random() < settings["collision_ratio"]:
+            stem = f"IMG_{rng.randrange(name_pool):04d}"
+            collisions += 1
+        else:
+            stem = f"IMG_{i + 10000:06d}"
+        if rng.random() < settings["junk_ratio"]:
+            stem = "thumb_" + stem
+        folder = rng.choice(folders)
+        path = os.path.join(folder, f"{stem}.{recipe['kind']}")
+        while path in used: # same name in the same folder: make it unique there
+            path = os.path.join(folder, f"{stem}_{rng.randrange(1 << 20)}.{recipe['kind']}")
+        used.add(path)
+        os.makedirs(folder, exist_ok=True)
+        data = file_bytes(recipe)
+        with open(path, "wb") as f:
+            f.write(data)
+        mtime = mtime_start + rng.randrange(mtime_span)
+        os.utime(path, (mtime, mtime))
+        total_bytes += len(data)
+        paths.append(path)
+    return {
+        "settings": settings,
+        "files": len(paths),
+        "bytes": total_bytes,
+        "duplicates": duplicates,
+        "collisions": collisions,
+        "paths": paths,
+    }
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: python benchmarks/media_tree.py ROOT [files] [seed]")
+        return 1
+    overrides = {}
+    if len(sys.argv) > 2:
+        overrides["files"] = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        overrides["seed"] = int(sys.argv[3])
+    start = time.perf_counter()
+    manifest = make_tree(sys.argv[1], **overrides)
+    summary = {key: value for key, value in manifest.items() if key != "paths"}
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
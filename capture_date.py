@@ -0,0 +1,237 @@
+import os
+import re
+import struct
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_cache
+import hashing
+
+# Works out when a photo or video was taken, reading only file headers:
+#   exif     - EXIF DateTimeOriginal / CreateDate (JPEG, TIFF, RAW, HEIC), XMP
+#              CreateDate, or the MP4/MOV movie header creation time
+#   filename - dates embedded in names like IMG_20190704_123456.jpg
+#   mtime    - the file's modification time (what the organizer used before)
+# Sources are tried in order. The EXIF result depends only on file content, so it
+# is cached next to the content hashes and read once per file.
+
+default_sources = ("exif", "filename", "mtime")
+default_workers = min(16, (os.cpu_count() or 1) * 4)
+
+header_scan_bytes = 512 * 1024 # how far to look for embedded Exif/XMP blocks
+cache_field = "capture_date"
+
+exif_date_format = "%Y:%m:%d %H:%M:%S"
+mp4_epoch = datetime(1904, 1, 1)
+
+filename_pattern = re.compile(
+    r"(?<!\d)((?:19|20)\d{2})[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])"
+    r"(?:[-_. T]?([01]\d|2[0-3])[-_.:]?([0-5]\d)[-_.:]?([0-5]\d))?(?!\d)"
+)
+xmp_pattern = re.compile(
+    rb"(?:exif:DateTimeOriginal|xmp:CreateDate|photoshop:DateCreated)"
+    rb"(?:=\"|>)(\d{4})-(\d{2})-(\d{2})(?:T(\d{2}):(\d{2})(?::(\d{2}))?)?"
+)
+
+def _parse_exif_text(raw):
+    text = raw.split(b"\0", 1)[0].decode("ascii", "ignore").strip()
+    try:
+        value = datetime.strptime(text, exif_date_format)
+    except ValueError:
+        return None
+    return value if value.year > 1900 else None
+
+def _dates_from_tiff(data, base=0):
+    # data holds a TIFF structure starting at `base` (EXIF block or whole TIFF header)
+    byte_order = {b"II": "<", b"MM": ">"}.get(data[base:base + 2])
+    if not byte_order:
+        return None
+
+    def u16(pos):
+        return struct.unpack(byte_order + "H", data[base + pos:base + pos + 2])[0]
+
+    def u32(pos):
+        return struct.unpack(byte_order + "I", data[base + pos:base + pos + 4])[0]
+
+    def read_ifd(offset):
+        tags = {}
+        count = u16(offset)
+        for i in range(min(count, 1024)):
+            entry = offset + 2 + i * 12
+            tag, typ, n = u16(entry), u16(entry + 2), u32(entry + 4)
+            if typ == 2: # ASCII
+                start = entry + 8 if n <= 4 else u32(entry + 8)
+                tags[tag] = data[base + start:base + start + n]
+            elif typ in (4, 13) and n == 1:
+                tags[tag] = u32(entry + 8)
+        return tags
+
+    try:
+        ifd0 = read_ifd(u32(4))
+        exif_ifd = read_ifd(ifd0[0x8769]) if 0x8769 in ifd0 else {}
+    except (struct.error, IndexError):
+        return None
+    # DateTimeOriginal, then CreateDate (DateTimeDigitized)
+    for tag in (0x9003, 0x9004):
+        if tag in exif_ifd:
+            value = _parse_exif_text(exif_ifd[tag])
+            if value:
+                return value
+    return None
+
+def _date_from_xmp(data):
+    m = xmp_pattern.search(data)
+    if not m:
+        return None
+    parts = [int(p) if p else 0 for p in m.groups()]
+    try:
+        return datetime(*parts)
+    except ValueError:
+        return None
+
+def _jpeg_date(f):
+    f.seek(2)
+    xmp_date = None
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+            return xmp_date
+        if 0xD0 <= marker[1] <= 0xD7 or marker[1] == 0x01:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if marker[1] == 0xE1: # APP1: Exif or XMP
+            segment = f.read(length - 2)
+            if segment.startswith(b"Exif\0\0"):
+                value = _dates_from_tiff(segment, 6)
+                if value:
+                    return value
+            elif b"ns.adobe.com/xap" in segment[:64]:
+                xmp_date = xmp_date or _date_from_xmp(segment)
+        else:
+            f.seek(length - 2, 1)
+
+def _tiff_date(f):
+    # RAW files can be huge; the IFDs with dates sit near the start
+    return _dates_from_tiff(f.read(header_scan_bytes))
+
+def _mp4_date(f):
+    # moov/mvhd creation_time: seconds since 1904-01-01 UTC
+    f.seek(0, 2)
+    end = f.tell()
+    pos = 0
+    containers = {b"moov"}
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return None
+        if box_type in containers:
+            pos += header
+            continue
+        if box_type == b"mvhd":
+            version = f.read(1)[0]
+            f.read(3)
+            created = struct.unpack(">Q", f.read(8))[0] if version == 1 else struct.unpack(">I", f.read(4))[0]
+            if not created:
+                return None
+            utc = mp4_epoch + timedelta(seconds=created)
+            if utc.year < 1971:
+                return None
+            return datetime.fromtimestamp((utc - datetime(1970, 1, 1)).total_seconds())
+        pos += size
+    return None
+
+def exif_date(path):
+    # Capture date from the file's own metadata, or None
+    try:
+        with open(path, "rb") as f:
+            head = f.read(12)
+            if head[:2] == b"\xff\xd8":
+                return _jpeg_date(f)
+            if head[:2] in (b"II", b"MM"):
+                f.seek(0)
+                value = _tiff_date(f)
+                if value:
+                    return value
+            if head[4:8] == b"ftyp" and head[8:10] not in (b"he", b"mi", b"ms"):
+                value = _mp4_date(f)
+                if value:
+                    return value
+            # HEIC, PNG and others: look for an embedded Exif block or XMP packet
+            f.seek(0)
+            data = f.read(header_scan_bytes)
+            at = data.find(b"Exif\0\0")
+            if at >= 0:
+                value = _dates_from_tiff(data, at + 6)
+                if value:
+                    return value
+            return _date_from_xmp(data)
+    except (OSError, struct.error, IndexError, ValueError):
+        return None
+
+def filename_date(path):
+    for m in filename_pattern.finditer(os.path.basename(str(path))):
+        parts = [int(p) if p else 0 for p in m.groups()]
+        try:
+            return datetime(*parts)
+        except ValueError:
+            continue
+    return None
+
+def mtime_date(path):
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path))
+    except OSError:
+        return None
+
+def cached_exif_date(path, cache=None):
+    cache = cache or hash_cache.get_cache()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    found, value = cache.lookup_meta(path, cache_field, st=st)
+    if found:
+        return datetime.fromisoformat(value) if value else None
+    value = exif_date(path)
+    cache.store_meta(path, cache_field, value.isoformat() if value else "", st=st)
+    return value
+
+source_funcs = {
+    "exif": cached_exif_date,
+    "filename": filename_date,
+    "mtime": mtime_date,
+}
+
+def check_sources(sources):
+    unknown = [s for s in sources if s not in source_funcs]
+    if unknown:
+        raise ValueError(f"Unknown date source(s): {', '.join(unknown)}")
+    return tuple(sources)
+
+def get_capture_date(path, sources=default_sources, log=print):
+    # Returns (datetime, source) from the first source that has an answer, or (None, None)
+    for source in sources:
+        try:
+            value = source_funcs[source](path)
+        except Exception as e:
+            log(f"[DATE ERROR] {source} date failed for {path}: {e}")
+            continue
+        if value:
+            return value, source
+    return None, None
+
+def iter_dates(paths, sources=default_sources, workers=None, log=print):
+    # Yields (path, datetime or None) in input order, reading headers on a thread pool
+    check_sources(sources)
+    workers = workers or default_workers
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from hashing.bounded_map(
+            pool, lambda p: (p, get_capture_date(p, sources, log=log)[0]), paths, workers * 4
+        )
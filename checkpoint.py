@@ -0,0 +1,86 @@
+import os
+
+import journal
+
+# Lets a long organize / scanned-album / clean-upload job pick up where it
+# stopped. Progress is the operation journal itself: every destination is
+# journalled as a "claim" before its copy starts and as a "copy" once it has
+# landed. A restarted job with the same key finds the unfinished run, reuses
+# its run id, and looks files up in memory:
+#   completed(src) -> entry  the copy finished last time, skip it
+#   claimed(src)   -> dst    the copy was cut off, redo it into the same file
+# so the final output matches an uninterrupted run. With repair, completed
+# destinations whose size doesn't match the journal are copied again too.
+# Journal lines survive the process dying; after a power loss the last unsynced
+# batch may be gone, and those few files are copied again under new names.
+# With start=False nothing is written: a job that only plans reads the
+# unfinished run (if any) and leaves run as None otherwise.
+
+class Checkpoint:
+    def __init__(self, tool, key, resume=True, repair=False, path=journal.operations_file, log=print, start=True):
+        self.journal = journal.get_journal(path)
+        self.tool = tool
+        self.key = key
+        self.repair = repair
+        self.log = log
+        self.done = {} # src -> journal entry of the finished copy/move
+        self.claims = {} # src -> dst
+        self.run = self._find_unfinished(path) if resume else None
+        if self.run:
+            self._load(path)
+            if start:
+                log(f"[RESUME] Continuing {self.run}: {len(self.done)} copies done, {len(self.claims)} to redo")
+        elif start:
+            self.run = self.journal.start_run(tool, job=key)
+
+    def _find_unfinished(self, path):
+        latest = None
+        closed = set()
+        for entry in journal.iter_entries(path, op=("run", "done", "undo")):
+            if entry["op"] == "run":
+                if entry.get("tool") == self.tool and entry.get("job") == self.key:
+                    latest = entry["run"]
+            else:
+                closed.add(entry.get("run"))
+        return latest if latest and latest not in closed else None
+
+    def _load(self, path):
+        for entry in journal.iter_entries(path, run=self.run, op=("claim", "copy", "move")):
+            src = entry.get("src")
+            if entry["op"] == "claim":
+                self.claims[src] = entry["dst"]
+            else:
+                self.done[src] = entry
+                self.claims.pop(src, None)
+
+    def destinations(self):
+        # Every destination this run already owns, to be reserved before new names are handed out
+        return list(self.claims.values()) + [entry["dst"] for entry in self.done.values()]
+
+    def completed(self, src):
+        # Journal entry of a finished copy of src ("dst", "bytes", ...), or None
+        entry = self.done.get(str(src))
+        if not entry:
+            return None
+        dst, size = entry["dst"], entry.get("bytes")
+        if self.repair and size is not None:
+            try:
+                intact = os.path.getsize(dst) == size
+            except OSError:
+                intact = False
+            if not intact:
+                self.log(f"[REPAIR] {dst} is incomplete, copying it again")
+                self.claims[str(src)] = dst
+                del self.done[str(src)]
+                return None
+        return entry
+
+    def claimed(self, src):
+        return self.claims.get(str(src))
+
+    def claim(self, src, dst, **fields):
+        self.journal.append("claim", run=self.run, src=str(src), dst=dst, **fields)
+
+    def finish(self, **fields):
+        self.journal.append("done", run=self.run, **fields)
+        self.journal.sync()
@@ -1,7 +1,12 @@
 import os
-import shutil
 from pathlib import Path
 
+import checkpoint
+import copy_engine
+import io_scheduler
+import journal
+import metrics
+
 # Constants
 skip_folders = {"duplicates", "junk", "Poor Images"}
 supported_extensions = {
@@ -18,36 +23,78 @@ def confirm_upload(folder_name):
     choice = input("Upload anyway? (y/N): ").strip().lower()
     return choice == "y"
 
-def copy_files(src_dir, dest_dir, log=print):
-    for root, dirs, files in os.walk(src_dir):
-        relative_root = os.path.relpath(root, src_dir)
-        folder_name = os.path.basename(root)
+@metrics.reported("clean_upload")
+def copy_files(src_dir, dest_dir, log=print, copier=None, progress=None, resume=True, repair=False, confirm=None):
+    # Copies are queued on copier (a CopyQueue shared across sources) or on a private one.
+    # progress is the job's Checkpoint; files an interrupted run already copied are skipped.
+    # confirm(folder_name) decides whether a flagged folder is uploaded anyway; without
+    # it flagged folders are skipped, so nothing waits on a prompt.
+    # Returns the number of failed copies when it owns the copier (else 0; see the copier).
+    own_copier = copier is None
+    if own_copier:
+        copier = copy_engine.CopyQueue(log=log, scheduler=io_scheduler.get_scheduler())
+    own_progress = progress is None
+    if own_progress:
+        job = f"{os.path.abspath(dest_dir)}|{os.path.abspath(src_dir)}"
+        progress = checkpoint.Checkpoint("clean_upload", job, resume=resume, repair=repair, log=log)
+    
+    with metrics.stage("upload.walk"):
+        for root, dirs, files in os.walk(src_dir):
+            relative_root = os.path.relpath(root, src_dir)
+            folder_name = os.path.basename(root)
         
-        # Skip flagged folders
-        if should_skip_folder(folder_name):
-            if not confirm_upload(folder_name):
-                log(f"[-] Skipping: {root}")
-                dirs[:] = [] # Don't descend further
-                continue
+            # Skip flagged folders
+            if should_skip_folder(folder_name):
+                if not (confirm and confirm(folder_name)):
+                    log(f"[-] Skipping: {root}")
+                    dirs[:] = [] # Don't descend further
+                    continue
         
-        dest_path = os.path.join(dest_dir, relative_root)
-        os.makedirs(dest_path, exist_ok=True)
+            dest_path = os.path.join(dest_dir, relative_root)
+            os.makedirs(dest_path, exist_ok=True)
         
-        for file in files:
-            ext = os.path.splitext(file)[1].lower()
-            if ext in supported_extensions:
-                src_file = os.path.join(root, file)
-                dest_file = os.path.join(dest_path, file)
+            for file in files:
+                ext = os.path.splitext(file)[1].lower()
+                if ext in supported_extensions:
+                    src_file = os.path.join(root, file)
+                    dest_file = os.path.join(dest_path, file)
                 
-                if not os.path.exists(dest_file):
-                    shutil.copy2(src_file, dest_file)
-                else:
-                    log(f"[!] File already exist in destination: {dest_file} (Skipping)")
+                    metrics.count("upload.files")
+                    if progress.completed(src_file):
+                        metrics.count("upload.resumed")
+                        continue
+                    if progress.claimed(src_file) == dest_file:
+                        pass # cut off last time: copy it again
+                    elif copy_engine.claim_exact(dest_file):
+                        progress.claim(src_file, dest_file)
+                    else:
+                        log(f"[!] File already exist in destination: {dest_file} (Skipping)")
+                        continue
+                    copier.submit(src_file, dest_file, on_done=lambda job: copy_done(job, progress.run, log))
+    
+    if own_copier:
+        with metrics.stage("upload.copy"):
+            copier.close()
+        copier.scheduler.log_summary(log)
+    if own_progress:
+        progress.finish()
+    return copier.failed if own_copier else 0
+
+def copy_done(job, run=None, log=print):
+    if not job.ok:
+        log(f"[!] Failed to copy {job.src}: {job.error}")
+        return
+    journal.get_journal().append("copy", run=run, src=str(job.src), dst=job.dst, bytes=job.bytes)
                     
-def batch_clean_upload(source_folders, target_folder, log=print):
+@metrics.reported("clean_upload")
+def batch_clean_upload(source_folders, target_folder, log=print, resume=True, repair=False, confirm=None):
     target_path = Path(target_folder)
     os.makedirs(target_path, exist_ok=True)
     
+    # Copies are limited per device, so several sources on different drives copy in parallel
+    copier = copy_engine.CopyQueue(log=log, scheduler=io_scheduler.get_scheduler())
+    job = "|".join([os.path.abspath(target_path)] + [os.path.abspath(src) for src in source_folders])
+    progress = checkpoint.Checkpoint("clean_upload", job, resume=resume, repair=repair, log=log)
     for src_folder in source_folders:
         src_path = Path(src_folder)
         if not src_path.exists():
@@ -55,9 +102,18 @@ def batch_clean_upload(source_folders, target_folder, log=print):
             continue
         
         log(f"[+] Copying from: {src_path}")
-        copy_files(src_path, target_path)
+        copy_files(src_path, target_path, log=log, copier=copier, progress=progress, confirm=confirm)
+    copier.close()
+    copier.scheduler.log_summary(log)
+    progress.finish()
     
     log("\nClean upload directory created at:", target_path)
+    return copier.failed
+    
+def run_clean_upload(source_folder, target_folder, log=print, resume=True, repair=False, confirm=None):
+    # Single organized folder, as started from the GUI and the command line runner.
+    # Returns the number of failed copies.
+    return batch_clean_upload([source_folder], target_folder, log=log, resume=resume, repair=repair, confirm=confirm)
     
 if __name__ == "__main__":
     print("\n=== Clean Upload Tool ===")
@@ -67,4 +123,4 @@ if __name__ == "__main__":
     album_name = input("Enter a name for the New cleaned Family Album: ").strip()
     
     full_target_path = os.path.join(target_folder, album_name)
-    batch_clean_upload(source_folder, full_target_path)
+    batch_clean_upload(source_folder, full_target_path, confirm=confirm_upload)
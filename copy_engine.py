@@ -0,0 +1,319 @@
+import os
+import sys
+import time
+import errno
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import hash_cache
+import hashing
+import io_scheduler
+import metrics
+
+# File copies for all tools. Data is moved by the kernel where possible:
+#   reflink (FICLONE)  - copy-on-write clone, no data copied (Btrfs, XFS, ...)
+#   copy_file_range    - in-kernel copy, server-side on NFS 4.2 / SMB
+#   sendfile           - in-kernel copy on older Linux
+#   buffered           - large reusable buffer, everywhere else
+# "hardlink" mode links instead of copying when source and destination share a
+# filesystem. CopyQueue runs a bounded number of copies concurrently: on its
+# own pool of `workers` threads, or on an io_scheduler.IOScheduler, which limits
+# copies per source and destination device instead.
+#
+# With a hash algorithm, each copy also yields the source's content digest. A
+# digest already in the hash cache is reused and the kernel copies as usual;
+# otherwise the data is hashed while it passes through the copy buffer, so the
+# file is read once for both. New digests go into the hash cache. The copy can
+# then be verified by reading the destination back:
+#   sample - compare sample_blocks blocks spread across source and destination
+#   full   - re-hash the whole destination and compare digests
+
+copy_modes = ("auto", "hardlink")
+verify_modes = ("none", "sample", "full")
+default_workers = 4
+buffer_size = 8 * 1024 * 1024
+sample_blocks = 8
+sample_block_size = 64 * 1024
+ficlone = 0x40049409 # _IOW(0x94, 9, int) from linux/fs.h
+
+# errnos meaning "this method isn't available here, try the next one"
+fallback_errnos = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM}
+
+class VerifyError(Exception):
+    pass
+
+def claim_exact(dest):
+    # Atomically reserves dest by creating it empty; False if it already exists
+    try:
+        os.close(os.open(dest, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+    except FileExistsError:
+        return False
+    return True
+
+def _reflink(src_fd, dst_fd, size):
+    import fcntl
+    fcntl.ioctl(dst_fd, ficlone, src_fd)
+    return size
+
+def _copy_file_range(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, min(size - copied, 1 << 30))
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _sendfile(src_fd, dst_fd, size):
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dst_fd, src_fd, copied, min(size - copied, 1 << 30))
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _buffered(src_fd, dst_fd, size, hasher=None):
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    copied = 0
+    with open(src_fd, "rb", buffering=0, closefd=False) as src, open(dst_fd, "wb", buffering=0, closefd=False) as dst:
+        while True:
+            n = src.readinto(buf)
+            if not n:
+                break
+            if hasher:
+                hasher.update(view[:n])
+            dst.write(view[:n])
+            copied += n
+    return copied
+
+def _kernel_methods():
+    methods = []
+    if sys.platform.startswith("linux"):
+        methods.append(("reflink", _reflink))
+    if hasattr(os, "copy_file_range"):
+        methods.append(("copy_file_range", _copy_file_range))
+    if sys.platform.startswith("linux") and hasattr(os, "sendfile"):
+        methods.append(("sendfile", _sendfile))
+    return methods
+
+kernel_methods = _kernel_methods()
+
+def _rewind(src_fd, dst_fd):
+    # A method that failed part way may have moved either offset and written data
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    os.ftruncate(dst_fd, 0)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+
+def copy_data(src, dst, hasher=None):
+    # Copies file contents, returns (bytes, method). A hasher forces the buffered
+    # path so the data can be digested on the way through.
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(src_fd).st_size
+        if hasher:
+            copied = _buffered(src_fd, dst_fd, size, hasher)
+            hashing.add_bytes_read(copied)
+            return copied, "hashed"
+        for name, method in kernel_methods:
+            try:
+                copied = method(src_fd, dst_fd, size)
+            except OSError as e:
+                if e.errno not in fallback_errnos:
+                    raise
+                _rewind(src_fd, dst_fd)
+                continue
+            if copied == size:
+                io_scheduler.transferred(copied)
+                return copied, name
+            # Partial kernel copy: start over with the next method
+            _rewind(src_fd, dst_fd)
+        copied = _buffered(src_fd, dst_fd, size)
+        io_scheduler.transferred(copied)
+        return copied, "buffered"
+
+def _sample_offsets(size):
+    if size <= sample_blocks * sample_block_size:
+        return [0]
+    last = size - sample_block_size
+    return [last * i // (sample_blocks - 1) for i in range(sample_blocks)]
+
+def verify_copy(src, dst, verify="sample", digest=None, algo=hashing.default_algo):
+    # Raises VerifyError if dst doesn't match src
+    size = os.path.getsize(src)
+    if os.path.getsize(dst) != size:
+        raise VerifyError(f"size mismatch after copy: {dst}")
+    if verify == "full":
+        expected = digest or hashing.hash_file(src, algo)
+        if hashing.hash_file(dst, algo) != expected:
+            raise VerifyError(f"content mismatch after copy: {dst}")
+    elif verify == "sample":
+        length = size if size <= sample_blocks * sample_block_size else sample_block_size
+        with open(src, "rb") as fsrc, open(dst, "rb") as fdst:
+            for offset in _sample_offsets(size):
+                fsrc.seek(offset)
+                fdst.seek(offset)
+                if fsrc.read(length) != fdst.read(length):
+                    raise VerifyError(f"content mismatch at byte {offset}: {dst}")
+
+def copy_file(src, dst, mode="auto", preserve_metadata=True, hash_algo=None, verify="none"):
+    # Copies src over dst (which may be a claimed placeholder). preserve_metadata
+    # matches shutil.copy2, otherwise shutil.copy. Returns (bytes, method, digest);
+    # digest is None unless hash_algo is given.
+    if verify not in verify_modes:
+        raise ValueError(f"Unknown verify mode: {verify}")
+    digest = None
+    st = os.stat(src)
+    metrics.count("stat")
+    if hash_algo:
+        digest = hash_cache.get_cache().lookup(src, st=st, algo=hash_algo)
+    if mode == "hardlink":
+        try:
+            if st.st_dev == os.stat(os.path.dirname(dst) or ".").st_dev:
+                tmp = dst + ".link-tmp"
+                os.link(src, tmp)
+                os.replace(tmp, dst)
+                return st.st_size, "hardlink", digest # same inode: nothing to verify
+        except OSError:
+            pass # different filesystem or links not supported: copy instead
+    try:
+        hasher = hashlib.new(hash_algo) if hash_algo and not digest else None
+        copied, method = copy_data(src, dst, hasher)
+        if hasher:
+            digest = hasher.hexdigest()
+            hash_cache.get_cache().store(src, digest, st=st, algo=hash_algo)
+        if verify != "none":
+            verify_copy(src, dst, verify, digest, hash_algo or hashing.default_algo)
+        if preserve_metadata:
+            shutil.copystat(src, dst)
+        else:
+            shutil.copymode(src, dst)
+    except Exception:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+    return copied, method, digest
+
+class CopyJob:
+    def __init__(self, src, dst, tag=None):
+        self.src = src
+        self.dst = dst
+        self.tag = tag
+        self.bytes = 0
+        self.method = None
+        self.digest = None
+        self.seconds = 0.0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def mb_per_s(self):
+        return (self.bytes / (1024 * 1024)) / self.seconds if self.seconds else 0.0
+
+class CopyQueue:
+    def __init__(self, workers=None, mode="auto", log=print, max_pending=None, hash_algo=None, verify="none", scheduler=None):
+        if mode not in copy_modes:
+            raise ValueError(f"Unknown copy mode: {mode}")
+        if verify not in verify_modes:
+            raise ValueError(f"Unknown verify mode: {verify}")
+        self.workers = workers or default_workers
+        self.mode = mode
+        self.hash_algo = hashing.check_algo(hash_algo) if hash_algo else None
+        self.verify = verify
+        self.log = log
+        self.scheduler = scheduler
+        if scheduler:
+            self.pool = None
+            max_pending = max_pending or io_scheduler.max_pending # lets fast devices run ahead of a slow one
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        # Submitting blocks once this many copies are queued, keeping memory flat
+        self.slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self.callback_lock = threading.Lock()
+        self.futures = []
+        self.in_flight = 0
+        self.copied = 0
+        self.failed = 0
+        self.bytes = 0
+        self.methods = {}
+        self.start = time.perf_counter()
+
+    def _run(self, job, preserve_metadata, on_done):
+        start = time.perf_counter()
+        try:
+            job.bytes, job.method, job.digest = copy_file(
+                job.src, job.dst, self.mode, preserve_metadata, self.hash_algo, self.verify
+            )
+        except Exception as e:
+            job.error = e
+        job.seconds = time.perf_counter() - start
+        # Callbacks run one at a time, so callers can update counters without locks
+        with self.callback_lock:
+            self.in_flight -= 1
+            if job.ok:
+                self.copied += 1
+                self.bytes += job.bytes
+                self.methods[job.method] = self.methods.get(job.method, 0) + 1
+                metrics.count("copy.files")
+                metrics.count("copy.bytes", job.bytes)
+                metrics.count(f"copy.method.{job.method}")
+            else:
+                self.failed += 1
+                metrics.count("copy.failed")
+            try:
+                if on_done:
+                    on_done(job)
+            finally:
+                self.slots.release()
+        return job
+
+    def submit(self, src, dst, preserve_metadata=True, tag=None, on_done=None):
+        self.slots.acquire()
+        with self.callback_lock:
+            self.in_flight += 1
+            metrics.gauge("copy.queue_depth", self.in_flight)
+        job = CopyJob(src, dst, tag)
+        if self.scheduler:
+            future = self.scheduler.submit((src, dst), self._run, job, preserve_metadata, on_done)
+        else:
+            future = self.pool.submit(self._run, job, preserve_metadata, on_done)
+        self.futures.append(future)
+        if len(self.futures) > 4096:
+            self.futures = [f for f in self.futures if not f.done()]
+        return future
+
+    def wait(self):
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+    def summary(self):
+        seconds = time.perf_counter() - self.start
+        rate = (self.bytes / (1024 * 1024)) / seconds if seconds else 0.0
+        methods = ", ".join(f"{name}: {count}" for name, count in sorted(self.methods.items()))
+        verified = f" | verify: {self.verify}" if self.verify != "none" else ""
+        return (
+            f"{self.copied} copied | {self.failed} failed | {self.bytes / (1024 * 1024):.1f} MB | "
+            f"{rate:.1f} MB/s | {methods or 'none'}{verified}"
+        )
+
+    def close(self):
+        self.wait()
+        if self.pool:
+            self.pool.shutdown(wait=True)
+        if self.copied or self.failed:
+            self.log(f"[COPY] {self.summary()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,11 +1,27 @@
 import os
 import json
-import shutil
-import hashlib
 import time
+import threading
+from array import array
 from datetime import datetime
 
-from PIL import Image
+import capture_date
+import checkpoint
+import copy_engine
+import dedup
+import hash_cache
+import hashing
+import image_probe
+import io_scheduler
+import journal
+import media_list
+import media_records
+import metrics
+import name_allocator
+import perceptual_hash
+import path_rules
+import physical_order
+import pipeline
 
 image_extensions = (
     ".jpg", ".jpeg", ".png", ".heic", ".bmp", ".gif",
@@ -31,28 +47,26 @@ junk_keywords = [
     "sketch", "figma", "pdf", "doc", "ai", "eps", ".svg",
 ]
 
+# Compiled once; path_rules.json can override the keyword list
+junk_rules = path_rules.load_rule_set("junk_keywords", junk_keywords, default_mode="substring")
+
 def is_junk(filepath):
-    lower_path = filepath.lower()
-    return any(keyword in lower_path for keyword in junk_keywords)
+    return junk_rules.matches(filepath)
+
+def file_hash(path, log=print, algo=hashing.default_algo):
+    # Unchanged files (same device, inode, size and mtime) come from the hash cache
+    return hash_cache.get_cache().get_or_compute(path, lambda p: compute_file_hash(p, log=log, algo=algo), algo=algo)
 
-def file_hash(path, log=print):
-    hasher = hashlib.md5()
+def compute_file_hash(path, log=print, algo=hashing.default_algo):
     try:
-        with open(path, "rb") as f:
-            while chunk := f.read(8192):
-                hasher.update(chunk)
+        return hashing.hash_file(path, algo)
     except Exception as e:
         log(f"[HASH ERROR] Could not hash {path}: {e}")
         return None
-    return hasher.hexdigest()
 
-def get_file_date(path, log=print):
-    try:
-        ts = os.path.getmtime(path)
-        return datetime.fromtimestamp(ts)
-    except Exception as e:
-        log(f"[DATE ERROR] Could not get date for {path}: {e}")
-    return None
+def get_file_date(path, log=print, sources=capture_date.default_sources):
+    # Capture date via the EXIF -> filename -> mtime fallback chain
+    return capture_date.get_capture_date(path, sources, log=log)[0]
 
 def make_folder(path, log=print):
     try:
@@ -62,198 +76,542 @@ def make_folder(path, log=print):
     return path
 
 def get_image_resolution(path, log=print):
-    try:
-        with Image.open(path) as img:
-            return img.size # (width, height)
-    except Exception as e:
-        log(f"[RESOLUTION ERROR] Could not read resolution for {path}: {e}")
-        return (0, 0)
+    # Header-only probe; Pillow is only opened for formats the probe can't parse
+    return image_probe.get_size(path, log=log) # (width, height)
 
 
-def organize_media(media_dict, base_path, folder_name, log=print, progress_callback=None):
+plan_format = 1
+plan_kinds = ("copied", "duplicate", "junk")
+
+# organize_media runs as a pipeline by default:
+#   discover -> probe -> hash -> decide -> place -> copy
+# Image paths are stat'ed (discover) and their headers read (probe) in bounded
+# stages; files whose size collides are hashed meanwhile (dedup.Prehasher).
+# Deciding needs every probe (near-duplicate clusters span the whole set), then
+# capture dates are read on the date stage and every placed file goes straight
+# to the copy queue while the rest are still being placed; junk starts copying
+# during the probe. The plan and the copies are the same as in "sequential"
+# mode (plan everything, then copy), which is kept for debugging.
+# Each stage has workers and a queue_size: a full queue blocks the stage before
+# it. For copy, workers=None means the shared I/O scheduler and queue_size is
+# how many copies may wait on it.
+organize_modes = ("pipeline", "sequential")
+default_mode = "pipeline"
+default_stages = {
+    "discover": {"workers": 1, "queue_size": 1024},
+    "probe": {"workers": image_probe.default_workers, "queue_size": 256},
+    "hash": {"workers": hashing.default_workers, "queue_size": dedup.prehash_pending},
+    "date": {"workers": capture_date.default_workers, "queue_size": 256},
+    "copy": {"workers": None, "queue_size": io_scheduler.max_pending},
+}
+
+def stage_settings(overrides=None):
+    # default_stages with per-stage overrides, e.g. {"probe": {"workers": 4}}
+    settings = {name: dict(values) for name, values in default_stages.items()}
+    for name, values in (overrides or {}).items():
+        if name not in settings:
+            raise ValueError(f"Unknown pipeline stage: {name}")
+        unknown = set(values) - set(settings[name])
+        if unknown:
+            raise ValueError(f"Unknown setting for pipeline stage {name}: {', '.join(sorted(unknown))}")
+        settings[name].update(values)
+    return settings
+
+@metrics.reported("organize.plan")
+def plan_organize(media_dict, base_path, folder_name, log=print, progress_callback=None, hash_algo=hashing.default_algo, hash_workers=None, probe_workers=None, date_sources=capture_date.default_sources, near_duplicate_distance=perceptual_hash.default_distance, cached_only=False, resume=True, read_order=physical_order.default_mode, stages=None, on_op=None):
+    # Decides where every file goes without writing anything. Returns a plan dict whose
+    # "ops" (a media_records.OpTable) yields {"kind", "src", "dst", "size", "note"} in
+    # copy order. Per-file state is kept in array columns, not per-file objects.
+    # cached_only: near-duplicate and full content hashes come only from the hash cache;
+    # identical-looking files without a cached hash are matched on their head/tail blocks.
+    # stages (see stage_settings) runs the discover/probe/hash/date stages as a pipeline;
+    # on_op(op) is called with every op as soon as it is placed. Neither changes the plan.
     if progress_callback:
         progress_callback(0.0)
-        
-    root = make_folder(os.path.join(base_path, folder_name))
-    junk_folder = make_folder(os.path.join(root, "junk"))
-    duplicates_folder = make_folder(os.path.join(root, "duplicates"))
     
-    copied_hashes = set()
-    junk_count = 0
-    dup_count = 0
-    copied_count = 0
+    root = os.path.join(base_path, folder_name)
+    junk_folder = os.path.join(root, "junk")
+    duplicates_folder = os.path.join(root, "duplicates")
+    
+    copied_hashes = set() # packed content keys (dedup.DuplicateIndex.digest) already placed
+    cache = hash_cache.get_cache()
+    cache.reset_counters()
     processed_total = 0
-    resolution_map = {} # filename_no_ext -> (resolution, full_path)
+    probed = media_records.MediaRecords() # path, resolution and dHash of every non-junk image, in order
+    ops = media_records.OpTable(plan_kinds)
+    planned = {kind: 0 for kind in plan_kinds}
     
     start_time = time.time()
-    duplicates_list = []
     
-    total_files = len(media_dict.get("images", [])) + len(media_dict.get("videos", []))
+    total_files = count_media(media_dict)
     
-    for file_path in media_dict.get("images", []):
-        processed_total += 1
-        if progress_callback:
-            percent = (processed_total / total_files) * 100
-            progress_callback(percent)
-            
-        if not os.path.exists(file_path):
-            log(f"[MISSING] File does not exist: {file_path}")
-            continue
-        log(f"[IMAGE] Processing: {os.path.basename(file_path)}")
+    # Names are handed out in memory; files an interrupted run already placed keep their names
+    dest_names = name_allocator.NameAllocator()
+    prior = checkpoint.Checkpoint("organize", os.path.abspath(root), resume=resume, start=False, log=log)
+    for dest in prior.destinations():
+        dest_names.reserve(dest)
+    
+    def place(file_path, folder, kind, note=""):
+        done = prior.completed(file_path)
+        dest = done["dst"] if done else prior.claimed(file_path)
+        if not dest:
+            dest = dest_names.allocate(folder, os.path.basename(file_path), claim=False)
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            size = 0
+        ops.add(kind, file_path, dest, size, note)
+        planned[kind] += 1
+        metrics.count(f"organize.planned.{kind}")
+        metrics.count(f"organize.planned_bytes.{kind}", size)
+        if on_op:
+            on_op({"kind": kind, "src": file_path, "dst": dest, "size": size, "note": note})
+    
+    # Image headers are read ahead on a thread pool while this loop handles files in order
+    def probe_image(file_path):
+        if not os.path.exists(file_path) or is_junk(os.path.basename(file_path)):
+            return None
+        resolution = get_image_resolution(file_path, log=log)
+        phash = None
+        if near_duplicate_distance is not None:
+            phash = perceptual_hash.cached_dhash(file_path, log=log, compute=not cached_only)
+        return resolution, phash
+    
+    if cached_only:
+        full_hash = lambda p: cache.lookup(p, algo=hash_algo)
+    else:
+        full_hash = lambda p: file_hash(p, log=log, algo=hash_algo)
+    
+    prehasher = video_feed = None
+    if stages:
+        # Files whose size collides are hashed while the rest are still being probed; only
+        # non-junk images and videos can become dedup candidates
+        prehasher = dedup.Prehasher(
+            full_hash=None if cached_only else full_hash,
+            workers=hash_workers or stages["hash"]["workers"],
+            max_pending=stages["hash"]["queue_size"],
+            scheduler=None if hash_workers else io_scheduler.get_scheduler(),
+        )
         
-        # Show progress every 1000 processed files
-        if processed_total % 1000 == 0:
-            elapsed = time.time() - start_time
-            runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime('%H:%M:%S'))
-            log(f"[PROGRESS] {processed_total} processed | {copied_count} copied | {dup_count} duplicates | {junk_count} junk | Runtime: {runtime_str}")
-            
+        def feed_videos():
+            for video_path in media_dict.get("videos", []):
+                if prehasher.closed:
+                    break
+                prehasher.add(video_path)
         
-        filename = os.path.basename(file_path)
-        name_no_ext, ext = os.path.splitext(filename)
+        video_feed = threading.Thread(target=feed_videos, name="stage-discover-videos", daemon=True)
+        video_feed.start()
         
-        # Junk check
-        if is_junk(filename):
-            dest = os.path.join(junk_folder, filename)
-            counter = 1
-            while os.path.exists(dest):
-                dest = os.path.join(junk_folder, f"{name_no_ext}_{counter}{ext}")
-                counter += 1
-            try:
-                shutil.copy(file_path, dest)
-                junk_count += 1
-                log(f"[JUNKED] {file_path} -> {dest}")
-            except Exception as e:
-                log(f"[JUNK COPY ERROR] {file_path} -> {e}")
-            continue
+        def discover(file_path):
+            if not is_junk(os.path.basename(file_path)):
+                prehasher.add(file_path)
+            return file_path
         
-        # Compare resolution with existing copy
-        resolution = get_image_resolution(file_path)
-        existing = resolution_map.get(name_no_ext)
-        if existing:
-            existing_res, existing_path = existing
-            if resolution[0] * resolution[1] > existing_res[0] * existing_res[1]:
-                # Move previous (lower-res) to duplicates list
-                duplicates_list.append(existing_path)
-                resolution_map[name_no_ext] = (resolution, file_path)
-            else:
-                duplicates_list.append(file_path)
-        else:
-            resolution_map[name_no_ext] = (resolution, file_path)
+        discovered = pipeline.Stage("discover", discover, media_dict.get("images", []), **stages["discover"])
+        probe_stage = dict(stages["probe"], workers=probe_workers or stages["probe"]["workers"])
+        probed_images = pipeline.Stage("probe", lambda p: (p, probe_image(p)), discovered, **probe_stage)
+    else:
+        probed_images = image_probe.iter_sizes(media_dict.get("images", []), size_func=probe_image, workers=probe_workers)
+    
+    try:
+        with metrics.stage("organize.probe"):
+            for file_path, probe_result in probed_images:
+                processed_total += 1
+                if progress_callback:
+                    percent = min(100.0, (processed_total / total_files) * 100)
+                    progress_callback(percent)
+            
+                if not os.path.exists(file_path):
+                    log(f"[MISSING] File does not exist: {file_path}")
+                    continue
+                log(f"[IMAGE] Processing: {os.path.basename(file_path)}")
+        
+                # Show progress every 1000 processed files
+                if processed_total % 1000 == 0:
+                    elapsed = time.time() - start_time
+                    runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime('%H:%M:%S'))
+                    log(f"[PROGRESS] {processed_total} processed | {planned['junk']} junk | Runtime: {runtime_str}")
             
-    # Final copy step for highest-res version only
-    for _, (res, file_path) in resolution_map.items():
-        h = file_hash(file_path)
-        if not h or h in copied_hashes:
-            continue
         
-        file_date = get_file_date(file_path) or datetime.now()
-        filename = os.path.basename(file_path)
-        name_no_ext, ext = os.path.splitext(filename)
+                filename = os.path.basename(file_path)
         
-        year_folder = make_folder(os.path.join(root, str(file_date.year)))
-        month_folder = make_folder(os.path.join(year_folder, f"{file_date.month:02d}"))
-        dest = os.path.join(month_folder, filename)
+                # Junk check
+                junk_rule = junk_rules.match(filename)
+                if junk_rule:
+                    place(file_path, junk_folder, "junk", note=f" (rule: {junk_rule['name']})")
+                    continue
         
-        counter = 1
-        while os.path.exists(dest):
-            dest = os.path.join(month_folder, f"{name_no_ext}_{counter}{ext}")
-            counter += 1
-        try:
-            shutil.copy2(file_path, dest)
-            copied_hashes.add(h)
-            copied_count += 1
-            log(f"[COPIED] {file_path} -> {dest}")
-        except Exception as e:
-            log(f"[COPY ERROR] {file_path} -> {e}")
+                resolution, phash = probe_result or (get_image_resolution(file_path, log=log), None)
+                probed.add(file_path, width=resolution[0], height=resolution[1], phash=phash)
     
-    # Copy all lower-res duplicates after high-res images are processed
-    for dup_path in duplicates_list:
-        if not os.path.exists(dup_path):
-            continue
-        filename = os.path.basename(dup_path)
-        name_no_ext, ext = os.path.splitext(filename)
-        dest = os.path.join(duplicates_folder, filename)
-        counter = 1
-        while os.path.exists(dest):
-            dest = os.path.join(duplicates_folder, f"{name_no_ext}_{counter}{ext}")
-            counter += 1
-        try:
-            shutil.copy2(dup_path, dest)
-            dup_count += 1
-            log(f"[DUPLICATE] {dup_path} -> {dest}")
-        except Exception as e:
-            log(f"[DUP COPY ERROR] {dup_path} -> {e}")
+        with metrics.stage("organize.phash_cluster"):
+            # Group visually identical images (resized, re-encoded, renamed) and keep the
+            # highest-resolution member of each group; the rest go to duplicates
+            clusters = perceptual_hash.cluster(
+                [probed.dhash(i) for i in range(len(probed))],
+                max_distance=near_duplicate_distance or 0,
+            )
+            best = array("q", [-1]) * len(probed) # cluster id -> row of its highest-resolution image
+            cluster_order = array("I") # cluster ids in order of first appearance
+            for i, cluster_id in enumerate(clusters):
+                existing = best[cluster_id]
+                if existing < 0:
+                    cluster_order.append(cluster_id)
+                elif probed.pixels(i) <= probed.pixels(existing):
+                    continue
+                best[cluster_id] = i
+            del clusters
+            winner_rows = array("I", (best[cluster_id] for cluster_id in cluster_order))
+            is_winner = bytearray(len(probed))
+            for i in winner_rows:
+                is_winner[i] = 1
+            duplicate_rows = array("I", (i for i in range(len(probed)) if not is_winner[i]))
+            log(f"[PHASH] {len(probed)} images | {len(winner_rows)} unique | {len(duplicate_rows)} near-duplicates")
+            
+        # Find identical files among everything that may be copied. Only files whose size and
+        # head/tail blocks collide get a full hash; the rest are unique and never read here.
+        # Reads are limited per device by the shared I/O scheduler unless hash_workers is set.
+        with metrics.stage("organize.dedup"):
+            if prehasher:
+                video_feed.join()
+                prehasher.close()
+                log(f"[PIPELINE] {prehasher.summary()}")
+            # Rows 0..winners-1 are the highest-res images, the rest are the videos
+            candidates = media_records.PathTable(probed.paths(winner_rows))
+            winners = len(candidates)
+            for video_path in media_dict.get("videos", []):
+                candidates.add(video_path)
+            dup_index = dedup.find_duplicates(
+                candidates,
+                full_hash=full_hash,
+                workers=hash_workers,
+                log=log,
+                trust_partial=cached_only,
+                scheduler=None if hash_workers else io_scheduler.get_scheduler(),
+                order=lambda paths: physical_order.order_paths(paths, read_order, log=log),
+                partial=prehasher.partial if prehasher else None,
+            )
+    finally:
+        if stages: # also on errors: stop the stages and the read-ahead
+            probed_images.close()
+            prehasher.close()
+            video_feed.join()
+    
+    def read_dates(paths):
+        # (path, capture date) in order; a bounded stage when pipelined
+        if not stages:
+            return capture_date.iter_dates(paths, sources=date_sources, log=log)
+        capture_date.check_sources(date_sources)
+        return pipeline.Stage("date", lambda p: (p, get_file_date(p, log=log, sources=date_sources)), paths, **stages["date"])
+    
+    with metrics.stage("organize.place"):
+        # Highest-res version of each image
+        winner_paths = candidates.paths(range(winners))
+        for file_path, capture in read_dates(winner_paths):
+            if file_path in dup_index.errors:
+                continue
+            h = dup_index.digest(file_path)
+            if h and h in copied_hashes:
+                continue
+        
+            file_date = capture or datetime.now()
+            month_folder = os.path.join(root, str(file_date.year), f"{file_date.month:02d}")
+            place(file_path, month_folder, "copied")
+            if h:
+                copied_hashes.add(h) # an identical file later on is a duplicate
+    
+        # All lower-res duplicates after the high-res images
+        for dup_path in probed.paths(duplicate_rows):
+            if not os.path.exists(dup_path):
+                continue
+            place(dup_path, duplicates_folder, "duplicate")
     
-    # Handle videos normally (no resolution check)
-    for file_path in media_dict.get("videos", []):
-        processed_total += 1
+        # Handle videos normally (no resolution check)
+        videos = read_dates(candidates.paths(range(winners, len(candidates))))
+        for file_path, capture in videos:
+            processed_total += 1
         
-        if progress_callback and total_files:
-            percent = (processed_total / total_files) * 100
-            progress_callback(percent)
+            if progress_callback and total_files:
+                percent = min(100.0, (processed_total / total_files) * 100)
+                progress_callback(percent)
             
-        if not os.path.exists(file_path):
-            continue
-        h = file_hash(file_path)
-        if not h:
-            continue
+            if not os.path.exists(file_path) or file_path in dup_index.errors:
+                continue
+            h = dup_index.digest(file_path)
         
-        log(f"[VIDEO] Processing: {os.path.basename(file_path)}")
+            log(f"[VIDEO] Processing: {os.path.basename(file_path)}")
         
-        if processed_total % 1000 == 0:
-            elapsed = time.time() - start_time
-            runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime("%H:%M:%S"))
-            log(f"[PROGRESS] {processed_total} processed | {copied_count} copied | {dup_count} duplicates | {junk_count} junk")
+            if processed_total % 1000 == 0:
+                elapsed = time.time() - start_time
+                runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime("%H:%M:%S"))
+                log(f"[PROGRESS] {processed_total} processed | {planned['copied']} to copy | {planned['duplicate']} duplicates | {planned['junk']} junk")
         
-        filename = os.path.basename(file_path)
+            if h and h in copied_hashes:
+                # Duplicate video found - goes to the duplicates folder
+                place(file_path, duplicates_folder, "duplicate")
+                continue
+    
+            # Not a duplicate copy normally
+            file_date = capture or datetime.now()
+            month_folder = os.path.join(root, str(file_date.year), f"{file_date.month:02d}")
+            place(file_path, month_folder, "copied")
+            if h:
+                copied_hashes.add(h)
+    
+    cache.commit()
+    metrics.count("organize.processed", processed_total)
+    metrics.cache("hash_cache", cache.hits, cache.misses)
+    return {
+        "organize_plan": plan_format,
+        "root": root,
+        "hash_algo": hash_algo,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "processed": processed_total,
+        "cached_only": cached_only,
+        "errors": len(dup_index.errors),
+        "unverified": len(dup_index.unverified),
+        "seconds": round(time.time() - start_time, 2),
+        "ops": ops,
+    }
+
+def plan_totals(plan):
+    # {kind: (files, bytes)}
+    totals = {kind: [0, 0] for kind in plan_kinds}
+    for op in plan["ops"]:
+        totals[op["kind"]][0] += 1
+        totals[op["kind"]][1] += op["size"]
+    return {kind: tuple(value) for kind, value in totals.items()}
+
+def log_plan_summary(plan, log=print):
+    totals = plan_totals(plan)
+    mb = lambda size: size / (1024 * 1024)
+    log("\n=== Plan ===")
+    log(f"Destination: {plan['root']}")
+    log(f"Processed: {plan['processed']} files in {plan['seconds']:.1f}s")
+    log(f"To copy: {totals['copied'][0]} files ({mb(totals['copied'][1]):.1f} MB)")
+    log(f"Duplicates: {totals['duplicate'][0]} files ({mb(totals['duplicate'][1]):.1f} MB)")
+    log(f"Junk: {totals['junk'][0]} files ({mb(totals['junk'][1]):.1f} MB)")
+    log(f"Total to write: {mb(sum(size for _, size in totals.values())):.1f} MB")
+    if plan["unverified"]:
+        log(f"[PLAN] {plan['unverified']} files matched on head/tail blocks only (no cached full hash)")
+
+def save_plan(plan, path):
+    # JSONL: a header line with everything but the ops, then one op per line
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({key: value for key, value in plan.items() if key != "ops"}) + "\n")
+        for op in plan["ops"]:
+            f.write(json.dumps(op) + "\n")
+    os.replace(tmp_path, path)
+
+def load_plan(path):
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.loads(f.readline())
+        if plan.get("organize_plan") != plan_format:
+            raise ValueError(f"Not an organize plan: {path}")
+        plan["ops"] = media_records.OpTable(plan_kinds, (json.loads(line) for line in f if line.strip()))
+    return plan
+
+class PlanExecutor:
+    # Copies plan ops as they are submitted. execute_plan feeds it a finished plan;
+    # the pipelined organize_media feeds it every op as soon as it is placed.
+    def __init__(self, root, hash_algo=hashing.default_algo, log=print, copy_workers=None, copy_mode="auto", verify_copies="none", hash_copies=False, resume=True, repair=False, max_pending=None):
+        self.log = log
+        self.start_time = time.time()
+        self.root = make_folder(root, log=log)
+        make_folder(os.path.join(self.root, "junk"), log=log)
+        make_folder(os.path.join(self.root, "duplicates"), log=log)
         
-        if h in copied_hashes:
-            # Duplicate video found - copy to duplicates folder
-            dest = os.path.join(duplicates_folder, filename)
-            counter = 1
-            name_no_ext, ext = os.path.splitext(filename)
-            while os.path.exists(dest):
-                dest = os.path.join(duplicates_folder, f"{name_no_ext}_{counter}{ext}")
-                counter += 1
-            try:
-                shutil.copy2(file_path, dest)
-                dup_count += 1
-                log(f"[DUPLICATE] {dup_path} -> {dest}")
-            except Exception as e:
-                log(f"[DUP COPY ERROR] {file_path} -> {e}")
-            continue
+        self.counts = {kind: 0 for kind in plan_kinds}
+        self.resumed = {kind: 0 for kind in plan_kinds}
+        self.failed = 0
+        self.folders = set()
+        
+        # Copies run per device on the shared I/O scheduler, or on a pool of copy_workers
+        # threads if that is set; destinations are claimed up front so names never collide.
+        # With hash_copies (or a full verify) files without a cached hash are hashed while
+        # they are copied, never read twice; otherwise the kernel copy methods are used.
+        self.scheduler = None if copy_workers else io_scheduler.get_scheduler()
+        copy_hash = hash_algo if hash_copies or verify_copies == "full" else None
+        self.copier = copy_engine.CopyQueue(
+            workers=copy_workers, mode=copy_mode, log=log, max_pending=max_pending, hash_algo=copy_hash,
+            verify=verify_copies, scheduler=self.scheduler,
+        )
+        self.dest_names = name_allocator.NameAllocator()
+        self.operations = journal.get_journal()
+        # Picks up an interrupted run into the same folder: finished copies are skipped and
+        # cut-off ones are redone into the file they had claimed
+        self.progress = checkpoint.Checkpoint("organize", os.path.abspath(self.root), resume=resume, repair=repair, log=log)
+        self.run = self.progress.run
+    
+    copy_labels = {
+        "copied": ("COPIED", "COPY ERROR"),
+        "duplicate": ("DUPLICATE", "DUP COPY ERROR"),
+        "junk": ("JUNKED", "JUNK COPY ERROR"),
+    }
     
-        # Not a duplicate copy normally
-        file_date = get_file_date(file_path) or datetime.now()
-        year_folder = make_folder(os.path.join(root, str(file_date.year)))
-        month_folder = make_folder(os.path.join(year_folder, f"{file_date.month:02d}"))
-        dest = os.path.join(month_folder, filename)
+    def on_copied(self, job):
+        kind, note = job.tag
+        done_label, error_label = self.copy_labels[kind]
+        if not job.ok:
+            self.failed += 1
+            self.log(f"[{error_label}] {job.src} -> {job.error}")
+            return
+        self.counts[kind] += 1
+        self.operations.append("copy", run=self.run, src=job.src, dst=job.dst, hash=job.digest, bytes=job.bytes, kind=kind)
+        self.log(f"[{done_label}] {job.src} -> {job.dst}{note} ({job.mb_per_s:.1f} MB/s)")
     
-        counter = 1
-        name_no_ext, ext = os.path.splitext(filename)
-        while os.path.exists(dest):
-            dest = os.path.join(month_folder, f"{name_no_ext}_{counter}{ext}")
-            counter += 1
+    def submit(self, op):
+        # Blocks while the copy queue is full
+        src, dest, kind = op["src"], op["dst"], op["kind"]
+        if self.progress.completed(src):
+            self.resumed[kind] += 1
+            return
+        folder = os.path.dirname(dest)
+        if folder not in self.folders:
+            make_folder(folder, log=self.log)
+            self.folders.add(folder)
         try:
-            shutil.copy2(file_path, dest)
-            copied_hashes.add(h)
-            copied_count += 1
-            log(f"[COPIED] {file_path} -> {dest}")
-        except Exception as e:
-            log(f"[COPY ERROR] {file_path} -> {e}")
+            if self.progress.claimed(src) != dest:
+                if not copy_engine.claim_exact(dest):
+                    # Something else took this name since the plan was made
+                    dest = self.dest_names.allocate(folder, os.path.basename(dest))
+                    self.log(f"[PLAN] {op['dst']} already exists, using {dest}")
+                self.progress.claim(src, dest, kind=kind)
+        except OSError as e:
+            self.failed += 1
+            self.log(f"[{self.copy_labels[kind][1]}] {src} -> {e}")
+            return
+        self.copier.submit(src, dest, preserve_metadata=kind != "junk", tag=(kind, op.get("note", "")), on_done=self.on_copied)
     
-    # Final summary
-    log("\n=== Summary ===")
-    log(f"Processed: {processed_total}")
-    log(f"Copied: {copied_count}")
-    log(f"Duplicates moved: {dup_count}")
-    log(f"Junk moved: {junk_count}")
+    def close(self):
+        # Waits for the queued copies
+        self.copier.close()
+        if self.scheduler:
+            self.scheduler.log_summary(self.log)
     
-    elapsed = time.time() - start_time
-    runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime('%H:%M:%S'))
-    log(f"[RUNTIME] Total time: {runtime_str}")
+    def finish(self, processed, planning_seconds=0):
+        # After close(): records the run as finished and logs the summary. Returns
+        # {kind: files} plus "failed" (copies that didn't happen)
+        counts = self.counts
+        for kind in plan_kinds:
+            counts[kind] += self.resumed[kind]
+        self.progress.finish(copied=counts["copied"], duplicates=counts["duplicate"], junk=counts["junk"])
+        if sum(self.resumed.values()):
+            self.log(f"[RESUME] {sum(self.resumed.values())} files were already copied by the interrupted run")
+        
+        # Final summary
+        log = self.log
+        log("\n=== Summary ===")
+        log(f"Processed: {processed}")
+        log(f"Copied: {counts['copied']}")
+        log(f"Duplicates moved: {counts['duplicate']}")
+        log(f"Junk moved: {counts['junk']}")
+        cache = hash_cache.get_cache()
+        cache.commit()
+        metrics.cache("hash_cache", cache.hits, cache.misses)
+        cache_stats = cache.stats()
+        log(f"[HASH CACHE] {cache_stats['hits']} hits | {cache_stats['misses']} misses | {cache_stats['entries']} cached")
+        
+        elapsed = time.time() - self.start_time + planning_seconds
+        runtime_str = str(datetime.utcfromtimestamp(elapsed).strftime('%H:%M:%S'))
+        log(f"[RUNTIME] Total time: {runtime_str}")
+        return dict(counts, failed=self.failed)
+
+@metrics.reported("organize.execute")
+def execute_plan(plan, log=print, progress_callback=None, copy_workers=None, copy_mode="auto", verify_copies="none", hash_copies=False, resume=True, repair=False, read_order=physical_order.default_mode, trust_cached=False):
+    # Carries out a plan from plan_organize (or load_plan) on the copy queue. Copies are
+    # submitted in read_order (see physical_order); destinations were fixed by the plan.
+    # A cached_only plan matched some duplicates on head/tail blocks only and skipped
+    # near-duplicate checks for images without a cached dHash; it is refused unless
+    # trust_cached is set.
+    if plan.get("cached_only") and not trust_cached:
+        raise ValueError(
+            f"Plan for {plan['root']} was made from cached hashes only ({plan.get('unverified', 0)} unverified "
+            "duplicates); plan again without cached_only, or pass trust_cached=True"
+        )
+    if progress_callback:
+        progress_callback(0.0)
+    executor = PlanExecutor(
+        plan["root"], plan["hash_algo"], log=log, copy_workers=copy_workers, copy_mode=copy_mode,
+        verify_copies=verify_copies, hash_copies=hash_copies, resume=resume, repair=repair,
+    )
+    with metrics.stage("organize.copy"):
+        ops = plan["ops"]
+        if not isinstance(ops, media_records.OpTable):
+            ops = media_records.OpTable(plan_kinds, ops)
+        order = physical_order.order_paths(range(len(ops)), read_order, log=log, path=ops.src.__getitem__)
+        total_ops = len(ops)
+        for done_ops, row in enumerate(order, 1):
+            if progress_callback:
+                progress_callback(min(100.0, done_ops / total_ops * 100))
+            executor.submit(ops[row])
+        executor.close()
+    return executor.finish(plan["processed"], plan.get("seconds", 0))
+
+@metrics.reported("organize")
+def organize_media(media_dict, base_path, folder_name, log=print, progress_callback=None, hash_algo=hashing.default_algo, hash_workers=None, probe_workers=None, date_sources=capture_date.default_sources, near_duplicate_distance=perceptual_hash.default_distance, copy_workers=None, copy_mode="auto", verify_copies="none", hash_copies=False, resume=True, repair=False, dry_run=False, cached_only=False, plan_path=None, read_order=physical_order.default_mode, mode=default_mode, stages=None):
+    # Plans, then copies. dry_run stops after printing the plan summary (and saving
+    # it to plan_path, which execute_plan(load_plan(plan_path)) can run later).
+    # The returned plan's "errors" counts files that couldn't be stat'ed or hashed,
+    # "failed" (after copying) the copies that didn't happen. hash_copies hashes files
+    # without a cached hash while copying them, so the journal records every digest.
+    # mode "pipeline" copies while it plans (see default_stages), "sequential" plans
+    # everything first; read_order only applies to the sequential copy pass.
+    if mode not in organize_modes:
+        raise ValueError(f"Unknown organize mode: {mode}")
+    stages = stage_settings(stages) if mode == "pipeline" else None
+    executor = None
+    if stages and not dry_run:
+        executor = PlanExecutor(
+            os.path.join(base_path, folder_name), hash_algo, log=log, copy_workers=copy_workers or stages["copy"]["workers"],
+            copy_mode=copy_mode, verify_copies=verify_copies, hash_copies=hash_copies, resume=resume, repair=repair,
+            max_pending=stages["copy"]["queue_size"],
+        )
+    plan_progress = exec_progress = None
+    if progress_callback:
+        scale = 1.0 if dry_run or executor else 0.5
+        plan_progress = lambda percent: progress_callback(percent * scale)
+        exec_progress = lambda percent: progress_callback(50.0 + percent * 0.5)
+    try:
+        plan = plan_organize(
+            media_dict, base_path, folder_name, log=log, progress_callback=plan_progress,
+            hash_algo=hash_algo, hash_workers=hash_workers, probe_workers=probe_workers,
+            date_sources=date_sources, near_duplicate_distance=near_duplicate_distance,
+            cached_only=cached_only, resume=resume, read_order=read_order,
+            stages=stages, on_op=executor.submit if executor else None,
+        )
+    except BaseException:
+        if executor:
+            executor.close() # let the copies already started finish; the run stays resumable
+        raise
+    if plan_path:
+        save_plan(plan, plan_path)
+        log(f"[PLAN] Saved to {plan_path}")
+    if dry_run:
+        log_plan_summary(plan, log=log)
+        return plan
+    if executor:
+        with metrics.stage("organize.copy"):
+            executor.close()
+        plan["failed"] = executor.finish(plan["processed"])["failed"]
+        return plan
+    plan["failed"] = execute_plan(
+        plan, log=log, progress_callback=exec_progress, copy_workers=copy_workers,
+        copy_mode=copy_mode, verify_copies=verify_copies, hash_copies=hash_copies, resume=resume, repair=repair,
+        read_order=read_order, trust_cached=cached_only,
+    )["failed"]
+    return plan
     
+def count_media(media_dict):
+    # Media lists are streamed, so only their (upper bound) header count is known up front
+    if isinstance(media_dict, media_list.MediaList):
+        return media_dict.estimate_count()
+    return len(media_dict.get("images", [])) + len(media_dict.get("videos", []))
+
 def load_media_json(json_path, log=print):
+    if not str(json_path).endswith(".json") and media_list.is_media_list(json_path):
+        return media_list.MediaList(json_path)
     try:
         with open(json_path, "r") as f:
             return json.load(f)
@@ -264,9 +622,9 @@ def load_media_json(json_path, log=print):
 def main():
     print("=== Cross-Platform Photo & Video Organizer ===\n")
     
-    json_path = input("Enter the path to your media JSON file (e.g., photo_folder.json)").strip()
-    if not os.path.isfile(json_path):
-        print(f"JSON file not found: {json_path}")
+    json_path = input("Enter the path to your media list or JSON file (e.g., photo_folder.medialist): ").strip()
+    if not os.path.isfile(json_path) and not (os.path.exists(json_path) and media_list.is_media_list(json_path)):
+        print(f"Media list not found: {json_path}")
         return
     
     base_path = input("Enter the destination base folder path: ").strip()
@@ -280,6 +638,11 @@ def main():
         return
     
     media_dict = load_media_json(json_path)
+    if input("Dry run first (plan only, nothing is copied)? (y/N): ").strip().lower() == "y":
+        organize_media(media_dict, base_path, folder_name, dry_run=True, cached_only=True)
+        if input("Organize now? Duplicates are fully checked first, so counts may differ slightly (y/N): ").strip().lower() != "y":
+            return
+        # The dry run only used cached hashes; the real run plans again with full checks
     organize_media(media_dict, base_path, folder_name)
     
 if __name__ == "__main__":
@@ -0,0 +1,276 @@
+import os
+import hashlib
+import threading
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import hashing
+import media_records
+import metrics
+
+# Tiered duplicate detection. Most photos have a unique byte size and can't
+# have a twin, so content is only read where it could matter:
+#   1. group by size                      - stat only
+#   2. hash head + tail blocks per group  - at most 2 * block_size bytes per file
+#   3. full hash of what still collides   - via the caller's (cached) hash function
+# With trust_partial, files whose full hash isn't available (e.g. a cache-only
+# lookup for a dry-run plan) are matched on size + head/tail blocks instead and
+# listed in index.unverified.
+#
+# Sizes of all files are kept in one array; only files whose size collides get
+# dict entries. Content keys are stored packed (media_records.pack_digest).
+#
+# A Prehasher does tiers 2 and 3 early, while the caller is still busy with
+# something else (the organizer's probe stage), for files whose size has
+# already collided. find_duplicates(..., partial=prehasher.partial) then finds
+# those reads done; its results are the same either way.
+
+block_size = 64 * 1024
+prehash_pending = 256 # reads a Prehasher lets queue before add() blocks
+
+_missing = object()
+
+def partial_hash(path, size, block=block_size):
+    hasher = hashlib.md5()
+    with open(path, "rb") as f:
+        if size <= 2 * block:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(block))
+            f.seek(size - block)
+            hasher.update(f.read(block))
+    hashing.add_bytes_read(min(size, 2 * block))
+    return hasher.hexdigest()
+
+class Prehasher:
+    def __init__(self, full_hash=None, block=block_size, workers=None, max_pending=prehash_pending, scheduler=None):
+        # full_hash (e.g. a hash-cache backed one) is called for files whose head/tail
+        # blocks collide so the later full_hash calls are cache hits; None skips tier 3
+        self.full_hash = full_hash
+        self.block = block
+        self.scheduler = scheduler
+        self.pool = None if scheduler else ThreadPoolExecutor(max_workers=workers or hashing.default_workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.first = {} # size -> first path seen with it, None once another one came
+        self.by_partial = {} # (size, digest) -> first path with it, None once another one came
+        self.partials = {} # path -> (size, head/tail digest)
+        self.futures = []
+        self.closed = False
+        self.partial_hashed = 0
+        self.full_hashed = 0
+
+    def add(self, path, size=None):
+        # Thread-safe; blocks while max_pending reads are queued. Ignored once closed.
+        if self.closed:
+            return
+        if size is None:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                return # find_duplicates stats it again and reports it
+        with self.lock:
+            first = self.first.get(size, _missing)
+            if first is _missing:
+                self.first[size] = path
+                return
+            self.first[size] = None
+        if first:
+            self._submit(first, size)
+        self._submit(path, size)
+
+    def _submit(self, path, size):
+        self.slots.acquire()
+        with self.lock:
+            if self.closed:
+                self.slots.release()
+                return
+            if self.scheduler:
+                future = self.scheduler.submit((path,), self._hash, path, size)
+            else:
+                future = self.pool.submit(self._hash, path, size)
+            self.futures.append(future)
+            if len(self.futures) > 4096:
+                self.futures = [f for f in self.futures if not f.done()]
+
+    def _hash(self, path, size):
+        try:
+            try:
+                digest = partial_hash(path, size, self.block)
+            except Exception:
+                return # read again (and reported) by find_duplicates
+            with self.lock:
+                self.partials[path] = (size, digest)
+                self.partial_hashed += 1
+                if not self.full_hash or size <= 2 * self.block:
+                    return
+                first = self.by_partial.get((size, digest), _missing)
+                if first is _missing:
+                    self.by_partial[(size, digest)] = path
+                    return
+                self.by_partial[(size, digest)] = None
+            for p in (first, path) if first else (path,):
+                if self.full_hash(p):
+                    with self.lock:
+                        self.full_hashed += 1
+        finally:
+            self.slots.release()
+
+    def close(self):
+        # Waits for every read started so far; later add() calls do nothing
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+        if self.pool:
+            self.pool.shutdown(wait=True)
+        metrics.count("dedup.prehashed_partial", self.partial_hashed)
+        metrics.count("dedup.prehashed_full", self.full_hashed)
+
+    def partial(self, path, size, block=block_size):
+        # Drop-in for partial_hash that returns the digest read ahead, if there is one
+        # for this size; anything else is read now
+        done = self.partials.get(path)
+        if done and done[0] == size and block == self.block:
+            return done[1]
+        return partial_hash(path, size, block)
+
+    def summary(self):
+        return f"{self.partial_hashed} partial hashes | {self.full_hashed} full hashes read ahead"
+
+class DuplicateIndex:
+    def __init__(self):
+        self.keys = {} # path -> packed content key, only for files that have an identical twin
+        self.groups = [] # lists of identical paths, in input order
+        self.errors = set() # paths that couldn't be stat'ed or read
+        self.unverified = set() # paths matched on head/tail blocks only (trust_partial)
+        self.total_files = 0
+        self.total_bytes = 0
+        self.bytes_read = 0
+        self.partial_hashed = 0
+        self.full_hashed = 0
+
+    def key(self, path):
+        # "<size>:<digest>", or None meaning "no identical twin in this set"
+        packed = self.keys.get(path)
+        return media_records.unpack_digest(packed) if packed else None
+
+    def digest(self, path):
+        # The same key as raw bytes, for callers that keep many of them
+        return self.keys.get(path)
+
+    def is_unique(self, path):
+        return path not in self.keys
+
+    def summary(self):
+        read_mb = self.bytes_read / (1024 * 1024)
+        total_mb = self.total_bytes / (1024 * 1024)
+        return (
+            f"{self.total_files} files | {len(self.groups)} duplicate groups | "
+            f"{self.partial_hashed} partial hashes | {self.full_hashed} full hashes | "
+            f"read {read_mb:.1f} MB of {total_mb:.1f} MB"
+        )
+
+def find_duplicates(paths, full_hash, block=block_size, workers=None, log=print, trust_partial=False, scheduler=None, order=None, partial=None):
+    # full_hash(path) -> digest or None. Returns a DuplicateIndex.
+    # Partial and full hashes of colliding files are computed on a thread pool,
+    # or per device on scheduler (an io_scheduler.IOScheduler). order(paths), if
+    # given, returns the paths in the order they should be read. partial(path,
+    # size, block) replaces partial_hash, e.g. a Prehasher's.
+    # paths may be any sequence, e.g. a media_records.PathTable
+    index = DuplicateIndex()
+    partial = partial or partial_hash
+    if not hasattr(paths, "__len__"):
+        paths = list(paths)
+
+    all_sizes = array("q")
+    for path in paths:
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            index.errors.add(path)
+            size = -1
+        else:
+            index.total_files += 1
+            index.total_bytes += size
+        all_sizes.append(size)
+    metrics.count("stat", index.total_files + len(index.errors))
+
+    colliding = set()
+    previous = None
+    for size in sorted(all_sizes):
+        if size == previous and size >= 0:
+            colliding.add(size)
+        previous = size
+    sizes = {}
+    by_size = defaultdict(list)
+    for path, size in zip(paths, all_sizes):
+        if size in colliding:
+            sizes[path] = size
+            by_size[size].append(path)
+    del all_sizes
+
+    # Tier 2: head + tail blocks, only where sizes collide
+    size_collisions = [p for group in by_size.values() for p in group]
+    if order:
+        size_collisions = order(size_collisions)
+    partials, partial_stats = hashing.hash_files(
+        size_collisions, hash_func=lambda p: partial(p, sizes[p], block), workers=workers, log=log, scheduler=scheduler
+    )
+    index.partial_hashed = sum(1 for d in partials.values() if d)
+    index.bytes_read += partial_stats.bytes_read # read now, not ahead (Prehasher) or from a cache
+
+    candidate_groups = []
+    for size, same_size in by_size.items():
+        by_partial = defaultdict(list)
+        for path in same_size:
+            digest = partials.get(path)
+            if digest:
+                by_partial[digest].append(path)
+            else:
+                index.errors.add(path)
+        for digest, candidates in by_partial.items():
+            if len(candidates) > 1:
+                candidate_groups.append((size, digest, candidates))
+
+    # Tier 3: full hashes, except where the "partial" hash already covered the whole file
+    needs_full = [p for size, _, group in candidate_groups if size > 2 * block for p in group]
+    if order:
+        needs_full = order(needs_full)
+    fulls, full_stats = hashing.hash_files(needs_full, hash_func=full_hash, workers=workers, log=log, scheduler=scheduler)
+    index.full_hashed = sum(1 for d in fulls.values() if d)
+    index.bytes_read += full_stats.bytes_read # hash-cache hits read nothing
+
+    for size, digest, candidates in candidate_groups:
+        if size <= 2 * block:
+            by_full = {digest: candidates}
+        else:
+            by_full = defaultdict(list)
+            for path in candidates:
+                full = fulls.get(path)
+                if full:
+                    by_full[full].append(path)
+                elif trust_partial:
+                    by_full[f"~{digest}"].append(path)
+                    index.unverified.add(path)
+                else:
+                    index.errors.add(path)
+
+        for full, group in by_full.items():
+            if len(group) < 2:
+                continue
+            key = media_records.pack_digest(f"{size}:{full}")
+            for path in group:
+                index.keys[path] = key
+            index.groups.append(group)
+
+    metrics.count("dedup.files", index.total_files)
+    metrics.count("dedup.partial_hashed", index.partial_hashed)
+    metrics.count("dedup.full_hashed", index.full_hashed)
+    metrics.count("dedup.bytes_read", index.bytes_read)
+    log(f"[DEDUP] {index.summary()}")
+    return index
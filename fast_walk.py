@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Directory listings are the slow part on network shares, so several are kept
+# in flight at once while results are still handed out in os.walk order.
+default_workers = min(32, (os.cpu_count() or 1) * 4)
+default_prefetch = 64
+
+def list_dir(path):
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry.name)
+                    continue
+                # Same as os.walk(followlinks=False): symlinked folders are never entered
+                try:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass # unreadable folders are ignored, like os.walk
+    return files, subdirs
+
+def walk_dirs(root_path, skip_dir=None, on_skip=None, on_progress=None, workers=None, prefetch=None):
+    # Yields (dirpath, filenames) top-down in the exact order os.walk would.
+    # Memory stays bounded by the pending folder stack plus `prefetch` listings.
+    workers = workers or default_workers
+    prefetch = max(prefetch or default_prefetch, workers)
+
+    # Stack entries: [path, skipped, future]
+    stack = [[root_path, bool(skip_dir and skip_dir(root_path)), None]]
+    in_flight = 0
+    dirs_seen = 1
+    dirs_done = 0
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while stack:
+            # Queue listings for the folders that will be consumed next
+            for item in reversed(stack):
+                if in_flight >= prefetch:
+                    break
+                if item[2] is None and not item[1]:
+                    item[2] = pool.submit(list_dir, item[0])
+                    in_flight += 1
+
+            path, skipped, future = stack.pop()
+            dirs_done += 1
+            if skipped:
+                if on_skip:
+                    on_skip(path)
+            else:
+                files, subdirs = future.result()
+                in_flight -= 1
+                dirs_seen += len(subdirs)
+                for sub in reversed(subdirs):
+                    stack.append([sub, bool(skip_dir and skip_dir(sub)), None])
+                yield path, files
+
+            if on_progress:
+                on_progress(dirs_done, dirs_seen)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def walk_files(root_path, **kwargs):
+    for dirpath, files in walk_dirs(root_path, **kwargs):
+        for name in files:
+            yield dirpath, name
@@ -0,0 +1,137 @@
+import time
+import queue
+import threading
+from collections import deque
+
+# Worker threads never touch Tk widgets. They post to an EventBus instead:
+#   log(...)       - queued, every line is kept (up to the console cap)
+#   progress(pct)  - coalesced, only the latest value is kept
+#   call(func)     - runs func (e.g. a dialog) on the Tk thread, the worker waits
+# and the Tk thread drains the bus from an after() pump every pump_interval_ms,
+# inserting each batch of lines with a single Text.insert. The console keeps at
+# most max_console_lines lines, dropping the oldest.
+
+pump_interval_ms = 50
+max_console_lines = 5000
+max_lines_per_pump = 2000 # the rest waits for the next tick so the GUI stays responsive
+rate_window = 10.0 # seconds of progress samples used for the throughput / ETA estimate
+
+class EventBus:
+    def __init__(self):
+        self.lines = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.percent = None # latest progress not yet shown
+        self.calls = queue.SimpleQueue()
+
+    def log(self, *parts):
+        # Same call shape as print, so it can be passed anywhere log=print is accepted
+        self.lines.put(" ".join(str(part) for part in parts))
+
+    def progress(self, percent):
+        with self.lock:
+            self.percent = percent
+
+    def call(self, func, *args):
+        # Runs func(*args) on the Tk thread at the next pump tick and returns its result
+        # (None if it raised); blocks the calling worker thread until then
+        done = threading.Event()
+        result = []
+        def run():
+            try:
+                result.append(func(*args))
+            finally:
+                done.set()
+        self.calls.put(run)
+        done.wait()
+        return result[0] if result else None
+
+    def run_calls(self):
+        # Tk thread only
+        try:
+            while True:
+                self.calls.get_nowait()()
+        except queue.Empty:
+            pass
+
+    def drain(self, max_lines=max_lines_per_pump):
+        # Returns (lines, percent or None) posted since the last drain
+        lines = []
+        try:
+            while len(lines) < max_lines:
+                lines.append(self.lines.get_nowait())
+        except queue.Empty:
+            pass
+        with self.lock:
+            percent, self.percent = self.percent, None
+        return lines, percent
+
+class ProgressMeter:
+    # Turns a stream of percentages into a rate and an ETA over the last rate_window seconds
+    def __init__(self, window=rate_window):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.start = time.monotonic()
+        self.samples = deque() # (time, percent)
+
+    def update(self, percent):
+        if not self.samples or percent < self.samples[-1][1]:
+            self.reset() # a new job started
+        now = time.monotonic()
+        self.samples.append((now, percent))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def rate(self):
+        # percent per second, or None until there is enough to go on
+        if len(self.samples) < 2:
+            return None
+        (t0, p0), (t1, p1) = self.samples[0], self.samples[-1]
+        return (p1 - p0) / (t1 - t0) if t1 > t0 and p1 > p0 else None
+
+    def text(self):
+        if not self.samples:
+            return "0%"
+        percent = self.samples[-1][1]
+        parts = [f"{percent:.1f}%", f"elapsed {format_seconds(time.monotonic() - self.start)}"]
+        rate = self.rate()
+        if rate and percent < 100:
+            parts.append(f"{rate:.2f}%/s")
+            parts.append(f"ETA {format_seconds((100 - percent) / rate)}")
+        return " | ".join(parts)
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+class RingConsole:
+    # Appends batches of lines to a Tk Text widget, keeping at most max_lines
+    def __init__(self, text, max_lines=max_console_lines):
+        self.text = text
+        self.max_lines = max_lines
+
+    def write(self, lines):
+        if not lines:
+            return
+        if len(lines) > self.max_lines:
+            dropped = len(lines) - self.max_lines + 1
+            lines = [f"[Console] {dropped} lines not shown"] + lines[dropped:]
+        self.text.insert("end", "\n".join(lines) + "\n")
+        excess = int(self.text.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+        self.text.see("end")
+
+def start_pump(widget, bus, console, on_progress, interval_ms=pump_interval_ms):
+    # Drains bus into console and on_progress(percent) on the Tk thread, forever
+    def pump():
+        try:
+            lines, percent = bus.drain()
+            console.write(lines)
+            if percent is not None:
+                on_progress(percent)
+            bus.run_calls()
+        finally:
+            widget.after(interval_ms, pump)
+    widget.after(interval_ms, pump)
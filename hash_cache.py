@@ -0,0 +1,214 @@
+import os
+import sys
+import atexit
+import sqlite3
+import threading
+
+import metrics
+
+# Content hashes keyed by (st_dev, st_ino, size, mtime_ns): a file that hasn't
+# been touched since it was last hashed is never read again.
+
+cache_db = "hash_cache.db"
+
+schema = """
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER,
+    ino INTEGER,
+    algo TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digest TEXT,
+    path TEXT,
+    PRIMARY KEY (dev, ino, algo)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    dev INTEGER,
+    ino INTEGER,
+    field TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    value TEXT,
+    path TEXT,
+    PRIMARY KEY (dev, ino, field)
+);
+"""
+
+# Pending writes are committed in batches rather than once per file
+commit_every = 1000
+
+def _stat(path, st=None):
+    # The caller's stat result when it has one; stats actually made are counted
+    if st is None:
+        st = os.stat(path)
+        metrics.count("stat")
+    return st
+
+class HashCache:
+    def __init__(self, db_path=cache_db):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(schema)
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+
+    def lookup(self, path, st=None, algo="md5"):
+        try:
+            st = _stat(path, st)
+        except OSError:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest FROM hashes WHERE dev = ? AND ino = ? AND algo = ?",
+                (st.st_dev, st.st_ino, algo),
+            ).fetchone()
+            if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                self.hits += 1
+                return row[2]
+            self.misses += 1
+        return None
+
+    def store(self, path, digest, st=None, algo="md5"):
+        try:
+            st = _stat(path, st)
+        except OSError:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO hashes (dev, ino, algo, size, mtime_ns, digest, path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, algo, st.st_size, st.st_mtime_ns, digest, str(path)),
+            )
+            self.pending += 1
+            if self.pending >= commit_every:
+                self.conn.commit()
+                self.pending = 0
+
+    def lookup_meta(self, path, field, st=None):
+        # Other per-file facts derived from content (capture date, ...), same keying
+        # as the hashes. Returns (found, value); value may be "" for "nothing found".
+        try:
+            st = _stat(path, st)
+        except OSError:
+            return False, None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, value FROM metadata WHERE dev = ? AND ino = ? AND field = ?",
+                (st.st_dev, st.st_ino, field),
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            metrics.count(f"meta_cache.{field}.hits")
+            return True, row[2]
+        metrics.count(f"meta_cache.{field}.misses")
+        return False, None
+
+    def store_meta(self, path, field, value, st=None):
+        try:
+            st = _stat(path, st)
+        except OSError:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata (dev, ino, field, size, mtime_ns, value, path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, field, st.st_size, st.st_mtime_ns, value, str(path)),
+            )
+            self.pending += 1
+            if self.pending >= commit_every:
+                self.conn.commit()
+                self.pending = 0
+
+    def get_or_compute(self, path, compute, algo="md5"):
+        # compute(path) -> digest or None; the stat is taken before reading so a
+        # file modified mid-hash is caught as changed next time
+        try:
+            st = _stat(path)
+        except OSError:
+            return compute(path)
+        digest = self.lookup(path, st=st, algo=algo)
+        if digest:
+            return digest
+        digest = compute(path)
+        if digest:
+            self.store(path, digest, st=st, algo=algo)
+        return digest
+
+    def evict_missing(self, log=print):
+        # Drops entries whose file is gone or was replaced by another inode
+        stale = []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT dev, ino, path FROM hashes UNION SELECT dev, ino, path FROM metadata"
+            ).fetchall()
+        for dev, ino, path in rows:
+            try:
+                st = os.stat(path)
+                if st.st_dev == dev and st.st_ino == ino:
+                    continue
+            except OSError:
+                pass
+            stale.append((dev, ino))
+        with self.lock:
+            self.conn.executemany("DELETE FROM hashes WHERE dev = ? AND ino = ?", stale)
+            self.conn.executemany("DELETE FROM metadata WHERE dev = ? AND ino = ?", stale)
+            self.conn.commit()
+        log(f"[HASH CACHE] Evicted {len(stale)} stale entries")
+        return len(stale)
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_cache(db_path=cache_db):
+    # One cache per process, shared by the organizer and the scanned-album tool
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HashCache(db_path)
+            atexit.register(_shared.close)
+        return _shared
+
+def main(args):
+    usage = "usage: python hash_cache.py stats | evict"
+    if not args:
+        print(usage)
+        return 1
+    command = args[0]
+    cache = get_cache()
+    if command == "stats":
+        print(f"{cache.stats()['entries']} cached hashes in {cache.db_path}")
+    elif command == "evict":
+        cache.evict_missing()
+    else:
+        print(usage)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
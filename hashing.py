@@ -0,0 +1,134 @@
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import io_scheduler
+import metrics
+
+# hashlib releases the GIL while digesting large chunks, so several files can be
+# hashed at once on a thread pool. Each thread reuses one large buffer via readinto
+# instead of allocating a fresh bytes object per 8 KiB chunk. With an
+# io_scheduler.IOScheduler instead of a worker count, files are read with each
+# device's own concurrency limit.
+
+default_algo = "md5" # matches digests already stored by older runs
+fast_algo = "blake2b"
+buffer_size = 1024 * 1024
+default_workers = min(8, (os.cpu_count() or 1) * 2)
+
+_local = threading.local()
+_counter_lock = threading.Lock()
+_bytes_read = 0
+
+def check_algo(algo):
+    if algo not in hashlib.algorithms_available:
+        raise ValueError(f"Unsupported hash algorithm: {algo}")
+    return algo
+
+def _buffer():
+    buf = getattr(_local, "buffer", None)
+    if buf is None:
+        buf = _local.buffer = bytearray(buffer_size)
+    return buf
+
+def add_bytes_read(count):
+    global _bytes_read
+    with _counter_lock:
+        _bytes_read += count
+    io_scheduler.transferred(count)
+
+def total_bytes_read():
+    return _bytes_read
+
+def hash_file(path, algo=default_algo):
+    # Raises OSError on unreadable files; callers decide how to report it
+    hasher = hashlib.new(algo)
+    buf = _buffer()
+    view = memoryview(buf)
+    total = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+            total += n
+    add_bytes_read(total)
+    return hasher.hexdigest()
+
+def bounded_map(pool, func, items, window):
+    # Like pool.map, but only `window` items are submitted ahead of the consumer,
+    # so millions of paths don't all become futures at once
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class HashStats:
+    def __init__(self):
+        self.files = 0
+        self.failed = 0
+        self.bytes_read = 0
+        self.seconds = 0.0
+
+    @property
+    def mb_per_s(self):
+        return (self.bytes_read / (1024 * 1024)) / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f"{self.files} files | {self.bytes_read / (1024 * 1024):.1f} MB read | "
+            f"{self.seconds:.1f}s | {self.mb_per_s:.1f} MB/s"
+        )
+
+def hash_files(paths, hash_func=None, algo=default_algo, workers=None, log=print, scheduler=None):
+    # Hashes paths concurrently. hash_func(path) -> digest (defaults to hash_file with
+    # `algo`); pass a cache-backed function to skip unchanged files. scheduler (an
+    # IOScheduler) replaces the fixed pool of `workers` threads.
+    # Returns ({path: digest or None}, HashStats). Only bytes actually read count
+    # toward MB/s, so cache hits don't inflate it.
+    check_algo(algo)
+    hash_func = hash_func or (lambda p: hash_file(p, algo))
+    workers = workers or default_workers
+    stats = HashStats()
+    results = {}
+
+    def run(path):
+        try:
+            return path, hash_func(path)
+        except Exception as e:
+            log(f"[HASH ERROR] Could not hash {path}: {e}")
+            return path, None
+
+    start_bytes = total_bytes_read()
+    start = time.perf_counter()
+    if scheduler:
+        hashed = scheduler.map(run, paths)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        hashed = bounded_map(pool, run, paths, workers * 4)
+    try:
+        for path, digest in hashed:
+            results[path] = digest
+            if digest:
+                stats.files += 1
+            else:
+                stats.failed += 1
+    finally:
+        if not scheduler:
+            pool.shutdown(wait=True)
+    stats.seconds = time.perf_counter() - start
+    stats.bytes_read = total_bytes_read() - start_bytes
+
+    metrics.count("hash.files", stats.files)
+    metrics.count("hash.failed", stats.failed)
+    metrics.count("hash.bytes_read", stats.bytes_read)
+    if stats.files or stats.failed:
+        log(f"[HASH] {stats.summary()}")
+    return results, stats
@@ -0,0 +1,201 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import hashing
+
+# Reads image dimensions from the file header instead of having Pillow open the
+# whole file. Covers JPEG, PNG, GIF, BMP, PSD, HEIF/HEIC and TIFF, including the
+# TIFF-based RAW formats (CR2, NEF, ARW, DNG, ORF). Pillow is only used when the
+# header can't be parsed.
+
+default_workers = min(16, (os.cpu_count() or 1) * 4)
+
+# Safety limits for malformed files
+max_ifds = 64
+max_ifd_entries = 4096
+max_meta_box = 4 * 1024 * 1024
+
+class ProbeError(Exception):
+    pass
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ProbeError("unexpected end of file")
+    return data
+
+def _probe_jpeg(f):
+    f.seek(2)
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b"\xff":
+            raise ProbeError("bad JPEG marker")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF: # fill bytes
+            marker = _read_exact(f, 1)[0]
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue # standalone markers
+        if marker in (0xD9, 0xDA):
+            raise ProbeError("no SOF marker before image data")
+        length = struct.unpack(">H", _read_exact(f, 2))[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            _precision, height, width = struct.unpack(">BHH", _read_exact(f, 5))
+            return width, height
+        f.seek(length - 2, 1)
+
+def _probe_tiff(f, byte_order):
+    def unpack(fmt, data):
+        return struct.unpack(byte_order + fmt, data)
+
+    f.seek(4)
+    first_ifd = unpack("I", _read_exact(f, 4))[0]
+    queue = [first_ifd]
+    seen = set()
+    best = None
+
+    while queue and len(seen) < max_ifds:
+        offset = queue.pop(0)
+        if not offset or offset in seen:
+            continue
+        seen.add(offset)
+        f.seek(offset)
+        count = unpack("H", _read_exact(f, 2))[0]
+        if count > max_ifd_entries:
+            raise ProbeError("corrupt IFD")
+        entries = _read_exact(f, count * 12)
+        next_ifd = unpack("I", _read_exact(f, 4))[0]
+
+        width = height = None
+        for i in range(count):
+            tag, typ, n = unpack("HHI", entries[i * 12:i * 12 + 8])
+            raw = entries[i * 12 + 8:i * 12 + 12]
+            if tag in (0x0100, 0x0101) and n == 1:
+                value = unpack("H", raw[:2])[0] if typ == 3 else unpack("I", raw)[0]
+                if tag == 0x0100:
+                    width = value
+                else:
+                    height = value
+            elif tag == 0x014A and typ in (4, 13):
+                # SubIFDs: where NEF/ARW/DNG keep the full-size raw image
+                if n == 1:
+                    queue.append(unpack("I", raw)[0])
+                elif n <= max_ifds:
+                    here = f.tell()
+                    f.seek(unpack("I", raw)[0])
+                    queue.extend(unpack(f"{n}I", _read_exact(f, n * 4)))
+                    f.seek(here)
+        if width and height and (best is None or width * height > best[0] * best[1]):
+            best = (width, height)
+        queue.append(next_ifd)
+
+    if not best:
+        raise ProbeError("no image size in TIFF IFDs")
+    return best
+
+def _iter_boxes(data, start, end):
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+def _probe_heif(f):
+    # ispe boxes sit in meta/iprp/ipco; the largest one is the primary (or grid) image
+    f.seek(0, 2)
+    file_size = f.tell()
+    pos = 0
+    while pos < file_size:
+        f.seek(pos)
+        size, box_type = struct.unpack(">I4s", _read_exact(f, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", _read_exact(f, 8))[0]
+            header = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header:
+            break
+        if box_type == b"meta":
+            if size > max_meta_box:
+                raise ProbeError("meta box too large")
+            data = _read_exact(f, size - header)
+            best = None
+            stack = [(4, len(data))] # meta is a full box: skip version/flags
+            while stack:
+                start, end = stack.pop()
+                for child, child_start, child_end in _iter_boxes(data, start, end):
+                    if child in (b"iprp", b"ipco"):
+                        stack.append((child_start, child_end))
+                    elif child == b"ispe" and child_end - child_start >= 12:
+                        width, height = struct.unpack(">II", data[child_start + 4:child_start + 12])
+                        if best is None or width * height > best[0] * best[1]:
+                            best = (width, height)
+            if best:
+                return best
+            break
+        pos += size
+    raise ProbeError("no ispe box")
+
+def probe(path):
+    # Returns (width, height, format) from the header alone, or None
+    try:
+        with open(path, "rb") as f:
+            head = f.read(32)
+            if head[:2] == b"\xff\xd8":
+                return _probe_jpeg(f) + ("JPEG",)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24]) + ("PNG",)
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10]) + ("GIF",)
+            if head[:2] == b"BM" and len(head) >= 26:
+                dib_size = struct.unpack("<I", head[14:18])[0]
+                if dib_size == 12:
+                    return struct.unpack("<HH", head[18:22]) + ("BMP",)
+                width, height = struct.unpack("<ii", head[18:26])
+                return (abs(width), abs(height), "BMP")
+            if head[:4] == b"8BPS":
+                height, width = struct.unpack(">II", head[14:22])
+                return (width, height, "PSD")
+            if head[:2] in (b"II", b"MM"):
+                byte_order = "<" if head[:2] == b"II" else ">"
+                magic = struct.unpack(byte_order + "H", head[2:4])[0]
+                # 42 = TIFF/DNG/NEF/CR2/ARW, 0x4F52/0x5352 = Olympus ORF, 0x55 = Panasonic RW2
+                if magic in (42, 0x4F52, 0x5352, 0x55):
+                    return _probe_tiff(f, byte_order) + ("TIFF",)
+            if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1", b"heim", b"heis", b"hevc"):
+                return _probe_heif(f) + ("HEIF",)
+    except (OSError, ProbeError, struct.error):
+        return None
+    return None
+
+def pil_size(path):
+    from PIL import Image # only loaded when a header can't be parsed
+    with Image.open(path) as img:
+        return img.size
+
+def get_size(path, log=print):
+    # (width, height) from the header, falling back to Pillow; (0, 0) if neither works
+    result = probe(path)
+    if result:
+        return result[0], result[1]
+    try:
+        return pil_size(path)
+    except Exception as e:
+        log(f"[RESOLUTION ERROR] Could not read resolution for {path}: {e}")
+        return (0, 0)
+
+def iter_sizes(paths, size_func=None, workers=None):
+    # Yields (path, size) in input order while later headers are read on a thread pool
+    size_func = size_func or get_size
+    workers = workers or default_workers
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from hashing.bounded_map(pool, lambda p: (p, size_func(p)), paths, workers * 4)
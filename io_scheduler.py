@@ -0,0 +1,360 @@
+import os
+import sys
+import stat
+import time
+import queue
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+
+# Per-device I/O scheduling for hashing and copying. Work is grouped by the
+# st_dev of the files it touches and every device runs at most `limit` tasks at
+# once: a USB hard disk gets 1-2 readers so its head isn't thrashing between
+# files, while an NVMe drive or a network share next to it runs many. Each
+# device has its own queue, so a slow disk never holds up work for a fast one
+# and total throughput is the sum of the devices. A copy holds a slot on both
+# its source and its destination device.
+#
+# Starting limits come from the device kind. On Linux that is
+# /sys/dev/block/MAJ:MIN/queue/rotational. Anonymous devices (major 0: btrfs,
+# NFS, SMB, FUSE, tmpfs, ...) are looked up in /proc/self/mountinfo: a mount
+# backed by a block device (btrfs, fuseblk) takes that disk's kind, tmpfs counts
+# as ssd, network and other FUSE filesystems as network. With auto_tune, a
+# device that had work waiting for a whole tune_interval is hill-climbed: its
+# throughput is compared with the previous interval and the limit moves one
+# step in whichever direction helped, within 1..max_limits[kind].
+
+device_kinds = ("hdd", "ssd", "network", "unknown")
+default_limits = {"hdd": 2, "ssd": 8, "network": 8, "unknown": 4}
+max_limits = {"hdd": 4, "ssd": 32, "network": 32, "unknown": 16}
+tune_interval = 2.0 # seconds
+tune_margin = 0.05 # throughput changes smaller than this are noise
+probe_after = 5 # flat intervals before trying another step
+map_window = 64 # items per device queued by map(); the rest wait as plain references
+max_pending = 1024 # copies a CopyQueue lets wait on the scheduler
+max_threads = 64
+mountinfo_file = "/proc/self/mountinfo"
+network_filesystems = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ceph", "glusterfs", "9p", "afs", "davfs"}
+memory_filesystems = {"tmpfs", "ramfs"}
+
+_local = threading.local()
+
+def device_name(dev):
+    if dev is None:
+        return "unknown"
+    if hasattr(os, "major"):
+        return f"{os.major(dev)}:{os.minor(dev)}"
+    return str(dev)
+
+def _block_kind(major, minor):
+    block = f"/sys/dev/block/{major}:{minor}"
+    # Partitions keep their queue settings on the parent disk
+    for rotational in (f"{block}/queue/rotational", f"{block}/../queue/rotational"):
+        try:
+            with open(rotational) as f:
+                return "hdd" if f.read().strip() == "1" else "ssd"
+        except OSError:
+            continue
+    return None
+
+def mount_of(dev, path=None):
+    # (filesystem type, mount source) of the mount whose st_dev is dev, or (None, None)
+    wanted = f"{os.major(dev)}:{os.minor(dev)}"
+    try:
+        with open(path or mountinfo_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3 or fields[2] != wanted or "-" not in fields:
+                    continue
+                tail = fields[fields.index("-") + 1:]
+                return tail[0], tail[1] if len(tail) > 1 else ""
+    except OSError:
+        pass
+    return None, None
+
+def _anonymous_kind(dev):
+    fstype, source = mount_of(dev)
+    if fstype is None:
+        return "network" # no mount table: assume the slow, remote case
+    if source.startswith("/dev/"):
+        try:
+            st = os.stat(source)
+        except OSError:
+            st = None
+        if st and stat.S_ISBLK(st.st_mode):
+            kind = _block_kind(os.major(st.st_rdev), os.minor(st.st_rdev))
+            if kind:
+                return kind
+    if fstype in memory_filesystems:
+        return "ssd"
+    if fstype in network_filesystems or fstype.startswith("fuse"):
+        return "network"
+    return "unknown"
+
+def device_kind(dev):
+    if dev is None or not sys.platform.startswith("linux"):
+        return "unknown"
+    major, minor = os.major(dev), os.minor(dev)
+    if major == 0:
+        return _anonymous_kind(dev)
+    return _block_kind(major, minor) or "unknown"
+
+def transferred(count):
+    # Bytes read or written by the running task; credited to its devices for auto-tuning
+    task = getattr(_local, "task", None)
+    if task:
+        scheduler, key = task
+        scheduler._credit(key, count)
+
+class Device:
+    def __init__(self, dev, kind, limit):
+        self.dev = dev
+        self.name = device_name(dev)
+        self.kind = kind
+        self.limit = limit
+        self.max_limit = max(limit, max_limits[kind])
+        self.low = self.high = limit # limit range seen while tuning
+        self.active = 0
+        self.tasks = 0
+        self.bytes = 0
+        self.first_start = None
+        self.last_done = None
+        self.window_start = time.perf_counter()
+        self.window_bytes = 0
+        self.saturated = False # had work waiting on this device during the window
+        self.last_rate = None
+        self.step = 1
+        self.flat = 0
+
+    @property
+    def mb_per_s(self):
+        if self.first_start is None or not self.last_done or self.last_done <= self.first_start:
+            return 0.0
+        return (self.bytes / (1024 * 1024)) / (self.last_done - self.first_start)
+
+    def tune(self, now):
+        # End of an interval; returns True if the limit changed
+        rate = self.window_bytes / (now - self.window_start)
+        saturated = self.saturated
+        self.window_start = now
+        self.window_bytes = 0
+        self.saturated = False
+        if not saturated:
+            return False # the device was waiting on us, so its rate says nothing about the limit
+        last, self.last_rate = self.last_rate, rate
+        if last is not None:
+            if rate < last * (1 - tune_margin):
+                self.step = -self.step # the last move hurt: go back
+            elif rate < last * (1 + tune_margin):
+                self.flat += 1
+                if self.flat < probe_after:
+                    return False
+        self.flat = 0
+        limit = self.limit + self.step
+        if not 1 <= limit <= self.max_limit:
+            self.step = -self.step
+            limit = self.limit + self.step
+        if not 1 <= limit <= self.max_limit:
+            return False
+        self.limit = limit
+        self.low = min(self.low, limit)
+        self.high = max(self.high, limit)
+        return True
+
+    def summary(self):
+        tuned = f" (tuned {self.low}-{self.high})" if self.low != self.high else ""
+        return (
+            f"{self.name} {self.kind}: limit {self.limit}{tuned} | {self.tasks} tasks | "
+            f"{self.bytes / (1024 * 1024):.1f} MB | {self.mb_per_s:.1f} MB/s"
+        )
+
+class IOScheduler:
+    def __init__(self, limits=None, auto_tune=True, threads=max_threads):
+        # limits: {kind: tasks} overriding default_limits
+        unknown = set(limits or {}) - set(device_kinds)
+        if unknown:
+            raise ValueError(f"Unknown device kinds: {', '.join(sorted(unknown))}")
+        self.limits = dict(default_limits, **(limits or {}))
+        self.auto_tune = auto_tune
+        self.lock = threading.Lock()
+        self.devices = {} # st_dev -> Device
+        self.folder_devices = {} # folder -> st_dev, so files aren't stat'ed one by one
+        self.queues = {} # tuple of st_devs -> deque of (func, args, on_done)
+        self.turn = 0
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="io")
+        self.retired = False # replaced by configure(): the pool is shut down whenever it goes idle
+
+    def device_of(self, path):
+        folder = os.path.dirname(os.path.abspath(path))
+        dev = self.folder_devices.get(folder, False)
+        if dev is False:
+            try:
+                dev = os.stat(folder).st_dev
+            except OSError:
+                dev = None # missing folder: the task will fail on its own
+            metrics.count("stat")
+            self.folder_devices[folder] = dev
+        return dev
+
+    def key(self, paths):
+        return tuple(sorted({self.device_of(path) for path in paths}, key=lambda dev: -1 if dev is None else dev))
+
+    def _device(self, dev):
+        device = self.devices.get(dev)
+        if device is None:
+            kind = device_kind(dev)
+            device = self.devices[dev] = Device(dev, kind, self.limits[kind])
+        return device
+
+    def _enqueue(self, key, func, args, on_done):
+        # on_done((ok, result_or_exception)) runs on the worker thread
+        with self.lock:
+            for dev in key:
+                self._device(dev)
+            self.queues.setdefault(key, deque()).append((func, args, on_done))
+            if self.pool is None: # retired, but someone still holds it
+                self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="io")
+            self._dispatch()
+
+    def _dispatch(self):
+        # Lock held. Starts every queued task whose devices all have a free slot.
+        keys = list(self.queues)
+        if not keys:
+            return
+        start = self.turn % len(keys)
+        self.turn += 1
+        for key in keys[start:] + keys[:start]:
+            tasks = self.queues[key]
+            devices = [self.devices[dev] for dev in key]
+            while tasks and all(device.active < device.limit for device in devices):
+                task = tasks.popleft()
+                now = time.perf_counter()
+                for device in devices:
+                    device.active += 1
+                    if device.first_start is None:
+                        device.first_start = now
+                self.pool.submit(self._run, key, *task)
+            if tasks:
+                for device in devices:
+                    device.saturated = True
+            else:
+                del self.queues[key]
+
+    def _run(self, key, func, args, on_done):
+        _local.task = (self, key)
+        try:
+            outcome = (True, func(*args))
+        except BaseException as e:
+            outcome = (False, e)
+        finally:
+            _local.task = None
+        try:
+            on_done(outcome)
+        finally:
+            with self.lock:
+                now = time.perf_counter()
+                for dev in key:
+                    device = self.devices[dev]
+                    device.active -= 1
+                    device.tasks += 1
+                    device.last_done = now
+                    if self.auto_tune and now - device.window_start >= tune_interval and device.tune(now):
+                        metrics.gauge(f"io.{device.name}.limit", device.limit)
+                self._dispatch()
+                self._shutdown_if_idle()
+
+    def _shutdown_if_idle(self):
+        # Lock held
+        if self.retired and self.pool and not self.queues and not any(device.active for device in self.devices.values()):
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def retire(self):
+        # Queued and running tasks still finish; the threads go once nothing is left
+        with self.lock:
+            self.retired = True
+            self._shutdown_if_idle()
+
+    def _credit(self, key, count):
+        with self.lock:
+            for dev in key:
+                device = self.devices[dev]
+                device.bytes += count
+                device.window_bytes += count
+        for dev in key:
+            metrics.count(f"io.{device_name(dev)}.bytes", count)
+
+    def submit(self, paths, func, *args):
+        # Runs func(*args) once every device of `paths` has a free slot; returns a Future
+        future = Future()
+
+        def on_done(outcome):
+            ok, value = outcome
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+        self._enqueue(self.key(paths), func, args, on_done)
+        return future
+
+    def map(self, func, items, path=None):
+        # func(item) for every item, yielding results in completion order (not input
+        # order). path(item) names the file an item reads (default: the item itself).
+        path = path or (lambda item: item)
+        backlog = defaultdict(deque)
+        for item in items:
+            backlog[self.key((path(item),))].append(item)
+        results = queue.SimpleQueue()
+        queued = Counter()
+        outstanding = 0
+
+        def feed(key):
+            nonlocal outstanding
+            while backlog[key] and queued[key] < map_window:
+                queued[key] += 1
+                outstanding += 1
+                self._enqueue(key, func, (backlog[key].popleft(),), lambda outcome, key=key: results.put((key, outcome)))
+
+        for key in list(backlog):
+            feed(key)
+        while outstanding:
+            key, (ok, value) = results.get()
+            outstanding -= 1
+            queued[key] -= 1
+            feed(key)
+            if not ok:
+                raise value
+            yield value
+
+    def summary(self):
+        with self.lock:
+            return [device.summary() for device in self.devices.values() if device.tasks]
+
+    def log_summary(self, log=print):
+        for line in self.summary():
+            log(f"[IO] {line}")
+
+_shared = None
+_shared_lock = threading.Lock()
+_settings = {}
+
+def configure(limits=None, auto_tune=True):
+    # Settings for the shared scheduler; replaces it if it was already created
+    global _shared
+    with _shared_lock:
+        _settings.update(limits=limits, auto_tune=auto_tune)
+        if _shared:
+            _shared.retire()
+        _shared = None
+
+def get_scheduler():
+    # One scheduler per process, so concurrent hashing and copying share the device limits
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = IOScheduler(**_settings)
+        return _shared
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import hashing
+
+# Append-only JSONL journals. Each line is one entry:
+#   {"seq": 12, "ts": "2024-05-01T10:00:00", "run": "scanned_album-20240501-100000-4242",
+#    "op": "copy", "src": "...", "dst": "...", "hash": "...", "bytes": 123}
+# Each entry is handed to the OS straight away (so it survives the process
+# crashing) and fsynced in batches (every fsync_every entries or fsync_interval
+# seconds, and on close), so recording an operation costs one small write instead
+# of rewriting a whole JSON file. A torn last line left by a crash is ignored
+# when reading.
+#
+#   operations.jsonl    copies and moves made by the tools (undo works from this)
+#   scan_history.jsonl  one entry per photo scan / scanned-album scan
+
+operations_file = "operations.jsonl"
+scan_history_file = "scan_history.jsonl"
+
+# Older JSON-array logs, imported the first time their journal is opened
+legacy_files = {
+    operations_file: ("recovery_log.json", "copy"),
+    scan_history_file: ("scan_history.json", "scan"),
+}
+legacy_keys = {"original": "src", "destination": "dst"}
+
+fsync_every = 256
+fsync_interval = 2.0 # seconds
+undo_workers = 8
+
+_run_counter = itertools.count(1)
+
+def new_run_id(tool):
+    return f"{tool}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_run_counter)}"
+
+class Journal:
+    def __init__(self, path=operations_file):
+        self.path = path
+        self.lock = threading.Lock()
+        imported = self._import_legacy() if not os.path.exists(path) else []
+        self.seq = self._last_seq()
+        self.file = open(path, "a", encoding="utf-8")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        for entry in imported:
+            self.append(entry.pop("op"), **entry)
+
+    def _import_legacy(self):
+        legacy_path, op = legacy_files.get(os.path.basename(self.path), (None, None))
+        legacy_path = legacy_path and os.path.join(os.path.dirname(self.path), legacy_path)
+        if not legacy_path or not os.path.exists(legacy_path):
+            return []
+        try:
+            with open(legacy_path, "r") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        return [
+            dict({legacy_keys.get(k, k): v for k, v in entry.items()}, op=op, run="legacy")
+            for entry in entries if isinstance(entry, dict)
+        ]
+
+    def _last_seq(self):
+        # Only the tail is read, so opening a long journal stays cheap
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(0, 2)
+            end = f.tell()
+            f.seek(max(0, end - 65536))
+            lines = f.read().splitlines()
+        for line in reversed(lines):
+            try:
+                return json.loads(line)["seq"]
+            except (ValueError, KeyError, TypeError):
+                continue
+        return 0
+
+    def append(self, op, **fields):
+        with self.lock:
+            self.seq += 1
+            entry = {"seq": self.seq, "ts": fields.pop("ts", None) or time.strftime("%Y-%m-%dT%H:%M:%S"), "op": op}
+            entry.update(fields)
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= fsync_every or time.monotonic() - self.last_sync >= fsync_interval:
+                self._sync()
+        return entry
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            if self.unsynced:
+                self._sync()
+
+    def start_run(self, tool, **fields):
+        run = new_run_id(tool)
+        self.append("run", run=run, tool=tool, **fields)
+        return run
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+def get_journal(path=operations_file):
+    # One open journal per file per process, closed (and fsynced) at exit
+    key = os.path.abspath(path)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = _journals[key] = Journal(path)
+            atexit.register(journal.close)
+        return journal
+
+def iter_entries(path=operations_file, run=None, op=None):
+    # Streams entries, optionally only those of one run and/or op(s)
+    ops = {op} if isinstance(op, str) else set(op or ())
+    op_markers = [f'"op": "{o}"' for o in ops]
+    live = _journals.get(os.path.abspath(path))
+    if live:
+        live.sync()
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            # Cheap substring pre-filters before parsing
+            if run and run not in line:
+                continue
+            if op_markers and not any(marker in line for marker in op_markers):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue # torn write from a crash
+            if run and entry.get("run") != run:
+                continue
+            if ops and entry.get("op") not in ops:
+                continue
+            yield entry
+
+def query(path=operations_file, run=None, op=None):
+    return list(iter_entries(path, run=run, op=op))
+
+def list_runs(path=operations_file):
+    # {run: {"tool", "ts", "copy": n, "move": n, "finished": bool, "undone": bool}} in journal order
+    runs = {}
+    for entry in iter_entries(path):
+        run = entry.get("run")
+        if not run:
+            continue
+        info = runs.setdefault(
+            run, {"tool": entry.get("tool", run.split("-")[0]), "ts": entry.get("ts"), "finished": False, "undone": False}
+        )
+        if entry["op"] == "undo":
+            info["undone"] = True
+        elif entry["op"] == "done":
+            info["finished"] = True
+        elif entry["op"] != "run":
+            info[entry["op"]] = info.get(entry["op"], 0) + 1
+    return runs
+
+def _undo_entry(entry, dry_run=False):
+    # Returns (status, message); copies are deleted, moves are moved back
+    src, dst = entry.get("src"), entry.get("dst")
+    if not dst or not os.path.lexists(dst):
+        return "missing", f"{dst} no longer exists"
+    if entry["op"] == "claim": # reserved by a run that stopped before the copy finished
+        if not dry_run:
+            os.remove(dst)
+        return "undone", f"removed unfinished {dst}"
+    if entry["op"] == "copy":
+        if entry.get("bytes") is not None and os.path.isfile(dst) and os.path.getsize(dst) != entry["bytes"]:
+            return "skipped", f"{dst} changed since it was copied"
+        if not dry_run:
+            os.remove(dst)
+        return "undone", f"removed {dst}"
+    if os.path.exists(src):
+        return "skipped", f"{src} exists again, not moving {dst} back"
+    if not dry_run:
+        os.makedirs(os.path.dirname(src) or ".", exist_ok=True)
+        shutil.move(dst, src)
+    return "undone", f"{dst} -> {src}"
+
+def undo_run(run, path=operations_file, workers=None, dry_run=False, log=print):
+    # Rolls back every copy and move of a run, newest first, on a thread pool.
+    # Returns {"undone": n, "skipped": n, "missing": n, "failed": n}.
+    entries = query(path, run=run, op=("claim", "copy", "move"))
+    finished = {entry["dst"] for entry in entries if entry["op"] != "claim"}
+    entries = [entry for entry in reversed(entries) if entry["op"] != "claim" or entry["dst"] not in finished]
+    counts = {"undone": 0, "skipped": 0, "missing": 0, "failed": 0}
+    workers = workers or undo_workers
+
+    def undo(entry):
+        try:
+            return _undo_entry(entry, dry_run)
+        except Exception as e:
+            return "failed", f"{entry.get('dst')}: {e}"
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for status, message in hashing.bounded_map(pool, undo, entries, workers * 4):
+            counts[status] += 1
+            if status != "undone" or dry_run:
+                log(f"[UNDO{' DRY RUN' if dry_run else ''}] {status}: {message}")
+    if not dry_run:
+        get_journal(path).append("undo", run=run, **counts)
+    log(f"[UNDO] {run}: {counts['undone']} undone | {counts['skipped']} skipped | {counts['missing']} missing | {counts['failed']} failed")
+    return counts
+
+def compact(path=operations_file, drop_undone=True, keep_runs=None, log=print):
+    # Rewrites the journal without entries of undone runs and, with keep_runs, of
+    # all but the newest keep_runs runs. Sequence numbers are kept.
+    runs = list_runs(path)
+    drop = {run for run, info in runs.items() if drop_undone and info["undone"]}
+    if keep_runs is not None:
+        drop.update(list(runs)[:max(0, len(runs) - keep_runs)])
+    live = _journals.get(os.path.abspath(path))
+    lock = live.lock if live else threading.Lock()
+    with lock:
+        if live and not live.file.closed:
+            live._sync()
+        kept = dropped = 0
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for entry in _iter_unlocked(path):
+                if entry.get("run") in drop:
+                    dropped += 1
+                    continue
+                out.write(json.dumps(entry) + "\n")
+                kept += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        if live and not live.file.closed:
+            live.file.close()
+            live.file = open(path, "a", encoding="utf-8")
+    log(f"[JOURNAL] Compacted {path}: kept {kept} entries, dropped {dropped} from {len(drop)} runs")
+    return kept, dropped
+
+def _iter_unlocked(path):
+    # iter_entries without syncing the live journal (its lock is already held)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def main(args):
+    usage = "usage: python journal.py runs | show RUN | undo RUN [--dry-run] | compact [KEEP_RUNS]"
+    if not args:
+        print(usage)
+        return 1
+    command = args[0]
+    if command == "runs":
+        for run, info in list_runs().items():
+            counts = ", ".join(f"{op}: {n}" for op, n in info.items() if op not in ("tool", "ts", "finished", "undone"))
+            state = "undone" if info["undone"] else "finished" if info["finished"] else "unfinished"
+            print(f"{run}  {info['ts']}  {counts or 'no operations'}  ({state})")
+    elif command == "show" and len(args) > 1:
+        for entry in iter_entries(run=args[1]):
+            print(json.dumps(entry))
+    elif command == "undo" and len(args) > 1:
+        undo_run(args[1], dry_run="--dry-run" in args)
+    elif command == "compact":
+        compact(keep_runs=int(args[1]) if len(args) > 1 else None)
+    else:
+        print(usage)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
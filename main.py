@@ -1,18 +1,42 @@
 import tkinter as tk
-from tkinter import ttk, filedialog
+from tkinter import ttk, filedialog, messagebox
 from tkinter.simpledialog import askstring
 from tkinterdnd2 import DND_FILES, TkinterDnD
-from PIL import Image, ImageTk
 import threading
+import importlib
 import os
 import json
 import time
 
-# Import scripts
-import photo_scan
-import cross_pic_organizer
-import scanned_album
-import clean_upload
+import gui_events
+
+# The tool scripts (and Pillow / dateutil behind them) are imported the first time
+# a tool runs, not at startup. See benchmarks/bench_startup.py.
+
+logo_path = os.path.join("assets", "logo.png")
+logo_size = (600, 300)
+# The resized logo is cached as a PNG Tk can load by itself, so a warm start
+# never imports Pillow or decodes the full-size image
+logo_cache_path = os.path.join("assets", ".cache", f"logo_{logo_size[0]}x{logo_size[1]}.png")
+
+def load_logo(log=print):
+    # Returns a Tk image of the logo at logo_size, or None if there is no logo
+    if not os.path.exists(logo_path):
+        return None
+    try:
+        if os.path.getmtime(logo_cache_path) >= os.path.getmtime(logo_path):
+            return tk.PhotoImage(file=logo_cache_path)
+    except (OSError, tk.TclError):
+        pass # no cache yet, or it's stale / unreadable
+    from PIL import Image, ImageTk
+    with Image.open(logo_path) as img:
+        logo_img = img.resize(logo_size, Image.LANCZOS)
+    try:
+        os.makedirs(os.path.dirname(logo_cache_path), exist_ok=True)
+        logo_img.save(logo_cache_path, "PNG")
+    except OSError as e:
+        log(f"[WARNING] Could not cache resized logo: {e}")
+    return ImageTk.PhotoImage(logo_img)
 
 class PhotoToolsApp(TkinterDnD.Tk):
     def __init__(self):
@@ -21,9 +45,15 @@ class PhotoToolsApp(TkinterDnD.Tk):
         self.geometry("1100x750")
         self.configure(bg="lightgray")
         
-        self.logo_photos = {}
+        self.logo_photo = None
         self.dropped_paths = {}
+        # Worker threads post log lines and progress here; the Tk thread applies them in batches
+        self.events = gui_events.EventBus()
+        self.progress_meter = gui_events.ProgressMeter()
+        # One tool at a time: run metrics, the hash cache and the I/O scheduler are per process
+        self.tool_lock = threading.Lock()
         self.create_widgets()
+        gui_events.start_pump(self, self.events, self.console_buffer, self.show_progress)
         
         
     def create_widgets(self):
@@ -39,6 +69,14 @@ class PhotoToolsApp(TkinterDnD.Tk):
         self.tab_control.pack(fill="both", expand=True)
         
         # --- Drop area and logo ---
+        # Decoded and resized once, shared by every tab
+        logo_error = None
+        try:
+            self.logo_photo = load_logo()
+        except Exception as e:
+            print(f"[ERROR] Failed to load logo: {e}")
+            logo_error = e
+        
         for tab_name, tab in self.tabs.items():
             drop_frame = tk.Frame(tab, bg="lightgray", pady=10)
             drop_frame.pack(pady=10)
@@ -55,21 +93,12 @@ class PhotoToolsApp(TkinterDnD.Tk):
             logo_frame = tk.Frame(tab, bg="lightgray")
             logo_frame.pack()
             
-            logo_path = os.path.join("assets", "logo.png")
-            if os.path.exists(logo_path):
-                try:
-                    logo_img = Image.open(logo_path)
-                    logo_img = logo_img.resize((600, 300), Image.LANCZOS)
-                    photo = ImageTk.PhotoImage(logo_img)
-                
-                    self.logo_photos[tab_name] = photo # Store it so it doesn't get garbage
-                
-                    logo_label = tk.Label(logo_frame, image=photo, bg="lightgray")
-                    logo_label.pack(pady=10)
-                except Exception as e:
-                    print(f"[ERROR] Failed to load logo: {e}")
-                    logo_label = tk.Label(logo_frame, text="[Logo error]", bg="lightgray")
-                    logo_label.pack(pady=10)
+            if self.logo_photo: # kept on self so it doesn't get garbage collected
+                logo_label = tk.Label(logo_frame, image=self.logo_photo, bg="lightgray")
+                logo_label.pack(pady=10)
+            elif logo_error:
+                logo_label = tk.Label(logo_frame, text="[Logo error]", bg="lightgray")
+                logo_label.pack(pady=10)
             else:
                 logo_label = tk.Label(logo_frame, text="[Logo not loaded]", bg="lightgray")
                 logo_label.pack(pady=10)
@@ -84,6 +113,7 @@ class PhotoToolsApp(TkinterDnD.Tk):
         # --- Console at bottom ---
         self.console = tk.Text(self, height=25, bg="black", fg="lime", insertbackground="white")
         self.console.pack(fill="x", side="bottom")
+        self.console_buffer = gui_events.RingConsole(self.console)
         self.log_console("[Console Ready]\n")
         
         # --- Progress Bar ---
@@ -131,15 +161,19 @@ class PhotoToolsApp(TkinterDnD.Tk):
         else:
             self.log_console(f"[{tab_name}] Invalid drop: Not a folder - {dropped_path}")
             
-    def log_console(self, message):
-        self.console.insert(tk.END, message + "\n")
-        self.console.see(tk.END)
+    def log_console(self, *parts):
+        # Safe from any thread; shown on the next pump tick
+        self.events.log(*parts)
         
     def update_progress(self, percent):
+        # Safe from any thread; only the latest value per pump tick is drawn
+        self.events.progress(percent)
+        
+    def show_progress(self, percent):
         try:
+            self.progress_meter.update(percent)
             self.progress_var.set(percent)
-            self.progress_label.config(text=f"{percent:.1f}%")
-            self.progress_frame.update_idletasks()
+            self.progress_label.config(text=self.progress_meter.text())
         except Exception as e:
             self.log_console(f"[Progress Error] {e}")    
     
@@ -161,19 +195,26 @@ class PhotoToolsApp(TkinterDnD.Tk):
         self.log_console(f"[Clean Upload] Copying from: {source_folder}")
         self.log_console(f"[Clean Upload] To: {dest}")
         
-        threading.Thread(
-            target=self.run_upload_thread,
-            args=(source_folder, dest),
-            daemon=True
-        ).start()
+        self.start_tool("Clean Upload", self.run_upload_thread, source_folder, dest)
         
     def run_upload_thread(self, source_folder, target_folder):
         try:
-            clean_upload.run_clean_upload(source_folder, target_folder, log=self.log_console)
+            import clean_upload
+            clean_upload.run_clean_upload(source_folder, target_folder, log=self.log_console, confirm=self.confirm_flagged_upload)
             self.log_console("[Clean Upload] Upload complete.")
         except Exception as e:
             self.log_console(f"[Clean Upload] Error: {str(e)}")
         
+    def confirm_flagged_upload(self, folder_name):
+        # Called from the upload thread; the dialog itself runs on the Tk thread
+        return self.events.call(
+            lambda: messagebox.askyesno(
+                "Clean Upload",
+                f"'{folder_name}' is flagged and not recommended for upload.\nUpload anyway?",
+                parent=self,
+            )
+        )
+        
     def scan_media(self):
         folder = self.dropped_paths.get("Media Discovery", [None])[-1]
         if not folder:
@@ -181,24 +222,40 @@ class PhotoToolsApp(TkinterDnD.Tk):
             return
         self.log_console(f"Scanning media in: {folder}")
         
-        threading.Thread(
-            target=photo_scan.run_photo_scan,
-            args=(folder,),
-            kwargs={
-                "log": self.log_console,
-                "progress_callback": self.update_progress
-            },
-            daemon=True
-        ).start()
+        self.start_tool(
+            "Media Discovery", self.run_tool, "photo_scan", "run_photo_scan", folder,
+            log=self.log_console,
+            progress_callback=self.update_progress
+        )
+    
+    def start_tool(self, label, target, *args, **kwargs):
+        # Runs target on a worker thread unless another tool is still running
+        if not self.tool_lock.acquire(blocking=False):
+            self.log_console(f"[{label}] Another tool is still running; start this one when it finishes.")
+            return
+        def worker():
+            try:
+                target(*args, **kwargs)
+            finally:
+                self.tool_lock.release()
+        threading.Thread(target=worker, daemon=True).start()
     
+    def run_tool(self, module_name, func_name, *args, **kwargs):
+        # Worker thread entry point: imports the tool on first use, then runs it
+        try:
+            module = importlib.import_module(module_name)
+            getattr(module, func_name)(*args, **kwargs)
+        except Exception as e:
+            self.log_console(f"[{module_name}] Error: {e}")
+        
     def organize_media(self):
         self.log_console("[Media Organizer] Starting input collection...")
         self.after(0, self.collect_organize_inputs)
         
     def collect_organize_inputs(self):
         json_path = filedialog.askopenfilename(
-            title="Select media JSON file.",
-            filetypes=[("JSON files", ".json")]
+            title="Select media list (any .jsonl inside a .medialist folder) or JSON file.",
+            filetypes=[("Media lists", "*.jsonl *.json")]
         )
         if not json_path:
             self.log_console("[Media Organizer] No JSON selected.")
@@ -220,15 +277,12 @@ class PhotoToolsApp(TkinterDnD.Tk):
             return
         
         # All inputs collected safely - run background logic
-        threading.Thread(
-            target=self.organize_media_thread,
-            args=(json_path, base_path, folder_name),
-            daemon=True
-        ).start()
+        self.start_tool("Media Organizer", self.organize_media_thread, json_path, base_path, folder_name)
     
     def organize_media_thread(self, json_path, base_path, folder_name):    
         try:
             start_time = time.time()
+            import cross_pic_organizer
             
             media_dict = cross_pic_organizer.load_media_json(json_path, log=self.log_console)
             if not media_dict:
@@ -277,19 +331,15 @@ class PhotoToolsApp(TkinterDnD.Tk):
         
         self.log_console(f"[Scanned Albums] Filtering by date: {date_start} to {date_end}")
         
-        threading.Thread(
-            target=scanned_album.scan_scanned_photos,
-            args=(folder,),
-            kwargs={
-                "batch_mode": True,
-                "default_album": album_name,
-                "default_tags": tags,
-                "date_start": date_start,
-                "date_end": date_end,
-                "log": self.log_console
-            },
-            daemon=True
-        ).start()
+        self.start_tool(
+            "Scanned Albums", self.run_tool, "scanned_album", "scan_scanned_photos", folder,
+            batch_mode=True,
+            default_album=album_name,
+            default_tags=tags,
+            date_start=date_start,
+            date_end=date_end,
+            log=self.log_console
+        )
         
     def move_albums(self):
         self.log_console("Moving scanned albums...")        
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import clean_upload
+import copy_engine
+import cross_pic_organizer
+import hash_cache
+import hashing
+import io_scheduler
+import media_list
+import perceptual_hash
+import photo_scan
+import physical_order
+
+# Non-interactive runner for cron / servers: scan -> organize -> clean upload,
+# driven by a JSON config file. Example media_tools.json:
+#   {
+#     "sources": ["/srv/media/phone", "/srv/media/camera"],
+#     "destination": "/srv/albums",
+#     "album_name": "Family_Album",
+#     "upload_target": "/srv/upload/Family_Album"
+#   }
+# Any other key of default_settings can be set too. Run:
+#   python media_cli.py --config media_tools.json [--workers 8] [--json]
+# --workers computes near-duplicate hashes on that many processes before the
+# organizer runs. --json prints one JSON object per line instead of text:
+#   {"event": "log" | "progress" | "stage" | "result", "stage": "scan", ...}
+
+default_config = "media_tools.json"
+stage_names = ("scan", "organize", "upload")
+
+default_settings = {
+    "stages": list(stage_names),
+    "sources": [],
+    "destination": None,
+    "album_name": None,
+    "upload_target": None,
+    "incremental": True,
+    "hash_algo": hashing.default_algo,
+    "near_duplicate_distance": perceptual_hash.default_distance,
+    "copy_workers": None, # None: per-device limits from the I/O scheduler
+    "io_limits": {}, # e.g. {"hdd": 1, "network": 16}; see io_scheduler.default_limits
+    "io_auto_tune": True,
+    "read_order": physical_order.default_mode, # auto | extent | inode | none
+    "organize_mode": cross_pic_organizer.default_mode, # pipeline | sequential
+    "organize_stages": {}, # e.g. {"probe": {"workers": 4, "queue_size": 64}}; see cross_pic_organizer.default_stages
+    "copy_mode": "auto",
+    "verify_copies": "none",
+    "hash_copies": False, # hash uncached files while copying them (skips the kernel copy methods)
+    "resume": True,
+    "repair": False,
+    "evict_hash_cache": False, # after organizing, drop cached hashes of deleted or replaced files
+    "dry_run": False,
+    "plan_path": None,
+    "upload_flagged_folders": [], # e.g. ["duplicates"]; flagged folders are skipped otherwise
+}
+
+# Exit codes
+exit_ok = 0
+exit_file_errors = 1 # finished, but some files could not be copied / hashed
+exit_config_error = 2 # bad arguments or config file (argparse uses 2 as well)
+exit_stage_failed = 3 # a stage stopped with an exception
+exit_interrupted = 130
+
+progress_step = 1.0 # percent between progress events
+
+class ConfigError(ValueError):
+    pass
+
+def load_config(path, overrides=None):
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ConfigError(f"Could not load config {path}: {e}")
+    if not isinstance(config, dict):
+        raise ConfigError(f"Config {path} must be a JSON object")
+    unknown = set(config) - set(default_settings)
+    if unknown:
+        raise ConfigError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    settings = dict(default_settings, **config)
+    settings.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    if isinstance(settings["sources"], str):
+        settings["sources"] = [settings["sources"]]
+    check_config(settings)
+    return settings
+
+def check_config(settings):
+    stages = settings["stages"]
+    bad = [stage for stage in stages if stage not in stage_names]
+    if bad:
+        raise ConfigError(f"Unknown stages: {', '.join(bad)} (expected {', '.join(stage_names)})")
+    if ("scan" in stages or "organize" in stages) and not settings["sources"]:
+        raise ConfigError("'sources' is required for scan and organize")
+    if ("organize" in stages or "upload" in stages) and not (settings["destination"] and settings["album_name"]):
+        raise ConfigError("'destination' and 'album_name' are required for organize and upload")
+    if "upload" in stages and not settings["upload_target"]:
+        raise ConfigError("'upload_target' is required for upload")
+    try:
+        hashing.check_algo(settings["hash_algo"])
+    except ValueError as e:
+        raise ConfigError(str(e))
+    if settings["verify_copies"] not in copy_engine.verify_modes:
+        raise ConfigError(f"Unknown verify_copies: {settings['verify_copies']}")
+    if settings["copy_mode"] not in copy_engine.copy_modes:
+        raise ConfigError(f"Unknown copy_mode: {settings['copy_mode']}")
+    if settings["read_order"] not in physical_order.order_modes:
+        raise ConfigError(f"Unknown read_order: {settings['read_order']}")
+    unknown = set(settings["io_limits"]) - set(io_scheduler.device_kinds)
+    if unknown:
+        raise ConfigError(f"Unknown io_limits device kinds: {', '.join(sorted(unknown))}")
+    if settings["organize_mode"] not in cross_pic_organizer.organize_modes:
+        raise ConfigError(f"Unknown organize_mode: {settings['organize_mode']}")
+    try:
+        cross_pic_organizer.stage_settings(settings["organize_stages"])
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ConfigError(f"Bad organize_stages: {e}")
+
+class Reporter:
+    # log / progress callbacks for the tools; safe to call from copy threads
+    def __init__(self, json_output=False, stream=None):
+        self.json_output = json_output
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+        self.stage = None
+        self.errors = 0 # files that couldn't be copied or hashed, as reported by the tools
+        self.last_percent = None
+
+    def emit(self, event, **fields):
+        if not self.json_output:
+            return
+        record = {"event": event, "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "stage": self.stage}
+        record.update(fields)
+        with self.lock:
+            self.stream.write(json.dumps(record) + "\n")
+            self.stream.flush()
+
+    def log(self, *parts):
+        message = " ".join(str(part) for part in parts)
+        if self.json_output:
+            self.emit("log", message=message.strip())
+        else:
+            with self.lock:
+                print(message, file=self.stream, flush=True)
+
+    def progress(self, percent):
+        with self.lock:
+            last = self.last_percent
+            if last is not None and abs(percent - last) < progress_step and not (percent >= 100 > last):
+                return
+            self.last_percent = percent
+        if self.json_output:
+            self.emit("progress", percent=round(percent, 1))
+
+    def start_stage(self, stage):
+        self.stage = stage
+        self.last_percent = None
+        self.emit("stage", status="start")
+        if not self.json_output:
+            self.log(f"\n=== {stage} ===")
+
+    def end_stage(self, seconds, **fields):
+        self.emit("stage", status="done", seconds=round(seconds, 2), **fields)
+
+def under_sources(path, sources):
+    return any(path == source or path.startswith(source.rstrip(os.sep) + os.sep) for source in sources)
+
+def media_from_list(sources):
+    # Without a scan stage, the organizer works on what earlier scans of these sources found
+    sources = [os.path.abspath(source) for source in sources]
+    found = media_list.MediaList(photo_scan.output_list)
+    return {
+        key: [path for path in found.get(key) if under_sources(path, sources)]
+        for key in ("images", "videos")
+    }
+
+def run_scan(settings, reporter):
+    images, videos = [], []
+    sources = settings["sources"]
+    for i, source in enumerate(sources):
+        progress = lambda percent, i=i: reporter.progress((i + percent / 100) / len(sources) * 100)
+        found = photo_scan.run_photo_scan(
+            source, log=reporter.log, progress_callback=progress, incremental=settings["incremental"]
+        )
+        if found is None:
+            raise ConfigError(f"Source is not a folder: {source}")
+        images.extend(found[0])
+        videos.extend(found[1])
+    return {"images": images, "videos": videos}
+
+def run_organize(settings, media_dict, reporter, workers):
+    if workers > 1 and settings["near_duplicate_distance"] is not None:
+        images = [path for path in media_dict["images"] if not cross_pic_organizer.is_junk(os.path.basename(path))]
+        perceptual_hash.prewarm(images, workers, log=reporter.log)
+    plan = cross_pic_organizer.organize_media(
+        media_dict,
+        settings["destination"],
+        settings["album_name"],
+        log=reporter.log,
+        progress_callback=reporter.progress,
+        hash_algo=settings["hash_algo"],
+        near_duplicate_distance=settings["near_duplicate_distance"],
+        copy_workers=settings["copy_workers"],
+        copy_mode=settings["copy_mode"],
+        verify_copies=settings["verify_copies"],
+        hash_copies=settings["hash_copies"],
+        resume=settings["resume"],
+        repair=settings["repair"],
+        dry_run=settings["dry_run"],
+        plan_path=settings["plan_path"],
+        read_order=settings["read_order"],
+        mode=settings["organize_mode"],
+        stages=settings["organize_stages"],
+    )
+    reporter.errors += plan["errors"] + plan.get("failed", 0)
+    if settings["evict_hash_cache"] and not settings["dry_run"]:
+        hash_cache.get_cache().evict_missing(log=reporter.log)
+    return {kind: {"files": files, "bytes": size} for kind, (files, size) in cross_pic_organizer.plan_totals(plan).items()}
+
+def run_upload(settings, reporter):
+    flagged = {name.lower() for name in settings["upload_flagged_folders"]}
+    reporter.errors += clean_upload.run_clean_upload(
+        os.path.join(settings["destination"], settings["album_name"]),
+        settings["upload_target"],
+        log=reporter.log,
+        resume=settings["resume"],
+        repair=settings["repair"],
+        confirm=lambda folder_name: folder_name.lower() in flagged,
+    )
+
+def run_pipeline(settings, reporter, workers=1):
+    # Returns an exit code
+    io_scheduler.configure(limits=settings["io_limits"], auto_tune=settings["io_auto_tune"])
+    media_dict = None
+    for stage in settings["stages"]:
+        if stage == "upload" and settings["dry_run"]:
+            reporter.log("[CLI] Dry run: skipping upload")
+            continue
+        reporter.start_stage(stage)
+        start = time.time()
+        fields = {}
+        try:
+            if stage == "scan":
+                media_dict = run_scan(settings, reporter)
+                fields = {"images": len(media_dict["images"]), "videos": len(media_dict["videos"])}
+            elif stage == "organize":
+                if media_dict is None:
+                    media_dict = media_from_list(settings["sources"])
+                fields = {"totals": run_organize(settings, media_dict, reporter, workers)}
+            else:
+                run_upload(settings, reporter)
+        except ConfigError as e:
+            reporter.log(f"[CLI ERROR] {e}")
+            return exit_config_error
+        except Exception as e:
+            reporter.log(f"[CLI ERROR] {stage} failed: {e!r}")
+            reporter.end_stage(time.time() - start, failed=True)
+            return exit_stage_failed
+        reporter.end_stage(time.time() - start, **fields)
+    return exit_file_errors if reporter.errors else exit_ok
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Scan, organize and clean-upload media without the GUI.")
+    parser.add_argument("--config", default=default_config, help=f"JSON config file (default: {default_config})")
+    parser.add_argument("--workers", type=int, default=1, help="processes for near-duplicate hashing (default: 1)")
+    parser.add_argument("--stages", help="comma-separated subset of " + ",".join(stage_names))
+    parser.add_argument("--dry-run", action="store_true", help="plan the organize step only; nothing is copied")
+    parser.add_argument("--json", action="store_true", help="print progress as JSON lines")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+    reporter = Reporter(json_output=options.json)
+    overrides = {
+        "stages": options.stages.split(",") if options.stages else None,
+        "dry_run": True if options.dry_run else None,
+    }
+    try:
+        settings = load_config(options.config, overrides)
+        if options.workers < 1:
+            raise ConfigError("--workers must be at least 1")
+    except ConfigError as e:
+        reporter.log(f"[CLI ERROR] {e}")
+        code = exit_config_error
+    else:
+        try:
+            code = run_pipeline(settings, reporter, workers=options.workers)
+        except KeyboardInterrupt:
+            reporter.log("[CLI] Interrupted; rerun to resume")
+            code = exit_interrupted
+    reporter.stage = None
+    reporter.emit("result", exit_code=code, errors=reporter.errors)
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
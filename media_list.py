@@ -0,0 +1,177 @@
+import os
+import json
+import heapq
+import itertools
+
+# A media list is a folder of sorted JSONL shards. Every scan appends one shard
+# (new or changed files plus "removed" tombstones); readers merge the shards
+# lazily by path with the newest shard winning, so nothing is loaded whole.
+#
+#   photo_folder.medialist/
+#       000001.jsonl   {"media_list": 1, "records": 3}
+#                      {"path": "/a/IMG_1.jpg", "kind": "image", "size": 123, "mtime_ns": ...}
+#                      {"path": "/a/old.mov", "removed": true}
+
+list_suffix = ".medialist"
+shard_suffix = ".jsonl"
+format_version = 1
+
+# Merge everything into one shard once this many pile up
+max_shards = 16
+
+kind_keys = {"images": "image", "videos": "video"}
+
+def is_media_list(path):
+    # A .medialist folder, a folder holding numbered shards, or a shard inside one
+    path = str(path)
+    if path.endswith(shard_suffix):
+        path = os.path.dirname(path)
+    return path.endswith(list_suffix) or bool(list_shards(path))
+
+def resolve_list_dir(path):
+    # Picking any shard inside a media list opens the whole list
+    path = str(path)
+    if path.endswith(shard_suffix):
+        return os.path.dirname(path)
+    return path
+
+def list_shards(list_dir):
+    if not os.path.isdir(list_dir):
+        return []
+    names = sorted(n for n in os.listdir(list_dir) if n.endswith(shard_suffix) and n[:-len(shard_suffix)].isdigit())
+    return [os.path.join(list_dir, n) for n in names]
+
+def make_record(kind, path, size=None, mtime_ns=None):
+    record = {"path": path, "kind": kind}
+    if size is not None:
+        record["size"] = size
+    if mtime_ns is not None:
+        record["mtime_ns"] = mtime_ns
+    return record
+
+def _next_shard_path(list_dir):
+    shards = list_shards(list_dir)
+    seq = int(os.path.basename(shards[-1])[:-len(shard_suffix)]) + 1 if shards else 1
+    return os.path.join(list_dir, f"{seq:06d}{shard_suffix}")
+
+def _write_sorted(shard_path, records, count):
+    # Written to a temp name first so readers never see half a shard
+    tmp_path = shard_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"media_list": format_version, "records": count}) + "\n")
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+    os.replace(tmp_path, shard_path)
+    return shard_path
+
+def write_shard(list_dir, records, removed=()):
+    # records: dicts from make_record() or (kind, path[, size, mtime_ns]) tuples
+    # removed: paths to drop from the list
+    os.makedirs(list_dir, exist_ok=True)
+    by_path = {}
+    for record in records:
+        if not isinstance(record, dict):
+            record = make_record(*record)
+        by_path[record["path"]] = record
+    for path in removed:
+        by_path.setdefault(path, {"path": path, "removed": True})
+    if not by_path:
+        return None
+
+    ordered = (by_path[p] for p in sorted(by_path))
+    shard_path = _write_sorted(_next_shard_path(list_dir), ordered, len(by_path))
+    if len(list_shards(list_dir)) > max_shards:
+        compact(list_dir)
+    return shard_path
+
+def _read_shard(shard_path, rank):
+    with open(shard_path, "r", encoding="utf-8") as f:
+        f.readline() # header
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["path"], rank, record
+
+def iter_records(source, kind=None, include_removed=False):
+    # Lazily yields the current record for every path, in path order
+    if str(source).endswith(".json"):
+        yield from _iter_legacy_json(source, kind)
+        return
+
+    shards = list_shards(resolve_list_dir(source))
+    # Lower rank sorts first, so the newest shard's record for a path comes out first
+    readers = [_read_shard(p, -i) for i, p in enumerate(shards)]
+    merged = heapq.merge(*readers)
+    for path, group in itertools.groupby(merged, key=lambda item: item[0]):
+        record = next(group)[2]
+        if record.get("removed") and not include_removed:
+            continue
+        if kind and record.get("kind") != kind:
+            continue
+        yield record
+
+def iter_paths(source, kind=None):
+    for record in iter_records(source, kind=kind):
+        yield record["path"]
+
+def estimate_count(source):
+    # Upper bound taken from the shard headers; exact right after compact()
+    if str(source).endswith(".json"):
+        return sum(1 for _ in _iter_legacy_json(source))
+    total = 0
+    for shard_path in list_shards(resolve_list_dir(source)):
+        with open(shard_path, "r", encoding="utf-8") as f:
+            try:
+                total += json.loads(f.readline()).get("records", 0)
+            except ValueError:
+                pass
+    return total
+
+def compact(list_dir):
+    # Folds every shard into one, dropping tombstones and superseded records
+    shards = list_shards(list_dir)
+    if len(shards) <= 1:
+        return shards[0] if shards else None
+    count = sum(1 for _ in iter_records(list_dir))
+    new_path = _write_sorted(_next_shard_path(list_dir), iter_records(list_dir), count)
+    for shard_path in shards:
+        os.remove(shard_path)
+    # Keep numbering from 1 so the next shard still sorts after this one
+    final_path = os.path.join(list_dir, f"{1:06d}{shard_suffix}")
+    os.replace(new_path, final_path)
+    return final_path
+
+def _iter_legacy_json(json_path, kind=None):
+    # The old photo_folder.json: {"images": [...], "videos": [...]} loaded whole
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    records = []
+    for key, record_kind in kind_keys.items():
+        if kind and kind != record_kind:
+            continue
+        records.extend(make_record(record_kind, p) for p in data.get(key, []))
+    records.sort(key=lambda r: r["path"])
+    yield from records
+
+def import_json(json_path, list_dir):
+    return write_shard(list_dir, _iter_legacy_json(json_path))
+
+class MediaList:
+    # Read-only view with the same .get("images") / .get("videos") shape as the
+    # old JSON dict, except the lists are produced lazily
+    def __init__(self, path):
+        self.path = resolve_list_dir(path)
+
+    def get(self, key, default=None):
+        if key not in kind_keys:
+            return default
+        return iter_paths(self.path, kind=kind_keys[key])
+
+    def __iter__(self):
+        return iter_records(self.path)
+
+    def __bool__(self):
+        return bool(list_shards(self.path))
+
+    def estimate_count(self):
+        return estimate_count(self.path)
@@ -0,0 +1,168 @@
+import os
+import struct
+from array import array
+
+# Compact in-memory tables for million-file runs. A list of absolute path
+# strings costs 100+ bytes per file, and a tuple or dict per record another
+# 60-300. Here every field is a column in an array:
+#   PathTable    - paths split at the last separator; each folder string is kept
+#                  once (interned), basenames are packed UTF-8 in one bytearray.
+#                  table[i] rebuilds the exact original string.
+#   MediaRecords - a PathTable plus size, mtime, width, height, kind and dHash columns
+#   OpTable      - the organizer's plan ops; indexing and iteration still give
+#                  {"kind", "src", "dst", "size", "note"} dicts, built on demand
+# pack_digest stores a content key as raw bytes (16 for MD5) instead of a
+# 32-character hex string.
+
+record_kinds = ("image", "video")
+unknown_size = -1
+_size_prefix = struct.Struct("<q")
+
+def split_path(path):
+    # (folder with its trailing separator, name); folder + name is the original path
+    cut = path.rfind(os.sep)
+    if os.altsep:
+        cut = max(cut, path.rfind(os.altsep))
+    return path[:cut + 1], path[cut + 1:]
+
+class PathTable:
+    def __init__(self, paths=()):
+        self.folders = [] # folder id -> folder
+        self.folder_ids = {} # folder -> folder id
+        self.folder_of = array("I")
+        self.name_data = bytearray()
+        self.name_ends = array("I") # widened to 64-bit past 4 GB of names
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        # Returns the new row number
+        folder, name = split_path(path)
+        folder_id = self.folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self.folder_ids[folder] = len(self.folders)
+            self.folders.append(folder)
+        self.folder_of.append(folder_id)
+        self.name_data += name.encode("utf-8", "surrogateescape")
+        if len(self.name_data) > 0xFFFFFFFF and self.name_ends.typecode == "I":
+            self.name_ends = array("Q", self.name_ends)
+        self.name_ends.append(len(self.name_data))
+        return len(self.name_ends) - 1
+
+    def name(self, i):
+        start = self.name_ends[i - 1] if i else 0
+        return self.name_data[start:self.name_ends[i]].decode("utf-8", "surrogateescape")
+
+    def folder(self, i):
+        return self.folders[self.folder_of[i]]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.folder(i) + self.name(i)
+
+    def __len__(self):
+        return len(self.name_ends)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def paths(self, rows):
+        # Paths of the given row numbers, in that order
+        return (self[i] for i in rows)
+
+class MediaRecords(PathTable):
+    def __init__(self):
+        super().__init__()
+        self.kind = array("B")
+        self.size = array("q")
+        self.mtime = array("d")
+        self.width = array("I")
+        self.height = array("I")
+        self.phash = array("Q")
+        self.has_phash = bytearray()
+
+    def add(self, path, kind="image", size=unknown_size, mtime=0.0, width=0, height=0, phash=None):
+        row = super().add(path)
+        self.kind.append(record_kinds.index(kind))
+        self.size.append(size)
+        self.mtime.append(mtime)
+        self.width.append(width)
+        self.height.append(height)
+        self.phash.append(phash or 0)
+        self.has_phash.append(phash is not None)
+        return row
+
+    def resolution(self, i):
+        return self.width[i], self.height[i]
+
+    def pixels(self, i):
+        return self.width[i] * self.height[i]
+
+    def dhash(self, i):
+        return self.phash[i] if self.has_phash[i] else None
+
+    def record(self, i):
+        return {
+            "path": self[i],
+            "kind": record_kinds[self.kind[i]],
+            "size": self.size[i],
+            "mtime": self.mtime[i],
+            "width": self.width[i],
+            "height": self.height[i],
+            "dhash": self.dhash(i),
+        }
+
+class OpTable:
+    def __init__(self, kinds, ops=()):
+        self.kinds = tuple(kinds)
+        self.kind = array("B")
+        self.src = PathTable()
+        self.dst = PathTable()
+        self.size = array("q")
+        self.notes = [""] # note id -> note; notes repeat (junk rule names), so they're interned
+        self.note_ids = {"": 0}
+        self.note = array("I")
+        for op in ops:
+            self.append(op)
+
+    def add(self, kind, src, dst, size, note=""):
+        note_id = self.note_ids.get(note)
+        if note_id is None:
+            note_id = self.note_ids[note] = len(self.notes)
+            self.notes.append(note)
+        self.kind.append(self.kinds.index(kind))
+        self.src.add(src)
+        self.dst.add(dst)
+        self.size.append(size)
+        self.note.append(note_id)
+
+    def append(self, op):
+        self.add(op["kind"], op["src"], op["dst"], op.get("size", 0), op.get("note", ""))
+
+    def __getitem__(self, i):
+        return {
+            "kind": self.kinds[self.kind[i]],
+            "src": self.src[i],
+            "dst": self.dst[i],
+            "size": self.size[i],
+            "note": self.notes[self.note[i]],
+        }
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+def pack_digest(key):
+    # "<size>:<hex>" or "<size>:~<hex>" (head/tail match only) -> size, marker, raw digest
+    size, _, digest = key.partition(":")
+    marker = b"~" if digest.startswith("~") else b":"
+    return _size_prefix.pack(int(size)) + marker + bytes.fromhex(digest.lstrip("~"))
+
+def unpack_digest(packed):
+    size = _size_prefix.unpack_from(packed)[0]
+    marker = packed[_size_prefix.size:_size_prefix.size + 1]
+    digest = packed[_size_prefix.size + 1:].hex()
+    return f"{size}:~{digest}" if marker == b"~" else f"{size}:{digest}"
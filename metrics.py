@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Process-wide metrics that every tool reports to:
+#   stage(name)        - wall and CPU seconds spent inside a block (CPU is the
+#                        whole process, so pool threads working for it count too)
+#   count(name, n)     - counters: files, bytes, stat calls, copies, ...
+#   gauge(name, value) - sampled levels such as queue depths (last / max / mean)
+#   cache(name, hits, misses)
+# run(tool), or the @reported(tool) decorator, wraps a whole tool run: it
+# resets the registry, counts opens and directory listings through an audit
+# hook, and appends a JSON report to run_reports.jsonl (next to
+# scan_history.jsonl) when the run ends. There is one run per process: the
+# registry, the audit counts, CPU time and /proc/self/io are all process-wide,
+# and pool threads work for whichever run queued the task. A run started while
+# another is active, from any thread, reports into the outer one, so callers
+# run one tool at a time (the GUI refuses to start a second).
+#
+# Profiling is opt-in per run with MEDIA_TOOLS_PROFILE=cprofile or =sample
+# (or profile=... on run()). cprofile profiles the thread that started the run;
+# sample looks at every thread's stack each sample_interval seconds, which also
+# covers the hashing and copy pools. Profiles go to profiles/.
+
+report_file = "run_reports.jsonl"
+profile_dir = "profiles"
+profile_env = "MEDIA_TOOLS_PROFILE"
+profile_modes = ("cprofile", "sample")
+profile_top = 25 # hot paths written to the text summary
+sample_interval = 0.005 # seconds
+audited_events = {"open": "open", "os.scandir": "scandir", "os.listdir": "listdir"}
+
+_lock = threading.Lock()
+_counters = Counter()
+_stages = {} # name -> {"calls", "wall_s", "cpu_s"}
+_gauges = {} # name -> {"last", "max", "total", "samples"}
+_caches = {} # name -> (hits, misses)
+_auditing = False
+_hooked = False
+_active_run = None
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+        _gauges.clear()
+        _caches.clear()
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+def gauge(name, value):
+    with _lock:
+        g = _gauges.get(name)
+        if g is None:
+            g = _gauges[name] = {"last": value, "max": value, "total": 0, "samples": 0}
+        g["last"] = value
+        g["max"] = max(g["max"], value)
+        g["total"] += value
+        g["samples"] += 1
+
+def cache(name, hits, misses):
+    with _lock:
+        _caches[name] = (hits, misses)
+
+@contextmanager
+def stage(name):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        with _lock:
+            s = _stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+            s["calls"] += 1
+            s["wall_s"] += wall
+            s["cpu_s"] += cpu
+
+def _audit(event, args):
+    name = audited_events.get(event)
+    if name and _auditing:
+        count(name)
+
+def _proc_io():
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f)}
+    except OSError:
+        return {}
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def snapshot():
+    with _lock:
+        caches = {
+            name: {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+            for name, (hits, misses) in _caches.items()
+        }
+        return {
+            "stages": {name: {key: round(value, 3) for key, value in s.items()} for name, s in _stages.items()},
+            "counters": dict(_counters),
+            "gauges": {
+                name: {"last": g["last"], "max": g["max"], "mean": round(g["total"] / g["samples"], 2)}
+                for name, g in _gauges.items()
+            },
+            "caches": caches,
+        }
+
+def write_report(report, path=report_file):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(report) + "\n")
+
+class Sampler:
+    # Statistical profiler: counts the innermost frames of every thread
+    def __init__(self, interval=sample_interval):
+        self.interval = interval
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self):
+        me = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < 3:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.samples[" <- ".join(stack)] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def dump(self, path):
+        total = sum(self.samples.values()) or 1
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{total} samples every {self.interval * 1000:.0f} ms\n")
+            for stack, n in self.samples.most_common():
+                f.write(f"{n / total:7.2%} {n:8} {stack}\n")
+
+@contextmanager
+def _profiler(mode, name, log):
+    if mode not in profile_modes:
+        if mode:
+            log(f"[METRICS] Unknown profile mode {mode!r}, expected one of {', '.join(profile_modes)}")
+        yield
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, name)
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(base + ".prof")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(profile_top)
+            log(f"[METRICS] Profile written to {base}.prof / {base}.txt")
+    else:
+        sampler = Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.dump(base + ".txt")
+            log(f"[METRICS] Sampled profile written to {base}.txt")
+
+@contextmanager
+def run(tool, log=print, profile=None, report_path=report_file, **fields):
+    # Wraps one tool run; fields (e.g. source folder) are copied into the report
+    global _auditing, _hooked, _active_run
+    with _lock:
+        nested = _active_run is not None
+        if not nested:
+            _active_run = tool
+    if nested:
+        yield
+        return
+    if not _hooked:
+        sys.addaudithook(_audit) # hooks can't be removed; _auditing switches counting off
+        _hooked = True
+    reset()
+    _auditing = True
+    name = f"{tool}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    profile = profile or os.environ.get(profile_env)
+    io_before = _proc_io()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    status = "failed"
+    try:
+        with _profiler(profile, name, log):
+            yield
+        status = "ok"
+    finally:
+        _auditing = False
+        _active_run = None
+        io_after = _proc_io()
+        report = {
+            "run": name,
+            "tool": tool,
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "status": status,
+            "wall_s": round(time.perf_counter() - wall_start, 3),
+            "cpu_s": round(time.process_time() - cpu_start, 3),
+            "peak_rss_mb": _peak_rss_mb(),
+            "io": {key: io_after[key] - io_before.get(key, 0) for key in ("syscr", "syscw", "read_bytes", "write_bytes") if key in io_after},
+            "profile": profile if profile in profile_modes else None,
+        }
+        report.update(fields)
+        report.update(snapshot())
+        try:
+            write_report(report, report_path)
+        except OSError as e:
+            log(f"[METRICS] Could not write run report: {e}")
+        log(f"[METRICS] {summary(report)}")
+
+def summary(report):
+    stages = " | ".join(
+        f"{name} {s['wall_s']:.1f}s" for name, s in sorted(report["stages"].items(), key=lambda item: -item[1]["wall_s"])
+    )
+    return f"{report['tool']}: {report['wall_s']:.1f}s wall, {report['cpu_s']:.1f}s CPU | {stages or 'no stages'}"
+
+def reported(tool):
+    # Decorator: runs the function inside run(tool), logging through its log= keyword
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with run(tool, log=kwargs.get("log", print)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
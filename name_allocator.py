@@ -0,0 +1,63 @@
+import os
+import threading
+
+import copy_engine
+
+# Hands out unique destination names (name.jpg, name_1.jpg, name_2.jpg, ...).
+# Each target folder is listed once; after that a name is picked from an
+# in-memory set plus the next free counter per stem, instead of probing the
+# disk with os.path.exists once per collision. Safe to share between threads.
+
+class FolderNames:
+    def __init__(self, folder):
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            names = []
+        self.taken = {os.path.normcase(name) for name in names}
+        self.counters = {} # normcased stem -> next counter to try
+
+    def pick(self, filename, split_ext=True):
+        if os.path.normcase(filename) not in self.taken:
+            return filename
+        stem, ext = os.path.splitext(filename) if split_ext else (filename, "")
+        key = os.path.normcase(stem + ext)
+        counter = self.counters.get(key, 1)
+        while True:
+            candidate = f"{stem}_{counter}{ext}"
+            counter += 1
+            if os.path.normcase(candidate) not in self.taken:
+                break
+        self.counters[key] = counter
+        return candidate
+
+class NameAllocator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.folders = {}
+
+    def _folder(self, folder):
+        key = os.path.normcase(os.path.abspath(folder))
+        names = self.folders.get(key)
+        if names is None:
+            names = self.folders[key] = FolderNames(folder)
+        return names
+
+    def reserve(self, path):
+        # Marks a name as taken without touching the disk (e.g. destinations owned
+        # by a resumed run whose files may not exist yet)
+        with self.lock:
+            folder, name = os.path.split(path)
+            self._folder(folder).taken.add(os.path.normcase(name))
+
+    def allocate(self, folder, filename, claim=True, split_ext=True):
+        # Returns folder/<unique name>. With claim the file is also created empty
+        # (O_EXCL), which catches names taken by another process since the listing.
+        with self.lock:
+            names = self._folder(folder)
+            while True:
+                name = names.pick(filename, split_ext)
+                names.taken.add(os.path.normcase(name))
+                dest = os.path.join(folder, name)
+                if not claim or copy_engine.claim_exact(dest):
+                    return dest
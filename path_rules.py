@@ -0,0 +1,114 @@
+import os
+import re
+import json
+
+# Skip/junk rules are compiled once into one regex per match mode, so a path is
+# checked in a single pass instead of one substring test per keyword.
+#
+# Rules can be overridden from path_rules.json next to the app:
+#
+#   {
+#       "skip_folders": ["Temp", {"pattern": "node_modules", "match": "component"}],
+#       "junk_extensions": [".tmp", ".lnk"],
+#       "junk_keywords": ["thumb", {"pattern": "icon", "match": "substring", "name": "icons"}]
+#   }
+#
+# Plain strings use the rule set's default mode. Matching is case-insensitive.
+#   substring - pattern appears anywhere in the path
+#   component - pattern is a whole folder/file name in the path
+#   suffix    - path ends with pattern
+
+rules_file = "path_rules.json"
+match_modes = ("substring", "component", "suffix")
+
+def _trie_pattern(words):
+    # "cache", "config", "core" -> c(?:(?:ache|o(?:nfig|re))) : far fewer branches
+    # for the regex engine to try at each position than a flat alternation
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        if list(node) == [""]:
+            return ""
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+def make_rule(rule, default_mode="substring"):
+    if isinstance(rule, str):
+        rule = {"pattern": rule}
+    mode = rule.get("match", default_mode)
+    if mode not in match_modes:
+        raise ValueError(f"Unknown match mode '{mode}' for rule {rule.get('pattern')!r}")
+    return {
+        "name": rule.get("name", rule["pattern"]),
+        "pattern": rule["pattern"].lower(),
+        "match": mode,
+    }
+
+class RuleSet:
+    def __init__(self, rules, default_mode="substring"):
+        self.rules = [make_rule(r, default_mode) for r in rules if r]
+        # matched text -> rule, first definition wins
+        self.by_mode = {mode: {} for mode in match_modes}
+        for rule in self.rules:
+            self.by_mode[rule["match"]].setdefault(rule["pattern"], rule)
+
+        substrings = self.by_mode["substring"]
+        self.substring_regex = re.compile(_trie_pattern(substrings)) if substrings else None
+        components = self.by_mode["component"]
+        self.component_regex = (
+            re.compile(r"(?:^|[\\/])(" + _trie_pattern(components) + r")(?=[\\/]|$)") if components else None
+        )
+        self.suffixes = tuple(self.by_mode["suffix"])
+
+    def match(self, path):
+        # Returns the rule that matched (for audit logs) or None
+        lower_path = path.lower()
+        if self.suffixes and lower_path.endswith(self.suffixes):
+            for suffix, rule in self.by_mode["suffix"].items():
+                if lower_path.endswith(suffix):
+                    return rule
+        if self.substring_regex:
+            m = self.substring_regex.search(lower_path)
+            if m:
+                return self.by_mode["substring"][m.group()]
+        if self.component_regex:
+            m = self.component_regex.search(lower_path)
+            if m:
+                return self.by_mode["component"][m.group(1)]
+        return None
+
+    def matches(self, path):
+        # Hot path: same answer as match(), without working out which rule hit
+        lower_path = path.lower()
+        if self.suffixes and lower_path.endswith(self.suffixes):
+            return True
+        if self.substring_regex and self.substring_regex.search(lower_path):
+            return True
+        return bool(self.component_regex and self.component_regex.search(lower_path))
+
+    def __len__(self):
+        return len(self.rules)
+
+def load_rules_config(path=rules_file, log=print):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        log(f"[RULES ERROR] Could not load {path}: {e}. Using built-in rules.")
+        return {}
+
+def load_rule_set(key, defaults, default_mode="substring", path=rules_file, log=print):
+    config = load_rules_config(path, log=log)
+    return RuleSet(config.get(key, defaults), default_mode=default_mode)
@@ -0,0 +1,164 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import hash_cache
+
+# Near-duplicate detection for images. A 64-bit dHash is computed from a tiny
+# grayscale thumbnail (JPEGs are decoded at reduced scale via Image.draft), so
+# resized, re-encoded or renamed copies land within a few bits of each other.
+#
+# Clustering uses multi-index hashing: with max_distance d the hash is split into
+# d + 1 chunks, and by the pigeonhole principle any two hashes within distance d
+# share at least one identical chunk. Only hashes sharing a chunk are compared,
+# so millions of images never need an all-pairs scan.
+#
+# Clusters are formed around leaders, in input order: a hash joins the nearest
+# leader within d bits or becomes a leader itself. Hashes are never linked
+# through a chain of neighbours, so a burst of shots that each differ a little
+# from the next one doesn't collapse into one cluster; any two members of a
+# cluster are at most 2 * d bits apart.
+
+hash_bits = 64
+default_distance = 3 # resized/re-encoded copies are usually 0-2 bits apart
+cache_field = "dhash"
+prewarm_chunk = 64 # images per task sent to a worker process
+
+def dhash(path):
+    from PIL import Image # only needed for near-duplicate checks
+    with Image.open(path) as img:
+        img.draft("L", (64, 64)) # JPEG: let the decoder scale down by up to 8x
+        small = img.convert("L").resize((9, 8), Image.BILINEAR)
+        pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def cached_dhash(path, log=print, cache=None, compute=True):
+    # Returns the hash as an int, or None for images Pillow can't decode
+    # (or, with compute=False, that aren't in the cache yet)
+    cache = cache or hash_cache.get_cache()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    found, value = cache.lookup_meta(path, cache_field, st=st)
+    if found:
+        return int(value, 16) if value else None
+    if not compute:
+        return None
+    try:
+        result = dhash(path)
+    except Exception as e:
+        log(f"[PHASH] Could not hash {path}: {e}")
+        result = None
+    cache.store_meta(path, cache_field, f"{result:016x}" if result is not None else "", st=st)
+    return result
+
+def _dhash_chunk(paths):
+    # Runs in a worker process; errors come back as text so the parent can log them
+    results = []
+    for path in paths:
+        try:
+            results.append((path, dhash(path), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+def prewarm(paths, workers, log=print, cache=None):
+    # Decoding is CPU-bound, so missing hashes are computed on a process pool and
+    # stored in the cache; cached_dhash then finds every image already done.
+    # Returns the number of images hashed.
+    cache = cache or hash_cache.get_cache()
+    todo = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if not cache.lookup_meta(path, cache_field, st=st)[0]:
+            todo[path] = st
+    if not todo:
+        return 0
+    chunks = list(todo)
+    chunks = [chunks[i:i + prewarm_chunk] for i in range(0, len(chunks), prewarm_chunk)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(_dhash_chunk, chunks):
+            for path, result, error in results:
+                if error:
+                    log(f"[PHASH] Could not hash {path}: {error}")
+                cache.store_meta(path, cache_field, f"{result:016x}" if result is not None else "", st=todo[path])
+    cache.commit()
+    log(f"[PHASH] Hashed {len(todo)} images on {workers} processes")
+    return len(todo)
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class HammingIndex:
+    def __init__(self, max_distance=default_distance, bits=hash_bits):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        step, extra = divmod(bits, chunks)
+        self.ranges = []
+        start = 0
+        for i in range(chunks):
+            width = step + (1 if i < extra else 0)
+            self.ranges.append((start, (1 << width) - 1))
+            start += width
+        self.tables = [defaultdict(list) for _ in self.ranges]
+        self.values = []
+
+    def _keys(self, value):
+        return [(value >> shift) & mask for shift, mask in self.ranges]
+
+    def add(self, value):
+        item = len(self.values)
+        self.values.append(value)
+        for table, key in zip(self.tables, self._keys(value)):
+            table[key].append(item)
+        return item
+
+    def query(self, value):
+        # Ids of stored values within max_distance of value
+        seen = set()
+        matches = []
+        for table, key in zip(self.tables, self._keys(value)):
+            for item in table.get(key, ()):
+                if item in seen:
+                    continue
+                seen.add(item)
+                if hamming(value, self.values[item]) <= self.max_distance:
+                    matches.append(item)
+        return matches
+
+def cluster(hashes, max_distance=default_distance):
+    # hashes: list of ints (None = never a near-duplicate). Returns one cluster id per
+    # entry, all below len(hashes); entries sharing an id are within max_distance of
+    # the same leader (the cluster's first hash).
+    # Identical hashes are grouped first so the index only holds distinct leaders
+    leaders = HammingIndex(max_distance)
+    by_value = {} # hash -> cluster id
+    for value in hashes:
+        if value is None or value in by_value:
+            continue
+        near = leaders.query(value)
+        if near:
+            # Nearest leader; the earliest one on a tie
+            by_value[value] = min(near, key=lambda leader: (hamming(value, leaders.values[leader]), leader))
+        else:
+            by_value[value] = leaders.add(value)
+
+    ids = []
+    next_single = len(leaders.values)
+    for value in hashes:
+        if value is None:
+            ids.append(next_single)
+            next_single += 1
+        else:
+            ids.append(by_value[value])
+    return ids
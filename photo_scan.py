@@ -1,8 +1,14 @@
 import os
-import json
 import time
 import datetime
 
+import fast_walk
+import journal
+import media_list
+import metrics
+import path_rules
+import scan_index
+
 image_extensions = (
     ".jpg", ".jpeg", ".png", ".heic", ".bmp", ".gif",
     ".tif", ".tiff", ".heif", ".raw", ".arw", ".cr2",
@@ -13,7 +19,8 @@ video_extensions = (
     ".mpeg", ".mpg", ".m4v", ".mts", ".m2ts", ".ts", ".ogv", ".divx"
 )
 
-output_json = "photo_folder.json"
+output_json = "photo_folder.json" # legacy format, imported into output_list on first scan
+output_list = "photo_folder" + media_list.list_suffix
 
 # Folders to skip during scanning
 skip_folders = [
@@ -36,71 +43,96 @@ junk_extensions = list(set([
 ]))
 junk_extensions_lower = tuple(ext.lower() for ext in junk_extensions)
 
+# Compiled once; path_rules.json can override either list
+skip_rules = path_rules.load_rule_set("skip_folders", skip_folders, default_mode="substring")
+junk_file_rules = path_rules.load_rule_set("junk_extensions", junk_extensions, default_mode="suffix")
+
 def should_skip_dir(dir_path):
-    for skip in skip_folders:
-        if skip.lower() in dir_path.lower():
-            return True
-    return False
+    return skip_rules.matches(dir_path)
 
 def is_junk_file(file_name):
-    return file_name.lower().endswith(junk_extensions_lower)
+    return junk_file_rules.matches(file_name)
+
+def log_skip(dir_path, log=print):
+    rule = skip_rules.match(dir_path)
+    log(f"Skipping Folder: {dir_path} (rule: {rule['name'] if rule else '?'})")
+
+def iter_media(root_path, workers=None, on_progress=None, log=print):
+    # Streams ("image" | "video", full_path) in the same order os.walk would find them
+    walker = fast_walk.walk_dirs(
+        root_path,
+        skip_dir=should_skip_dir,
+        on_skip=lambda dir_path: log_skip(dir_path, log=log),
+        on_progress=on_progress,
+        workers=workers,
+    )
+    for root, files in walker:
+        for file in files:
+            kind = classify_file(file)
+            if kind:
+                yield kind, os.path.join(root, file)
+
+def classify_file(file_name):
+    if is_junk_file(file_name):
+        return None
+    lower_file = file_name.lower()
+    if lower_file.endswith(image_extensions):
+        return "image"
+    if lower_file.endswith(video_extensions):
+        return "video"
+    return None
+
+def scan_media_incremental(root_path, log=print, progress_callback=None, full=False, db_path=scan_index.index_db, workers=None):
+    # Same result as scan_media, but only folders whose mtime changed are listed again;
+    # listings run on `workers` threads like fast_walk's
+    last_percent = [0.0]
+
+    def on_progress(dirs_done, dirs_seen):
+        if progress_callback:
+            percent = max(last_percent[0], (dirs_done / dirs_seen) * 100)
+            last_percent[0] = percent
+            progress_callback(percent)
 
-def scan_media(root_path, log=print, progress_callback=None):
+    with scan_index.ScanIndex(db_path) as index:
+        delta = index.rescan(
+            root_path, classify_file, skip_dir=should_skip_dir, full=full, on_progress=on_progress, workers=workers
+        )
+        found_images = []
+        found_videos = []
+        for kind, full_path in index.media_under(root_path):
+            if kind == "image":
+                found_images.append(full_path)
+            else:
+                found_videos.append(full_path)
+
+    log(f"[INDEX] {len(delta['added'])} added | {len(delta['removed'])} removed | {len(delta['changed'])} changed")
+    return found_images, found_videos, delta
+
+def scan_media(root_path, log=print, progress_callback=None, workers=None):
     found_images = []
     found_videos = []
-    all_files = []
-    
-    for root, dirs, files in os.walk(root_path):
-        # Skip directories containing any of the keywords
-        if should_skip_dir(root):
-            print(f"Skipping Folder: {root}")
-            dirs[:] = [] 
-            continue
-        for file in files:
-            all_files.append((root, file))
-    
-    total = len(all_files)
     processed = 0
-        
-    for root, file in all_files:
+    last_percent = [0.0]
+
+    # The total isn't known until the walk ends, so progress follows folders done / folders found
+    def on_progress(dirs_done, dirs_seen):
+        if progress_callback:
+            percent = max(last_percent[0], (dirs_done / dirs_seen) * 100)
+            last_percent[0] = percent
+            progress_callback(percent)
+
+    for kind, full_path in iter_media(root_path, workers=workers, on_progress=on_progress, log=log):
         processed += 1
-        if is_junk_file(file):
-            continue # skip junk files
-            
-        full_path = os.path.join(root, file)
-        lower_file = file.lower()
-        if lower_file.endswith(image_extensions):
+        if kind == "image":
             found_images.append(full_path)
-        elif lower_file.endswith(video_extensions):
+        else:
             found_videos.append(full_path)
-        
+
         # Update progress
         if processed % 1000 == 0:
-            log(f"[SCAN] Processed {processed}/{total} files...")
-        
-        if progress_callback:
-            percent = (processed / total) * 100
-            progress_callback(percent)
-    
-    return found_images, found_videos
+            log(f"[SCAN] Found {processed} media files...")
 
-def load_existing_media(json_path):
-    if not os.path.exists(json_path):
-        return {"images": [], "videos": []}
-    try:
-        with open(json_path, "r") as f:
-            data = json.load(f)
-            return {
-                "images": data.get("images", []),
-                "videos": data.get("videos", [])
-            }
-    except Exception:
-        return {"images": [], "videos": []}
-    
-def merge_media_lists(old_list, new_list):
-    combined = set(old_list)
-    combined.update(new_list)
-    return sorted(combined)
+    return found_images, found_videos
 
 def log_scan(path, images, videos, elapsed):
     log_data = {
@@ -113,22 +145,11 @@ def log_scan(path, images, videos, elapsed):
         "video_extensions": list(sorted(set(video_extensions)))
     }
     
-    history_file = "scan_history.json"
-    if os.path.exists(history_file):
-        with open(history_file, "r") as f:
-            try:
-                history = json.load(f)
-            except json.JSONDecodeError:
-                history = []                
-    else:
-        history = []
-    
-    history.append(log_data)
-    
-    with open(history_file, "w") as f:
-        json.dump(history, f, indent=2)
+    # Appended to the scan history journal instead of rewriting a JSON array
+    journal.get_journal(journal.scan_history_file).append("scan", **log_data)
 
-def run_photo_scan(scan_path, log=print, progress_callback=None):
+@metrics.reported("photo_scan")
+def run_photo_scan(scan_path, log=print, progress_callback=None, workers=None, incremental=True, full=False):
     if not os.path.isdir(scan_path):
         log("Invalid directory path. Please try again.")
         return
@@ -136,8 +157,20 @@ def run_photo_scan(scan_path, log=print, progress_callback=None):
     start_time = time.time()
     log(f"Scanning path: {scan_path} ...")
     
-    found_images, found_videos = scan_media(scan_path, log=log, progress_callback=progress_callback)
-
+    removed = []
+    with metrics.stage("scan.walk"):
+        if incremental:
+            found_images, found_videos, delta = scan_media_incremental(
+                scan_path, log=log, progress_callback=progress_callback, full=full, workers=workers
+            )
+            records = delta["added"] + delta["changed"]
+            removed = [path for _, path, _, _ in delta["removed"]]
+        else:
+            found_images, found_videos = scan_media(scan_path, log=log, progress_callback=progress_callback, workers=workers)
+            records = [("image", p) for p in found_images] + [("video", p) for p in found_videos]
+
+    metrics.count("scan.images", len(found_images))
+    metrics.count("scan.videos", len(found_videos))
     elapsed = time.time() - start_time
     h, rem = divmod(int(elapsed), 3600)
     m, s = divmod(rem, 60)
@@ -147,15 +180,18 @@ def run_photo_scan(scan_path, log=print, progress_callback=None):
     log(f"  - Found {len(found_videos)} videos")
     log(f"  - Time Elapsed: {h}h:{m}m:{s}s")
 
-    existing_media = load_existing_media(output_json)
-    merged_images = merge_media_lists(existing_media["images"], found_images)
-    merged_videos = merge_media_lists(existing_media["videos"], found_videos)
-
-    with open(output_json, "w") as f:
-        json.dump({"images": merged_images, "videos": merged_videos}, f, indent=2)
+    if not media_list.list_shards(output_list) and os.path.exists(output_json):
+        media_list.import_json(output_json, output_list)
+        log(f"Imported existing {output_json} into {output_list}")
+    elif incremental and not media_list.list_shards(output_list):
+        # The index remembers this tree but the list is gone: write it out in full
+        records = [("image", p) for p in found_images] + [("video", p) for p in found_videos]
+    with metrics.stage("scan.write_list"):
+        media_list.write_shard(output_list, records, removed=removed)
 
-    log(f"\nMedia paths saved to {output_json}")
+    log(f"\nMedia paths saved to {output_list}")
     log_scan(scan_path, found_images, found_videos, elapsed)
+    return found_images, found_videos
 
 
 # Optional CLI fallback
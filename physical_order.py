@@ -0,0 +1,105 @@
+import os
+import errno
+import struct
+
+import io_scheduler
+import metrics
+
+# Read ordering for spinning disks. Media lists are sorted by path, which on a
+# fragmented or long-used hard disk jumps all over the platter. Before the
+# organizer hashes or copies a batch, order_paths() sorts the files of each
+# device by where their data sits:
+#   extent - physical offset of the file's first extent, from the FIEMAP ioctl
+#            (Linux: ext4, XFS, btrfs, ...)
+#   inode  - inode number; ext4 and XFS allocate data near its inode, so this is
+#            a cheap approximation wherever FIEMAP isn't available
+#   auto   - extent where the filesystem answers FIEMAP, inode where it doesn't,
+#            and only on devices io_scheduler classifies as hdd
+#   none   - keep the given order
+# Only the order of reads changes: what is copied where was decided before.
+
+order_modes = ("auto", "extent", "inode", "none")
+default_mode = "auto"
+fiemap_ioctl = 0xC020660B # FS_IOC_FIEMAP = _IOWR('f', 11, struct fiemap)
+fiemap_header = struct.Struct("=QQIIII") # start, length, flags, mapped_extents, extent_count, reserved
+fiemap_extent = struct.Struct("=QQQQQIIII") # logical, physical, length, 2 reserved, flags, 3 reserved
+# errnos meaning "this filesystem has no extent map", not "this file is unreadable"
+no_fiemap_errnos = {errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS}
+
+class NoExtentMap(Exception):
+    pass
+
+def extents(path, limit=1):
+    # Up to `limit` extents of path as (logical, physical, length) byte tuples, in file
+    # order; [] for files without any (empty, inline data). Raises NoExtentMap where
+    # FIEMAP isn't supported and OSError for unreadable files.
+    try:
+        import fcntl
+    except ImportError:
+        raise NoExtentMap("FIEMAP needs Linux")
+    buf = bytearray(fiemap_header.size + fiemap_extent.size * limit)
+    fiemap_header.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, limit, 0)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.ioctl(fd, fiemap_ioctl, buf, True)
+    except OSError as e:
+        if e.errno in no_fiemap_errnos:
+            raise NoExtentMap(str(e))
+        raise
+    finally:
+        os.close(fd)
+    mapped = fiemap_header.unpack_from(buf)[3]
+    return [
+        fiemap_extent.unpack_from(buf, fiemap_header.size + i * fiemap_extent.size)[:3]
+        for i in range(mapped)
+    ]
+
+def _device_mode(dev, mode):
+    if mode != "auto":
+        return mode
+    return "extent" if io_scheduler.device_kind(dev) == "hdd" else "none"
+
+def order_paths(items, mode=default_mode, log=print, path=None):
+    # Returns items grouped by device, each device's files in read order and the rest
+    # in their given order. path(item) names an item's file (default: the item itself).
+    if mode not in order_modes:
+        raise ValueError(f"Unknown read order: {mode}")
+    items = list(items)
+    if mode == "none" or len(items) < 2:
+        return items
+    path = path or (lambda item: item)
+    device_of = io_scheduler.get_scheduler().device_of
+    ranks = {} # st_dev -> position of the device in the output
+    modes = {} # st_dev -> order actually used there
+    counts = dict.fromkeys(order_modes, 0)
+    keys = []
+    for i, item in enumerate(items):
+        file_path = path(item)
+        dev = device_of(file_path)
+        rank = ranks.setdefault(dev, len(ranks))
+        dev_mode = modes.get(dev)
+        if dev_mode is None:
+            dev_mode = modes[dev] = _device_mode(dev, mode)
+        position = i
+        if dev_mode == "extent":
+            try:
+                found = extents(file_path)
+                position = found[0][1] if found else 0
+            except NoExtentMap:
+                log(f"[ORDER] {io_scheduler.device_name(dev)}: no extent map, ordering by inode")
+                dev_mode = modes[dev] = "inode"
+            except OSError:
+                pass # unreadable: hashing / copying reports it
+        if dev_mode == "inode":
+            try:
+                position = os.stat(file_path).st_ino
+            except OSError:
+                pass
+            metrics.count("stat")
+        counts[dev_mode] += 1
+        keys.append((rank, position, i))
+    for dev_mode in ("extent", "inode"):
+        metrics.count(f"order.{dev_mode}", counts[dev_mode])
+    if counts["extent"] or counts["inode"]:
+        log(f"[ORDER] {counts['extent']} files by extent | {counts['inode']} by inode | {counts['none']} unchanged")
+    return [items[i] for _, _, i in sorted(keys)]
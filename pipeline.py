@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import hashing
+import metrics
+
+# Bounded stages for streaming work through a tool. A Stage runs func over an
+# upstream iterable (a list, a generator or another Stage) on its own thread,
+# with a pool of `workers` when func is slow, and hands results to whatever
+# iterates it through a queue of at most queue_size items:
+#   discovered = Stage("discover", stat_file, paths)
+#   probed = Stage("probe", read_header, discovered, workers=8)
+#   for result in probed: ...
+# A full queue blocks the stage, which then stops pulling from upstream, so
+# backpressure travels back to the source instead of items piling up in memory.
+# Results come out in input order. An exception in a stage is raised to the
+# consumer where the failed item would have appeared. A consumer that stops
+# early shuts the whole chain down: break does it, and after an exception in
+# the loop body call close() on the last stage.
+
+default_queue_size = 256
+poll_interval = 0.1 # seconds between checks for a stopped stage
+
+_end = object()
+
+class Stage:
+    def __init__(self, name, func, items, workers=1, queue_size=default_queue_size):
+        self.name = name
+        self.func = func
+        self.items = items
+        self.workers = max(1, workers or 1)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.busy = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+        self.thread.start()
+
+    def _call(self, item):
+        start = time.perf_counter()
+        try:
+            outcome = (True, self.func(item))
+        except Exception as e:
+            outcome = (False, e)
+        with self.lock:
+            self.processed += 1
+            self.busy += time.perf_counter() - start
+        return outcome
+
+    def _put(self, value):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(value, timeout=poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        pool = None
+        try:
+            if self.workers > 1:
+                pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"stage-{self.name}")
+                outcomes = hashing.bounded_map(pool, self._call, self.items, self.workers * 2)
+            else:
+                outcomes = map(self._call, self.items)
+            for outcome in outcomes:
+                if not self._put(outcome):
+                    return
+                metrics.gauge(f"pipeline.{self.name}.queue", self.queue.qsize())
+        except Exception as e: # upstream failed; pass it on
+            self._put((False, e))
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+            self._put(_end)
+
+    def __iter__(self):
+        # A stopped stage never queues _end, so whoever is still reading (the next
+        # stage's thread) polls for the stop instead of waiting forever
+        try:
+            while not self.stopped.is_set():
+                try:
+                    value = self.queue.get(timeout=poll_interval)
+                except queue.Empty:
+                    continue
+                if value is _end:
+                    return
+                ok, result = value
+                if not ok:
+                    raise result
+                yield result
+        finally:
+            self.close()
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if isinstance(self.items, Stage):
+            self.items.close()
+        metrics.count(f"pipeline.{self.name}.items", self.processed)
+        metrics.count(f"pipeline.{self.name}.busy_ms", int(self.busy * 1000))
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_walk
+
+index_db = "scan_index.db"
+
+schema = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT,
+    kind TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    inode INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+"""
+
+# Commit every N folders so an interrupted rescan keeps most of its work
+commit_every = 500
+
+def read_dir(path, stored_mtime, classify, full=False):
+    # Runs on the rescan pool: (folder mtime, listing), or (None, None) if the folder
+    # is gone or unreadable. listing is None for a folder unchanged since stored_mtime,
+    # else ({file path: (kind, size, mtime_ns, inode)}, [subfolder paths])
+    try:
+        dir_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, None
+    if stored_mtime == dir_mtime and not full:
+        return dir_mtime, None
+    current = {}
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        continue
+                    kind = classify(entry.name)
+                    if not kind:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                current[entry.path] = (kind, st.st_size, st.st_mtime_ns, st.st_ino)
+    except OSError:
+        return None, None
+    return dir_mtime, (current, subdirs)
+
+class ScanIndex:
+    def __init__(self, db_path=index_db):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(schema)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _under(self, column, path):
+        # WHERE clause for `path` and everything below it, written as a range so the
+        # column's index is used (LIKE would also trip on % and _ in folder names)
+        prefix = os.path.join(path, "")
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return f"({column} = ? OR ({column} >= ? AND {column} < ?))", (path, prefix, upper)
+
+    def forget_tree(self, path):
+        where, args = self._under("dir", path)
+        removed = self.conn.execute(f"SELECT kind, path, size, mtime_ns FROM files WHERE {where}", args).fetchall()
+        self.conn.execute(f"DELETE FROM files WHERE {where}", args)
+        where, args = self._under("path", path)
+        self.conn.execute(f"DELETE FROM dirs WHERE {where}", args)
+        return removed
+
+    def media_under(self, root_path):
+        where, args = self._under("dir", os.path.abspath(root_path))
+        return self.conn.execute(f"SELECT kind, path FROM files WHERE {where} ORDER BY path", args)
+
+    def _stored_mtime(self, path):
+        row = self.conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def rescan(self, root_path, classify, skip_dir=None, full=False, on_progress=None, workers=None, prefetch=None):
+        # Walks root_path, only listing folders whose mtime changed since the last run.
+        # Adding, removing or renaming a file bumps its folder's mtime; editing a file in
+        # place does not, so pass full=True to re-stat every file.
+        # classify(name) returns "image", "video" or None for files that aren't indexed.
+        # Folders are stat'ed and listed on a pool of `workers` threads, `prefetch` ahead
+        # of the walk (as in fast_walk); the index itself is only touched here.
+        # Returns {"added": [...], "removed": [...], "changed": [...]} of (kind, path, size, mtime_ns).
+        root_path = os.path.abspath(root_path) # stored parents are os.path.dirname of listed paths
+        workers = workers or fast_walk.default_workers
+        prefetch = max(prefetch or fast_walk.default_prefetch, workers)
+        delta = {"added": [], "removed": [], "changed": []}
+        # Stack entries: [path, skipped, future]
+        stack = [[root_path, bool(skip_dir and skip_dir(root_path)), None]]
+        in_flight = 0
+        dirs_done = 0
+        dirs_seen = 1
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while stack:
+                for item in reversed(stack):
+                    if in_flight >= prefetch:
+                        break
+                    if item[2] is None and not item[1]:
+                        item[2] = pool.submit(read_dir, item[0], self._stored_mtime(item[0]), classify, full)
+                        in_flight += 1
+
+                path, skipped, future = stack.pop()
+                dirs_done += 1
+                if on_progress:
+                    on_progress(dirs_done, dirs_seen)
+                if dirs_done % commit_every == 0:
+                    self.conn.commit()
+
+                if skipped:
+                    delta["removed"].extend(self.forget_tree(path))
+                    continue
+                dir_mtime, listing = future.result()
+                in_flight -= 1
+                if dir_mtime is None:
+                    delta["removed"].extend(self.forget_tree(path))
+                    continue
+                if listing is None:
+                    # Unchanged folder: no listing, just check its known subfolders
+                    subdirs = [r[0] for r in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+                    self._push(stack, subdirs, skip_dir)
+                    dirs_seen += len(subdirs)
+                    continue
+                current, subdirs = listing
+                self._update(path, dir_mtime, current, subdirs, delta)
+                self._push(stack, subdirs, skip_dir)
+                dirs_seen += len(subdirs)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        self.conn.commit()
+        for key in delta:
+            delta[key].sort(key=lambda item: item[1])
+        return delta
+
+    def _push(self, stack, subdirs, skip_dir):
+        for sub in sorted(subdirs, reverse=True):
+            stack.append([sub, bool(skip_dir and skip_dir(sub)), None])
+
+    def _update(self, path, dir_mtime, current, subdirs, delta):
+        # Stores a changed folder's listing and records what differs from the index
+        stored = {
+            r[0]: r[1:]
+            for r in self.conn.execute(
+                "SELECT path, kind, size, mtime_ns, inode FROM files WHERE dir = ?", (path,)
+            )
+        }
+        for file_path, info in current.items():
+            old = stored.pop(file_path, None)
+            if old is None:
+                delta["added"].append((info[0], file_path, info[1], info[2]))
+            elif old != info:
+                delta["changed"].append((info[0], file_path, info[1], info[2]))
+            else:
+                continue
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, dir, kind, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_path, path) + info,
+            )
+        for file_path, old in stored.items():
+            delta["removed"].append((old[0], file_path, old[1], old[2]))
+            self.conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+
+        known = {r[0] for r in self.conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+        for gone in known.difference(subdirs):
+            delta["removed"].extend(self.forget_tree(gone))
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+            (path, os.path.dirname(path), dir_mtime),
+        )
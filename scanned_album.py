@@ -1,13 +1,21 @@
 import os
 import shutil
-import json
-import hashlib
 from datetime import datetime
 from pathlib import Path
 
-from PIL import Image
 from dateutil.parser import parse as parse_date # flexible date parsing
 
+import capture_date
+import checkpoint
+import copy_engine
+import dedup
+import hash_cache
+import hashing
+import image_probe
+import journal
+import metrics
+import name_allocator
+
 # Configurable settings
 scanned_extensions = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
 low_quality_min_width = 400
@@ -18,53 +26,72 @@ duplicates_folder = "duplicates"
 review_folder = "review"
 albums_folder = "Scanned_Albums"
 
-# Logs
-recovery_log = "recovery_log.json"
-scan_history_log = "scan_history.json"
-
 def hash_file(path):
-    hasher = hashlib.md5()
-    with open(path, "rb") as f:
-        while chunk := f.read(8192):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+    # Shares the organizer's persistent cache, so unchanged scans aren't re-read
+    return hash_cache.get_cache().get_or_compute(path, compute_hash)
+
+def compute_hash(path):
+    return hashing.hash_file(path, hashing.default_algo)
 
 def is_low_quality(image_path):
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            return width < low_quality_min_width or height < low_quality_min_height
-    except Exception:
-        return True # Flag unreadable images
+    # Unreadable images come back as (0, 0) and are flagged
+    width, height = image_probe.get_size(image_path, log=lambda message: None)
+    return width < low_quality_min_width or height < low_quality_min_height
     
 def load_recovery_log():
-    if os.path.exists(recovery_log):
-        with open(recovery_log, "r") as f:
-            return json.load(f)
-    return []
+    # Every copy and move recorded by the tools, oldest first
+    return journal.query(op=("copy", "move"))
+
+def save_recovery_log(entry, op="copy"):
+    # One appended journal line; `python journal.py undo RUN` rolls a run back
+    journal.get_journal().append(op, **entry)
+        
+def queue_copy(copier, dest_names, progress, file, folder, album=None, log=print):
+    # Claims a free name in folder and queues the copy; copies are written to the
+    # recovery log once they have landed. Copies finished by an interrupted run are
+    # skipped, cut-off ones are redone into the same file.
+    if progress.completed(file):
+        return True
+    dest = progress.claimed(file)
+    if not dest:
+        try:
+            dest = dest_names.allocate(folder, file.name)
+        except OSError as e:
+            log(f"[ERROR] Failed to copy {'image' if album else 'duplicate'}: {file} ({e})")
+            return False
+        progress.claim(file, dest)
+    copier.submit(file, dest, tag=album, on_done=lambda job: copy_done(job, progress.run, log))
+    return True
+
+def copy_done(job, run=None, log=print):
+    album = job.tag
+    if not job.ok:
+        log(f"[ERROR] Failed to copy {'image' if album else 'duplicate'}: {job.src} ({job.error})")
+        return
+    log(f"[DUPLICATE] {job.src} -> {job.dst}" if album is None else f"[MOVED] {job.src} -> {job.dst}")
+    save_recovery_log({
+        "run": run,
+        "src": str(job.src),
+        "dst": job.dst,
+        "hash": job.digest,
+        "bytes": job.bytes,
+        "album": album
+    })
 
-def save_recovery_log(entry):
-    log = load_recovery_log()
-    log.append(entry)
-    with open(recovery_log, "w") as f:
-        json.dump(log, f, indent=2)
+def move_file(src, dest, run=None):
+    shutil.move(src, dest)
+    save_recovery_log({"run": run, "src": str(src), "dst": dest}, op="move")
         
 def save_scan_history(folder, date_start, date_end_):
-    entry = {
-        "folder": folder,
-        "start_date": date_start,
-        "end_date": date_end_,
-        "timestamp": datetime.now().isoformat()
-    }
-    history = []
-    if os.path.exists(scan_history_log):
-        with open(scan_history_log, "r") as f:
-            history = json.load(f)
-        history.append(entry)
-        with open(scan_history_log, "w") as f:
-            json.dump(history, f, indent=2)
+    journal.get_journal(journal.scan_history_file).append(
+        "album_scan",
+        folder=str(folder),
+        start_date=date_start,
+        end_date=date_end_,
+        timestamp=datetime.now().isoformat(),
+    )
             
-def organize_scanned_photos(source_folder):
+def organize_scanned_photos(source_folder, resume=True, repair=False):
     hashed_files = set()
     album_metadata = {}
     
@@ -72,6 +99,7 @@ def organize_scanned_photos(source_folder):
     os.makedirs(output_base, exist_ok=True)
     os.makedirs(os.path.join(output_base, duplicates_folder), exist_ok=True)
     os.makedirs(os.path.join(output_base, review_folder), exist_ok=True)
+    progress = checkpoint.Checkpoint("scanned_album", os.path.abspath(source_folder), resume=resume, repair=repair)
     
     # Batch mode setup
     batch_mode_input = input("Enable batch mode? (y/n): ").strip().lower()
@@ -86,96 +114,79 @@ def organize_scanned_photos(source_folder):
         default_tags = [t.strip() for t in tags_input.split(",") if t.strip()]
         print(f"Album: {default_album} | Tags: {default_tags}")
     
-    for file in Path(source_folder).rglob("*"):
-        if file.is_file() and file.suffix.lower() in scanned_extensions:
-            file_hash = hash_file(file)
-            
-            if file_hash in hashed_files:
-                # Already seen - mark as duplicate
-                dest = os.path.join(output_base, duplicates_folder, file.name)
-                counter = 1
-                name_no_ext, ext = os.path.splitext(file.name)
-                while os.path.exists(dest):
-                    dest = os.path.join(output_base, duplicates_folder, f"{name_no_ext}_{counter}{ext}")
-                    counter += 1
-                try:
-                    shutil.copy2(file, dest)
-                    print(f"[DUPLICATE] {file} -> {dest}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to copy duplicate: {file} ({e})")
-                hashed_files.add(file_hash)
-                continue
-            is_review = is_low_quality(file)
-            if is_review:
-                poor_images_folder = os.path.join(output_base, "Poor_Images")
-                os.makedirs(poor_images_folder, exist_ok=True)
-                
-                poor_dest = os.path.join(poor_images_folder, file.name)
-                counter = 1
-                name_no_ext, ext = os.path.splitext(file.name)
-                while os.path.exists(poor_dest):
-                    poor_dest = os.path.join(poor_images_folder, f"{name_no_ext}_{counter}{ext}")
-                    counter += 1
-                try:
-                    shutil.move(file, poor_dest)
-                    print(f"[POOR QUALITY MOVED] {file} -> {poor_dest}")
-                except Exception as e:
-                    print(f"[ERROR] Failed to move poor quality image: {file} ({e})")
-                hashed_files.add(file_hash)
-                continue
-            
-            # Batch or interactive input
-            if batch_mode:
-                album = default_album
-                tags = default_tags
-            else:
-                album = input(f"Enter album name for {file.name} (or leave blank to skip): ").strip()
-                if not album:
-                    print(f"Skipping {file.name}")
-                    continue
-                tags_input = input(f"Enter tags (comma separated): ").strip()
-                tags = [t.strip() for t in tags_input.split(",") if t.strip()]
-                
-            album_path = os.path.join(output_base, album)
-            os.makedirs(album_path, exist_ok=True)
+    candidates = [
+        file for file in Path(source_folder).rglob("*")
+        if file.is_file() and file.suffix.lower() in scanned_extensions
+    ]
+    # Only files with a same-size twin are ever hashed
+    dup_index = dedup.find_duplicates(candidates, full_hash=hash_file, log=print)
+    
+    copier = copy_engine.CopyQueue(log=print, hash_algo=hashing.default_algo)
+    dest_names = name_allocator.NameAllocator()
+    for dest in progress.destinations():
+        dest_names.reserve(dest)
+    for file in candidates:
+        if file in dup_index.errors:
+            continue
+        file_hash = dup_index.key(file)
+        
+        if file_hash and file_hash in hashed_files:
+            # Already seen - mark as duplicate
+            queue_copy(copier, dest_names, progress, file, os.path.join(output_base, duplicates_folder), log=print)
+            hashed_files.add(file_hash)
+            continue
+        is_review = is_low_quality(file)
+        if is_review:
+            poor_images_folder = os.path.join(output_base, "Poor_Images")
+            os.makedirs(poor_images_folder, exist_ok=True)
             
-            dest = os.path.join(album_path, file.name)
-            counter = 1
-            name_no_ext, ext = os.path.splitext(file.name)
-            while os.path.exists(dest):
-                dest = os.path.join(album_path, f"{name_no_ext}_{counter}{ext}")
-                counter += 1
+            poor_dest = dest_names.allocate(poor_images_folder, file.name, claim=False)
             try:
-                shutil.copy2(file, dest)
-                print(f"[MOVED] {file} -> {dest}")
+                move_file(file, poor_dest, progress.run)
+                print(f"[POOR QUALITY MOVED] {file} -> {poor_dest}")
             except Exception as e:
-                print(f"[ERROR] Failed to copy image: {file} ({e})")
+                print(f"[ERROR] Failed to move poor quality image: {file} ({e})")
+            hashed_files.add(file_hash)
+            continue
+        
+        # Batch or interactive input
+        if batch_mode:
+            album = default_album
+            tags = default_tags
+        else:
+            album = input(f"Enter album name for {file.name} (or leave blank to skip): ").strip()
+            if not album:
+                print(f"Skipping {file.name}")
                 continue
+            tags_input = input(f"Enter tags (comma separated): ").strip()
+            tags = [t.strip() for t in tags_input.split(",") if t.strip()]
             
-            save_recovery_log({
-                "original": str(file),
-                "destination": dest,
-                "timestamp": datetime.now().isoformat(),
-                "album": album
-            })
-            
-            if album not in album_metadata:
-                album_metadata[album] = {
-                    "created": datetime.now().isoformat(),
-                    "photos": [],
-                    "tags": tags,
-                }
-                
-            album_metadata[album]["photos"].append({
-                "filename": file.name,
-                "hash": file_hash,
+        album_path = os.path.join(output_base, album)
+        os.makedirs(album_path, exist_ok=True)
+        
+        if not queue_copy(copier, dest_names, progress, file, album_path, album=album, log=print):
+            continue
+        
+        if album not in album_metadata:
+            album_metadata[album] = {
+                "created": datetime.now().isoformat(),
+                "photos": [],
                 "tags": tags,
-                "review": False,
-            })
+            }
             
-            hashed_files.add(file_hash)
+        album_metadata[album]["photos"].append({
+            "filename": file.name,
+            "hash": file_hash,
+            "tags": tags,
+            "review": False,
+        })
+        
+        hashed_files.add(file_hash)
+    copier.close()
+    progress.finish()
 
-def scan_scanned_photos(source_folder, batch_mode=False, default_album=None, default_tags=None, date_start=None, date_end=None, log=print):
+@metrics.reported("scanned_album")
+def scan_scanned_photos(source_folder, batch_mode=False, default_album=None, default_tags=None, date_start=None, date_end=None, log=print, resume=True, repair=False):
     hashed_files = set()
     album_metadata = {}
     
@@ -191,98 +202,93 @@ def scan_scanned_photos(source_folder, batch_mode=False, default_album=None, def
     os.makedirs(os.path.join(output_base, duplicates_folder), exist_ok=True)
     
     save_scan_history(source_folder, date_start, date_end)
+    job = f"{os.path.abspath(source_folder)}|{date_start}|{date_end}|{default_album}"
+    progress = checkpoint.Checkpoint("scanned_album", job, resume=resume, repair=repair, log=log)
+    hash_cache.get_cache().reset_counters()
     
-    for file in Path(source_folder).rglob("*"):
-        if file.is_file() and file.suffix.lower() in scanned_extensions:
-            try:
-                mod_time = datetime.fromtimestamp(file.stat().st_mtime)
-                if not (start_dt <= mod_time <= end_dt):
-                    continue # Skips files outside date range
-            except Exception as e:
-                log(f"[ERROR] Could not get mod time: {file} {e}")
+    scanned_files = (
+        file for file in Path(source_folder).rglob("*")
+        if file.is_file() and file.suffix.lower() in scanned_extensions
+    )
+    candidates = []
+    # Scanner EXIF date first, then a date in the file name, then mtime
+    with metrics.stage("scanned.dates"):
+        for file, taken in capture_date.iter_dates(scanned_files, log=log):
+            if taken is None:
+                log(f"[ERROR] Could not get a date for: {file}")
                 continue
-            
-            file_hash = hash_file(file)
-            
-            if file_hash in hashed_files:
-                dest = os.path.join(output_base, duplicates_folder, file.name)
-                counter = 1
-                name_no_ext, ext = os.path.splitext(file.name)
-                while os.path.exists(dest):
-                    dest = os.path.join(output_base, duplicates_folder, f"{name_no_ext}_{counter}{ext}")
-                    counter += 1
+            if not (start_dt <= taken <= end_dt):
+                continue # Skips files outside date range
+            candidates.append(file)
+    
+    # Only files with a same-size twin are ever hashed
+    with metrics.stage("scanned.dedup"):
+        dup_index = dedup.find_duplicates(candidates, full_hash=hash_file, log=log)
+    
+    copier = copy_engine.CopyQueue(log=log, hash_algo=hashing.default_algo)
+    dest_names = name_allocator.NameAllocator()
+    for dest in progress.destinations():
+        dest_names.reserve(dest)
+    with metrics.stage("scanned.copy"):
+        for file in candidates:
+            if file in dup_index.errors:
+                continue
+            file_hash = dup_index.key(file)
+        
+            if file_hash and file_hash in hashed_files:
+                queue_copy(copier, dest_names, progress, file, os.path.join(output_base, duplicates_folder), log=log)
+                hashed_files.add(file_hash)
+                continue
+        
+            is_review = is_low_quality(file)
+            if is_review:
+                poor_images_folder = os.path.join(output_base, "Poor_Images")
+                os.makedirs(poor_images_folder, exist_ok=True)
+                poor_dest = dest_names.allocate(poor_images_folder, file.name, claim=False)
                 try:
-                    shutil.copy2(file, dest)
-                    log(f"[DUPLICATE] {file} -> {dest}")
+                    move_file(file, poor_dest, progress.run)
+                    log(f"[POOR QUALITY MOVED] {file} -> {poor_dest}")
                 except Exception as e:
-                    log(f"[ERROR] Failed to copy duplicate: {file} ({e})")
+                    log(f"[ERROR] Failed to move poor quality image: {file} ({e})")
                 hashed_files.add(file_hash)
                 continue
         
-        is_review = is_low_quality(file)
-        if is_review:
-            poor_images_folder = os.path.join(output_base, "Poor_Images")
-            os.makedirs(poor_images_folder, exist_ok=True)
-            poor_dest = os.path.join(poor_images_folder, file.name)
-            counter = 1
-            name_no_ext, ext = os.path.splitext(file.name)
-            while os.path.exist(poor_dest):
-                poor_dest = os.path.join(poor_images_folder, f"{name_no_ext}_{counter}{ext}")
-                counter += 1
-            try:
-                shutil.move(file, poor_dest)
-                log(f"[POOR QUALITY MOVED] {file} -> {poor_dest}")
-            except Exception as e:
-                log(f"[ERROR] Failed to move poor quality image: {file} ({e})")
-            hashed_files.add(file_hash)
-            continue
-        
-        # Batch only 
-        if batch_mode:
-            album = default_album or "Unosorted"
-            tags = default_tags or []
-        else:
-            log(f"[SKIPPED] {file} - interactive mode not supported in GUI.")
-            continue
-        
-        album_path = os.path.join(output_base, album)
-        os.makedirs(album_path, exist_ok=True)
+            # Batch only 
+            if batch_mode:
+                album = default_album or "Unosorted"
+                tags = default_tags or []
+            else:
+                log(f"[SKIPPED] {file} - interactive mode not supported in GUI.")
+                continue
         
-        dest = os.path.join(album_path, file.name)
-        counter = 1
-        name_no_ext, ext = os.path.splitext(file.name)
-        while os.path.exists(dest):
-            dest = os.path.join(album_path, f"{name_no_ext}_{counter}{ext}")
-            counter += 1
-        try:
-            shutil.copy2(file, dest)
-            log(f"[MOVED] {file} -> {dest}")
-        except Exception as e:
-            log(f"[ERROR] Failed to copy imagage: {file} ({e})")
-            continue
+            album_path = os.path.join(output_base, album)
+            os.makedirs(album_path, exist_ok=True)
         
-        save_recovery_log({
-            "original": str(file),
-            "destination": dest,
-            "timestamp": datetime.now().isoformat(),
-            "album": album
-        })
+            if not queue_copy(copier, dest_names, progress, file, album_path, album=album, log=log):
+                continue
         
-        if album not in album_metadata:
-            album_metadata[album] = {
-                "created": datetime.now().isoformat(),
-                "photos": [],
-                "tags": tags,
-            }
+            if album not in album_metadata:
+                album_metadata[album] = {
+                    "created": datetime.now().isoformat(),
+                    "photos": [],
+                    "tags": tags,
+                }
             
-        album_metadata[album]["photos"].append({
-            "filename": file.name,
-            "hash": file_hash,
-            "tags": tags,
-            "review": False,
-        })
+            album_metadata[album]["photos"].append({
+                "filename": file.name,
+                "hash": file_hash,
+                "tags": tags,
+                "review": False,
+            })
         
-        hashed_files.add(file_hash)
+            hashed_files.add(file_hash)
+        copier.close()
+    progress.finish()
+
+    metrics.count("scanned.candidates", len(candidates))
+    metrics.cache("hash_cache", hash_cache.get_cache().hits, hash_cache.get_cache().misses)
+    cache_stats = hash_cache.get_cache().stats()
+    log(f"[HASH CACHE] {cache_stats['hits']} hits | {cache_stats['misses']} misses | {cache_stats['entries']} cached")
             
 def main():
     print("=== Scanned Photo Organizer ===")
@@ -294,21 +300,18 @@ def main():
     
 def move_albums(source_folder, dest_folder, log=print):
     source_albums_path = os.path.join(source_folder, albums_folder)
-    if not os.path.exist(source_albums_path):
+    if not os.path.exists(source_albums_path):
         log(f"[Move Albbums] No '{albums_folder}' folder found in {source_folder}")
         return
     
+    dest_names = name_allocator.NameAllocator()
+    run = journal.get_journal().start_run("move_albums", source=str(source_folder), dest=str(dest_folder))
     for item in os.listdir(source_albums_path):
         item_path = os.path.join(source_albums_path, item)
         if os.path.isdir(item_path) and item not in [duplicates_folder, review_folder, "Poor_Images"]:
-            dest_path = os.path.join(dest_folder, item)
-            counter = 1
-            base_name = item
-            while os.path.exists(dest_path):
-                dest_path = os.path.join(dest_folder, f"{base_name}_{counter}")
-                counter += 1
+            dest_path = dest_names.allocate(dest_folder, item, claim=False, split_ext=False)
             try:
-                shutil.move(item_path, dest_path)
+                move_file(item_path, dest_path, run)
                 log(f"[Moved] {item_path} -> {dest_path}")
             except Exception as e:
                 log(f"[ERROR] Failed to move album '{item}': {str(e)}")